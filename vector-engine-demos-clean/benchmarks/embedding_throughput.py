@@ -0,0 +1,134 @@
+"""CPU throughput of the local embedding provider variants
+
+Embeds the movie titles and plots with LocalEmbeddingProvider in each requested
+variant (torch, onnx, onnx with int8 quantization, and the latter across worker
+processes) and reports texts/sec, the equivalent loader docs/sec (two texts per
+movie) and how closely each variant's vectors match the torch float32 reference
+(mean and minimum cosine similarity). The embedding cache is disabled so every
+text is encoded.
+
+Requires sentence-transformers (with the onnx extra for the onnx variants). Run
+from the vector-engine-demos-clean directory:
+
+    python -m benchmarks.embedding_throughput --processes 4 --output embedding-throughput.json
+"""
+# Python Built-Ins:
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+# External Dependencies:
+import numpy as np
+
+from benchmarks.run_benchmarks import ROOT, SAMPLE_FILE, git_revision
+
+
+def load_texts(input_path, limit):
+    texts = []
+    with open(input_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            movie = json.loads(line)
+            texts.append(movie["title"])
+            if movie.get("plot"):
+                texts.append(movie["plot"])
+    return texts[:limit] if limit else texts
+
+
+def variants(processes, quantization):
+    from utils.embeddings import onnx_available
+
+    yield "torch", dict(backend="torch", quantization="none", processes=0)
+    if not onnx_available():
+        # The provider would fall back to torch; don't report that as an onnx measurement
+        print("onnxruntime/optimum not installed, skipping the onnx variants", file=sys.stderr)
+        return
+    yield "onnx", dict(backend="onnx", quantization="none", processes=0)
+    yield f"onnx-int8-{quantization}", dict(backend="onnx", quantization=quantization, processes=0)
+    if processes > 1:
+        yield f"onnx-int8-{quantization}-x{processes}", dict(backend="onnx", quantization=quantization, processes=processes)
+
+
+def cosine(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="CPU throughput of the local embedding provider variants")
+    parser.add_argument("--input", default=SAMPLE_FILE, help="movie file (NDJSON)")
+    parser.add_argument("--model", default="sentence-transformers/msmarco-distilbert-base-tas-b", help="sentence-transformers model")
+    parser.add_argument("--limit", type=int, default=0, help="only embed the first N texts")
+    parser.add_argument("--batch-size", type=int, default=64, help="texts per forward pass")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="worker processes for the pooled variant")
+    parser.add_argument("--quantization", default="avx2", help="ONNX Runtime int8 config: arm64, avx2, avx512, avx512_vnni")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    os.environ["AOSS_EMBEDDING_CACHE"] = "off"
+    from utils.embeddings import LocalEmbeddingProvider
+
+    texts = load_texts(args.input, args.limit)
+    model_dir = tempfile.mkdtemp(prefix="aoss-models-")
+    reference = None
+    rows = []
+    for name, options in variants(args.processes, args.quantization):
+        start = time.perf_counter()
+        provider = LocalEmbeddingProvider(args.model, batch_size=args.batch_size, model_dir=model_dir, **options)
+        load_seconds = time.perf_counter() - start
+        try:
+            # Warm-up (and worker pool start) outside the measurement
+            provider.embed_many(texts[:provider.batch_size])
+            start = time.perf_counter()
+            vectors = []
+            for i in range(0, len(texts), provider.batch_size):
+                vectors.extend(provider.embed_many(texts[i:i + provider.batch_size]))
+            seconds = time.perf_counter() - start
+        finally:
+            provider.close()
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if reference is None:
+            reference = vectors
+        similarity = cosine(reference, vectors)
+        row = {
+            "variant": name,
+            "load_seconds": load_seconds,
+            "texts": len(texts),
+            "seconds": seconds,
+            "texts_per_sec": len(texts) / seconds,
+            "docs_per_sec": len(texts) / seconds / 2,
+            "cosine_to_torch_mean": float(similarity.mean()),
+            "cosine_to_torch_min": float(similarity.min()),
+        }
+        rows.append(row)
+        print(f"{name:>28}  {row['texts_per_sec']:8.1f} texts/s  cosine {row['cosine_to_torch_mean']:.4f}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "model": args.model,
+            "batch_size": args.batch_size,
+        },
+        "variants": rows,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
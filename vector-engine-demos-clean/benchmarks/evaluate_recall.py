@@ -0,0 +1,198 @@
+"""Recall of approximate kNN against exact search, next to latency, per k / ef_search / filter
+
+Indexes the movie file into a FakeOpenSearchServer running approximate kNN (beam
+search over a proximity graph, see benchmarks.fakes) with the loader's mapping,
+embeds the query set once, and computes the exact neighbours with NumPy brute
+force over the same v_title/v_plot vectors (utils.local_search in exact mode,
+with the query_builder filter semantics). Every query is then sent as one
+msearch per setting, holding:
+
+  - a knn query per vector field with size = k, scored as recall@k against the
+    exact top-k of that field, and
+  - the query_movies kNN query (both fields, page size results), scored as
+    recall@size against the exact ranking of the summed field scores.
+
+The report lists recall and msearch latency percentiles for each combination of
+--k, --ef-search and filter, plus the smallest ef_search reaching --target-recall
+for each k. Run from the vector-engine-demos-clean directory:
+
+    python -m benchmarks.evaluate_recall --output recall.json
+"""
+# Python Built-Ins:
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+# External Dependencies:
+import numpy as np
+
+from benchmarks.run_benchmarks import (
+    FILTERS, QUERIES, ROOT, SAMPLE_FILE, git_revision, percentiles, prepare_input, setup_environment
+)
+
+
+def parse_ints(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def load_documents(input_path, bedrock_stub, limit):
+    docs = []
+    with open(input_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            doc = json.loads(line)
+            doc["v_title"] = bedrock_stub.embed(doc["title"]).tolist()
+            if doc.get("plot"):
+                doc["v_plot"] = bedrock_stub.embed(doc["plot"]).tolist()
+            docs.append(doc)
+            if limit and len(docs) >= limit:
+                break
+    return docs
+
+
+def index_documents(client, docs, index_name, body, batch_size=200):
+    client.indices.create(index=index_name, body=body)
+    ids = []
+    for start in range(0, len(docs), batch_size):
+        lines = []
+        for n, doc in enumerate(docs[start:start + batch_size], start):
+            doc_id = f"movie-{doc.get('rank', n)}"
+            ids.append(doc_id)
+            lines.append(json.dumps({"index": {"_index": index_name, "_id": doc_id}}))
+            lines.append(json.dumps(doc))
+        client.bulk(body="\n".join(lines) + "\n")
+    client.indices.refresh(index=index_name)
+    return ids
+
+
+def exact_top(scores, size, ranks):
+    """Top size positions by score, ties broken by rank like query_builder.sort_clause"""
+    return [n for n, _ in sorted(scores.items(), key=lambda hit: (-hit[1], ranks[hit[0]]))[:size]]
+
+
+def recall(found, expected):
+    return len(set(found) & set(expected)) / len(expected) if expected else 1.0
+
+
+def evaluate(client, index_name, ids, exact_index, query_vectors, k, ef_search, genres, rating, size):
+    from utils import query_builder
+
+    filters = query_builder.movie_filters(genres, rating)
+    mask = exact_index.filter_mask(genres, rating)
+    field_recall = {field: [] for field in query_builder.MOVIE_VECTOR_FIELDS}
+    query_recall, wall, took = [], [], []
+    for vector in query_vectors:
+        body = []
+        for field in query_builder.MOVIE_VECTOR_FIELDS:
+            body += [{"index": index_name}, query_builder.knn_query(vector, size=k, k=k, filters=filters, fields=(field,),
+                                                                    source=False, ef_search=ef_search)]
+        body += [{"index": index_name}, query_builder.knn_query(vector, size=size, k=k, filters=filters,
+                                                                source=False, ef_search=ef_search)]
+        start = time.perf_counter()
+        responses = client.msearch(body=body)["responses"]
+        wall.append(time.perf_counter() - start)
+        took.append(sum(response.get("took", 0) for response in responses) / 1000)
+
+        for field, response in zip(query_builder.MOVIE_VECTOR_FIELDS, responses):
+            expected = exact_top(exact_index.knn(field, vector, k, mask), k, exact_index.ranks)
+            field_recall[field].append(recall([hit["_id"] for hit in response["hits"]["hits"]], [ids[n] for n in expected]))
+        expected = exact_top(exact_index.knn_movies(vector, k, mask), size, exact_index.ranks)
+        query_recall.append(recall([hit["_id"] for hit in responses[-1]["hits"]["hits"]], [ids[n] for n in expected]))
+
+    return {
+        "k": k,
+        "ef_search": ef_search,
+        "filter": {"genres": genres, "rating": rating, "matching_docs": int(mask.sum())},
+        "recall_at_k": {field: float(np.mean(values)) for field, values in field_recall.items()},
+        f"query_movies_recall_at_{size}": float(np.mean(query_recall)),
+        "msearch_latency": percentiles(wall),
+        "took": percentiles(took),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Recall@k of approximate kNN against exact search, with latency")
+    parser.add_argument("--input", default=SAMPLE_FILE, help="movie file (NDJSON)")
+    parser.add_argument("--limit", type=int, default=0, help="only index the first N movies")
+    parser.add_argument("--dimension", type=int, default=1536, help="embedding dimension")
+    parser.add_argument("--k", default="10,30,100", help="comma-separated k values")
+    parser.add_argument("--ef-search", default="16,32,64,128,256", help="comma-separated ef_search values")
+    parser.add_argument("--size", type=int, default=3, help="page size of the query_movies kNN query")
+    parser.add_argument("--target-recall", type=float, default=0.95, help="recall the summary looks for")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    setup_environment()
+    os.environ["AOSS_EMBEDDING_CACHE"] = "off"
+    workdir = tempfile.mkdtemp(prefix="aoss-recall-")
+
+    from benchmarks.fakes import FakeBedrockRuntime, FakeOpenSearchServer
+
+    bedrock_stub = FakeBedrockRuntime(dimension=args.dimension, latency=0.0)
+    docs = load_documents(prepare_input(args.input, workdir), bedrock_stub, args.limit)
+    # The query set is embedded once and reused for every setting
+    query_vectors = [bedrock_stub.embed(query).tolist() for query in QUERIES]
+    filters = list(dict.fromkeys((genres, rating) for _, genres, rating in FILTERS))
+
+    # Keep the modules' import-time client logging out of the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        from indexer import movies_loader
+        from utils.local_search import LocalMovieIndex
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "input": os.path.relpath(args.input, ROOT),
+            "documents": len(docs),
+            "dimension": args.dimension,
+            "queries": len(query_vectors),
+            "size": args.size,
+        },
+        "results": [],
+    }
+
+    with FakeOpenSearchServer(approximate_knn=True) as server:
+        client = server.client()
+        ids = index_documents(client, docs, "movies_recall", movies_loader.movies_index_body({"index.knn": True}))
+        exact_index = LocalMovieIndex.from_documents(docs, exact_threshold=len(docs) + 1)
+        # Build the fake's graphs before timing anything
+        client.msearch(body=[{"index": "movies_recall"}, {"size": 1, "query": {"knn": {"v_plot": {"vector": query_vectors[0], "k": 1}}}},
+                             {"index": "movies_recall"}, {"size": 1, "query": {"knn": {"v_title": {"vector": query_vectors[0], "k": 1}}}}])
+        for k in parse_ints(args.k):
+            for ef_search in parse_ints(args.ef_search):
+                for genres, rating in filters:
+                    result = evaluate(client, "movies_recall", ids, exact_index, query_vectors, k, ef_search,
+                                      genres, rating, args.size)
+                    report["results"].append(result)
+                    print(f"k={k} ef_search={ef_search} genres={genres} rating={rating}: "
+                          f"recall {result['recall_at_k']} p50 {result['msearch_latency']['p50_ms']:.1f} ms", file=sys.stderr)
+
+    summary = {}
+    for k in parse_ints(args.k):
+        worst = {}
+        for result in report["results"]:
+            if result["k"] == k:
+                recall_at_k = min(result["recall_at_k"].values())
+                worst[result["ef_search"]] = min(worst.get(result["ef_search"], 1.0), recall_at_k)
+        # Smallest ef_search meeting the target for every field and filter
+        enough = [ef_search for ef_search, value in sorted(worst.items()) if value >= args.target_recall]
+        summary[str(k)] = {"min_ef_search_for_target": enough[0] if enough else None,
+                           "worst_recall_by_ef_search": worst}
+    report["summary"] = {"target_recall": args.target_recall, "by_k": summary}
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,733 @@
+"""In-process stand-ins for Amazon Bedrock and OpenSearch used by the offline benchmarks
+
+FakeBedrockRuntime answers invoke_model with deterministic hashed bag-of-words vectors
+after a configurable delay. FakeOpenSearchServer is a small HTTP server implementing
+the subset of the OpenSearch REST API the demos use (index management, _bulk,
+_search and _msearch with knn/bool/multi_match/query_string/terms/range queries,
+search pipelines and hybrid queries) and
+counts the bytes that cross the wire. kNN queries are answered exactly, or with
+approximate_knn=True by a beam search over a proximity graph per vector field,
+so recall depends on ef_search the way it does on an HNSW index.
+"""
+# Python Built-Ins:
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import math
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# External Dependencies:
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+# - Bedrock
+
+
+class FakeBedrockRuntime:
+    """Drop-in for a boto3 bedrock-runtime client's invoke_model and invoke_model_with_response_stream
+
+    Vectors are the normalized sum of a seeded random vector per token, so texts that
+    share words are close to each other, and the same text always maps to the same vector.
+    """
+
+    def __init__(self, dimension=1536, latency=0.02, jitter=0.0, answer_tokens=200, token_interval=0.005):
+        self.dimension = dimension
+        self.latency = latency
+        self.jitter = jitter
+        self.answer_tokens = answer_tokens
+        self.token_interval = token_interval
+        self.calls = 0
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def _token_vector(self, token):
+        vector = self._tokens.get(token)
+        if vector is None:
+            seed = int.from_bytes(hashlib.sha1(token.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+            self._tokens[token] = vector
+        return vector
+
+    def embed(self, text, dimension=None):
+        tokens = tokenize(text) or ["<empty>"]
+        vector = np.sum([self._token_vector(token) for token in tokens], axis=0)
+        vector /= np.linalg.norm(vector) or 1.0
+        if dimension and dimension < self.dimension:
+            vector = vector[:dimension] / (np.linalg.norm(vector[:dimension]) or 1.0)
+        return vector
+
+    def _sleep(self):
+        delay = self.latency
+        if self.jitter:
+            delay += float(np.random.uniform(0, self.jitter))
+        if delay > 0:
+            time.sleep(delay)
+
+    def invoke_model(self, modelId=None, body=None, contentType=None, accept=None, **kwargs):
+        request = json.loads(body)
+        with self._lock:
+            self.calls += 1
+        self._sleep()
+        vector = self.embed(request.get("inputText", ""), request.get("dimensions"))
+        return {"body": io.BytesIO(json.dumps({"embedding": vector.tolist()}).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId=None, body=None, contentType=None, accept=None, **kwargs):
+        """Stream an answer echoing the prompt's first words, in Claude (completions or messages) or Titan format
+
+        The first chunk arrives after the call latency, later ones token_interval apart.
+        """
+        request = json.loads(body)
+        with self._lock:
+            self.calls += 1
+        if "messages" in request:
+            prompt, max_tokens = request["messages"][-1]["content"], request.get("max_tokens", 100)
+            chunk = lambda text: {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}}
+        elif "prompt" in request:
+            prompt, max_tokens = request["prompt"], request.get("max_tokens_to_sample", 100)
+            chunk = lambda text: {"completion": text, "stop_reason": None}
+        else:
+            prompt, max_tokens = request.get("inputText", ""), request.get("textGenerationConfig", {}).get("maxTokenCount", 100)
+            chunk = lambda text: {"outputText": text}
+        words = prompt.split()[:min(max_tokens, self.answer_tokens)]
+
+        def events():
+            self._sleep()
+            for n, word in enumerate(words):
+                if n:
+                    time.sleep(self.token_interval)
+                yield {"chunk": {"bytes": json.dumps(chunk(word + " ")).encode("utf-8")}}
+        return {"body": events()}
+
+
+# - OpenSearch
+
+
+class FakeIndex:
+    def __init__(self, name, body=None, approximate_knn=False):
+        body = body or {}
+        self.name = name
+        self.settings = body.get("settings", {})
+        self.mappings = body.get("mappings", {})
+        self.approximate_knn = approximate_knn
+        self.docs = {}
+        self._vectors = {}
+        self._graphs = {}
+        self._tokens = {}
+        self._lock = threading.RLock()
+
+    def source_excludes(self):
+        return self.mappings.get("_source", {}).get("excludes", [])
+
+    def index(self, doc_id, source):
+        with self._lock:
+            self.docs[doc_id] = source
+            self._vectors = {}
+            self._graphs = {}
+            self._tokens.pop(doc_id, None)
+
+    def tokens(self, doc_id, field):
+        """Token list of a text field, cached per document"""
+        cached = self._tokens.setdefault(doc_id, {})
+        if field not in cached:
+            cached[field] = tokenize(" ".join(map(str, _field_values(self.docs[doc_id], field))))
+        return cached[field]
+
+    def vectors(self, field):
+        """Return (ids, matrix, squared norms) for every document that has a vector in field"""
+        with self._lock:
+            if field not in self._vectors:
+                ids = [doc_id for doc_id, doc in self.docs.items() if doc.get(field) is not None]
+                matrix = np.array([self.docs[doc_id][field] for doc_id in ids], dtype=np.float32).reshape(len(ids), -1)
+                self._vectors[field] = (ids, matrix, np.einsum("ij,ij->i", matrix, matrix))
+            return self._vectors[field]
+
+
+    def ef_search(self):
+        """Index-level ef_search (index.knn.algo_param.ef_search), 100 when unset"""
+        return int(_flatten_index_settings(self.settings).get("knn.algo_param.ef_search") or 100)
+
+    def graph(self, field):
+        """Proximity graph of field: each vector linked to its m nearest neighbours plus reverse links up to 2m
+
+        Built once per field like a single HNSW layer, with m from the field's
+        method parameters, and searched from the vector nearest the centroid.
+        """
+        with self._lock:
+            if field not in self._graphs:
+                ids, matrix, norms = self.vectors(field)
+                method = self.mappings.get("properties", {}).get(field, {}).get("method", {})
+                m = int(method.get("parameters", {}).get("m", 16))
+                count = len(ids)
+                nearest = np.zeros((count, min(m, max(count - 1, 0))), dtype=np.int64)
+                for start in range(0, count, 1024):
+                    block = norms[start:start + 1024, None] - 2 * (matrix[start:start + 1024] @ matrix.T) + norms[None, :]
+                    block[np.arange(len(block)), np.arange(start, start + len(block))] = np.inf
+                    if nearest.shape[1]:
+                        nearest[start:start + 1024] = np.argpartition(block, nearest.shape[1] - 1, axis=1)[:, :nearest.shape[1]]
+                links = [list(row) for row in nearest]
+                for n, row in enumerate(nearest):
+                    for neighbour in row:
+                        if len(links[neighbour]) < 2 * m and n not in links[neighbour]:
+                            links[neighbour].append(n)
+                centroid = matrix.mean(axis=0) if count else None
+                entry = int(np.argmin(norms - 2 * (matrix @ centroid))) if count else 0
+                self._graphs[field] = ([np.array(row, dtype=np.int64) for row in links], entry)
+            return self._graphs[field]
+
+
+def _field_values(doc, field):
+    if field.endswith(".keyword"):
+        field = field[:-len(".keyword")]
+    value = doc.get(field)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+class QueryEvaluator:
+    """Evaluates the supported query DSL against one FakeIndex, returning {doc_id: score}"""
+
+    def __init__(self, index, pipeline=None):
+        self.index = index
+        self.docs = index.docs
+        self.pipeline = pipeline
+
+    def evaluate(self, query):
+        if not query:
+            return {doc_id: 1.0 for doc_id in self.docs}
+        (kind, params), = query.items()
+        handler = getattr(self, f"_{kind}", None)
+        if handler is None:
+            raise ValueError(f"unsupported query type [{kind}]")
+        return handler(params)
+
+    def _hybrid(self, params):
+        processors = [p.get("normalization-processor") for p in (self.pipeline or {}).get("phase_results_processors", [])]
+        processor = next((p for p in processors if p), None)
+        if processor is None:
+            raise ValueError("hybrid query requires a search pipeline with a normalization-processor")
+        queries = params["queries"]
+        weights = processor.get("combination", {}).get("parameters", {}).get("weights") or [1.0] * len(queries)
+        combined = {}
+        for weight, clause in zip(weights, queries):
+            scores = self.evaluate(clause)
+            if not scores:
+                continue
+            low, high = min(scores.values()), max(scores.values())
+            for doc_id, score in scores.items():
+                normalized = (score - low) / (high - low) if high > low else 1.0
+                combined[doc_id] = combined.get(doc_id, 0.0) + weight * normalized
+        total = sum(weights)
+        return {doc_id: score / total for doc_id, score in combined.items()}
+
+    def _match_all(self, params):
+        return {doc_id: 1.0 for doc_id in self.docs}
+
+    def _filter_ids(self, clauses):
+        if isinstance(clauses, dict):
+            clauses = [clauses]
+        ids = set(self.docs)
+        for clause in clauses:
+            ids &= set(self.evaluate(clause))
+        return ids
+
+    def _bool(self, params):
+        as_list = lambda c: c if isinstance(c, list) else ([c] if c else [])
+        must, should = as_list(params.get("must")), as_list(params.get("should"))
+        filters, must_not = as_list(params.get("filter")), as_list(params.get("must_not"))
+
+        scores = None
+        for clause in must:
+            matched = self.evaluate(clause)
+            scores = matched if scores is None else {i: s + matched[i] for i, s in scores.items() if i in matched}
+        should_scores = {}
+        for clause in should:
+            for doc_id, score in self.evaluate(clause).items():
+                should_scores[doc_id] = should_scores.get(doc_id, 0.0) + score
+        if scores is None:
+            if should:
+                scores = dict(should_scores)
+            else:
+                scores = {doc_id: 0.0 for doc_id in self.docs}
+        else:
+            scores = {i: s + should_scores.get(i, 0.0) for i, s in scores.items()}
+        if filters:
+            allowed = self._filter_ids(filters)
+            scores = {i: s for i, s in scores.items() if i in allowed}
+        for clause in must_not:
+            for doc_id in self.evaluate(clause):
+                scores.pop(doc_id, None)
+        return scores
+
+    def _knn(self, params):
+        (field, options), = params.items()
+        ids, matrix, norms = self.index.vectors(field)
+        if not ids:
+            return {}
+        query = np.asarray(options["vector"], dtype=np.float32)
+        candidates = np.arange(len(ids))
+        if options.get("filter"):
+            allowed = self._filter_ids(options["filter"])
+            candidates = np.array([n for n, doc_id in enumerate(ids) if doc_id in allowed], dtype=int)
+            if not len(candidates):
+                return {}
+        k = min(int(options.get("k", 10)), len(candidates))
+        if self.index.approximate_knn:
+            ef = int(options.get("method_parameters", {}).get("ef_search") or self.index.ef_search())
+            # Like the engines, a filter leaving no more documents than ef is searched exactly
+            if len(candidates) > max(ef, k):
+                allowed = None if len(candidates) == len(ids) else set(candidates.tolist())
+                return {ids[n]: score for n, score in self._graph_search(field, query, k, max(ef, k), allowed)}
+        # Squared L2 distance without materializing the difference matrix
+        distances = norms[candidates] - 2 * (matrix[candidates] @ query) + float(query @ query)
+        top = np.argpartition(distances, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+        return {ids[candidates[n]]: float(1.0 / (1.0 + distances[n])) for n in top}
+
+    def _graph_search(self, field, query, k, ef, allowed=None):
+        """Beam search of width ef over the field's graph; (position, score) of the best k allowed vectors
+
+        As with filtering during the graph walk, filtered-out vectors are traversed
+        but never returned, and the walk stops once ef allowed vectors are found and
+        no candidate is closer than the worst of them.
+        """
+        _, matrix, norms = self.index.vectors(field)
+        links, entry = self.index.graph(field)
+        query_norm = float(query @ query)
+        distance = lambda nodes: norms[nodes] - 2 * (matrix[nodes] @ query) + query_norm
+        entry_distance = float(distance(np.array([entry]))[0])
+        visited = {entry}
+        frontier = [(entry_distance, entry)]
+        found = [(-entry_distance, entry)] if allowed is None or entry in allowed else []
+        while frontier:
+            current_distance, current = heapq.heappop(frontier)
+            if len(found) >= ef and current_distance > -found[0][0]:
+                break
+            neighbours = [n for n in links[current].tolist() if n not in visited]
+            if not neighbours:
+                continue
+            visited.update(neighbours)
+            for n, d in zip(neighbours, distance(np.array(neighbours)).tolist()):
+                if len(found) < ef or d < -found[0][0]:
+                    heapq.heappush(frontier, (d, n))
+                    if allowed is None or n in allowed:
+                        heapq.heappush(found, (-d, n))
+                        if len(found) > ef:
+                            heapq.heappop(found)
+        best = sorted((-negative, n) for negative, n in found)[:k]
+        return [(n, 1.0 / (1.0 + d)) for d, n in best]
+
+    def _text_scores(self, query_text, fields):
+        terms = tokenize(query_text)
+        if not terms:
+            return {}
+        total = max(len(self.docs), 1)
+        scores = {}
+        for term in set(terms):
+            matching = {}
+            for doc_id in self.docs:
+                tf = sum(self.index.tokens(doc_id, f.split("^")[0]).count(term) for f in fields)
+                if tf:
+                    matching[doc_id] = tf
+            if not matching:
+                continue
+            idf = math.log(1 + (total - len(matching) + 0.5) / (len(matching) + 0.5))
+            for doc_id, tf in matching.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf / (tf + 1.2)
+        return scores
+
+    def _multi_match(self, params):
+        return self._text_scores(params["query"], params.get("fields", ["*"]))
+
+    def _match(self, params):
+        (field, options), = params.items()
+        text = options["query"] if isinstance(options, dict) else options
+        return self._text_scores(text, [field])
+
+    def _query_string(self, params):
+        text = str(params.get("query", "*"))
+        fields = params.get("fields", [])
+        if text.strip() == "*":
+            return {doc_id: 1.0 for doc_id, doc in self.docs.items()
+                    if not fields or any(_field_values(doc, f) for f in fields)}
+        return self._text_scores(text, fields)
+
+    def _term(self, params):
+        (field, value), = params.items()
+        value = value["value"] if isinstance(value, dict) else value
+        return {doc_id: 1.0 for doc_id, doc in self.docs.items() if value in _field_values(doc, field)}
+
+    def _terms(self, params):
+        (field, values), = params.items()
+        values = set(values)
+        return {doc_id: 1.0 for doc_id, doc in self.docs.items() if values & set(_field_values(doc, field))}
+
+    def _range(self, params):
+        (field, bounds), = params.items()
+        checks = {
+            "gte": lambda v, b: v >= b, "gt": lambda v, b: v > b,
+            "lte": lambda v, b: v <= b, "lt": lambda v, b: v < b,
+        }
+        matched = {}
+        for doc_id, doc in self.docs.items():
+            values = _field_values(doc, field)
+            if values and all(checks[op](values[0], float(bound)) for op, bound in bounds.items() if op in checks):
+                matched[doc_id] = 1.0
+        return matched
+
+    def _ids(self, params):
+        return {doc_id: 1.0 for doc_id in params.get("values", []) if doc_id in self.docs}
+
+
+def _filter_source(source, spec, excludes):
+    source = {k: v for k, v in source.items() if k not in excludes}
+    if spec is False:
+        return None
+    if isinstance(spec, dict):
+        includes = spec.get("includes")
+        if includes:
+            source = {k: v for k, v in source.items() if k in includes}
+        source = {k: v for k, v in source.items() if k not in spec.get("excludes", [])}
+    elif isinstance(spec, list):
+        source = {k: v for k, v in source.items() if k in spec}
+    return source
+
+
+def _sort_key(sort_spec):
+    (field, options), = sort_spec.items() if isinstance(sort_spec, dict) else [(sort_spec, {})]
+    order = options.get("order", "desc" if field == "_score" else "asc") if isinstance(options, dict) else options
+    return field, order
+
+
+def search_index(index, body, pipeline=None):
+    """Run one search body against index and return an OpenSearch-shaped response"""
+    start = time.perf_counter()
+    scores = QueryEvaluator(index, pipeline).evaluate(body.get("query"))
+
+    hits = [(doc_id, score) for doc_id, score in scores.items()]
+    sort = body.get("sort") or [{"_score": {"order": "desc"}}]
+    for spec in reversed(sort):
+        field, order = _sort_key(spec)
+        if field == "_score":
+            key = lambda hit: hit[1]
+        else:
+            key = lambda hit, f=field: (_field_values(index.docs[hit[0]], f) or [float("-inf")])[0]
+        hits.sort(key=key, reverse=(order == "desc"))
+
+    search_after = body.get("search_after")
+    if search_after:
+        fields = [_sort_key(spec) for spec in sort]
+
+        def sort_values(hit):
+            return [hit[1] if f == "_score" else (_field_values(index.docs[hit[0]], f) or [None])[0] for f, _ in fields]
+
+        def after(hit):
+            for value, cursor, (_, order) in zip(sort_values(hit), search_after, fields):
+                if value == cursor:
+                    continue
+                if value is None or cursor is None:
+                    return value is not None
+                return value < cursor if order == "desc" else value > cursor
+            return False
+
+        hits = [hit for hit in hits if after(hit)]
+
+    offset, size = int(body.get("from", 0)), int(body.get("size", 10))
+    page = hits[offset:offset + size]
+
+    rendered = []
+    for doc_id, score in page:
+        doc = index.docs[doc_id]
+        hit = {"_index": index.name, "_id": doc_id, "_score": score}
+        source = _filter_source(doc, body.get("_source", True), index.source_excludes())
+        if source is not None:
+            hit["_source"] = source
+        requested = body.get("fields", []) + body.get("docvalue_fields", [])
+        if requested:
+            hit["fields"] = {}
+            for field in requested:
+                field = field["field"] if isinstance(field, dict) else field
+                values = _field_values(doc, field)
+                if values:
+                    hit["fields"][field] = values
+        if body.get("sort"):
+            hit["sort"] = [score if f == "_score" else (_field_values(doc, f) or [None])[0]
+                           for f, _ in (_sort_key(spec) for spec in sort)]
+        rendered.append(hit)
+
+    took = int((time.perf_counter() - start) * 1000)
+    return {
+        "took": took,
+        "timed_out": False,
+        "hits": {
+            "total": {"value": len(hits), "relation": "eq"},
+            "max_score": max((score for _, score in hits), default=None),
+            "hits": rendered,
+        },
+    }
+
+
+def apply_filter_path(response, filter_path):
+    """Trim a response dict to the dotted paths in filter_path (supports * segments)"""
+    if not filter_path:
+        return response
+    paths = [p.split(".") for p in filter_path.split(",")]
+
+    def keep(node, parts_list):
+        if any(not parts for parts in parts_list):
+            return node
+        if isinstance(node, list):
+            items = [keep(item, parts_list) for item in node]
+            return [item for item in items if item is not None]
+        if not isinstance(node, dict):
+            return None
+        result = {}
+        for key, value in node.items():
+            children = [parts[1:] for parts in parts_list if parts[0] in ("*", key)]
+            if children:
+                kept = keep(value, children)
+                if kept is not None and kept != {}:
+                    result[key] = kept
+        return result
+
+    return keep(response, paths) or {}
+
+
+class FakeOpenSearchServer:
+    """Threaded HTTP server speaking enough of the OpenSearch REST API for the demos"""
+
+    def __init__(self, host="127.0.0.1", port=0, approximate_knn=False):
+        self.approximate_knn = approximate_knn
+        self.indices = {}
+        self.pipelines = {}
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.requests = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                wire_bytes = len(raw)
+                if self.headers.get("Content-Encoding") == "gzip":
+                    raw = gzip.decompress(raw)
+                url = urlparse(self.path)
+                status, payload = server.dispatch(self.command, url.path, parse_qs(url.query), raw)
+                data = b"" if payload is None else json.dumps(payload).encode("utf-8")
+                # Count before responding: the client may read traffic() as soon as it has the response
+                server._count(url.path, wire_bytes, len(data))
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _handle
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address
+        self._thread = None
+
+    # - Lifecycle
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-opensearch", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def client(self, **kwargs):
+        """Return an opensearchpy client connected to this server"""
+        from opensearchpy import OpenSearch
+        return OpenSearch(hosts=[{"host": self.host, "port": self.port}], use_ssl=False, timeout=60, **kwargs)
+
+    def _count(self, path, request_bytes, response_bytes):
+        endpoint = next((part for part in path.split("/") if part.startswith("_")), "_doc")
+        with self._lock:
+            self.request_bytes += request_bytes
+            self.response_bytes += response_bytes
+            stats = self.requests.setdefault(endpoint, {"requests": 0, "request_bytes": 0, "response_bytes": 0})
+            stats["requests"] += 1
+            stats["request_bytes"] += request_bytes
+            stats["response_bytes"] += response_bytes
+
+    def reset_counters(self):
+        with self._lock:
+            self.request_bytes = self.response_bytes = 0
+            self.requests = {}
+
+    def traffic(self):
+        with self._lock:
+            return {
+                "request_bytes": self.request_bytes,
+                "response_bytes": self.response_bytes,
+                "endpoints": {k: dict(v) for k, v in self.requests.items()},
+            }
+
+    # - Routing
+
+    def dispatch(self, method, path, params, raw):
+        parts = [p for p in path.split("/") if p]
+        try:
+            body = json.loads(raw) if raw and not parts[-1:] in (["_bulk"], ["_msearch"]) else {}
+            return self._route(method, parts, params, body, raw)
+        except KeyError as e:
+            return 404, {"error": {"type": "index_not_found_exception", "reason": f"no such index {e}"}, "status": 404}
+        except Exception as e:
+            return 400, {"error": {"type": "parsing_exception", "reason": str(e)}, "status": 400}
+
+    def _route(self, method, parts, params, body, raw):
+        filter_path = params.get("filter_path", [None])[0]
+        if not parts:
+            return 200, {"version": {"number": "2.17.0", "distribution": "opensearch"}}
+        if parts[0] == "_cluster" and parts[1:2] == ["health"]:
+            return 200, {"status": "green", "number_of_nodes": 1}
+        if parts[0] == "_search" and parts[1:2] == ["pipeline"]:
+            name = parts[2] if len(parts) > 2 else None
+            if method == "PUT":
+                self.pipelines[name] = body
+                return 200, {"acknowledged": True}
+            if name in self.pipelines:
+                return 200, {name: self.pipelines[name]}
+            return 404, {"error": {"type": "resource_not_found_exception", "reason": f"pipeline [{name}] not found"}, "status": 404}
+        if parts[-1] == "_bulk":
+            return 200, self._bulk(parts[0] if len(parts) > 1 else None, raw)
+        if parts[-1] == "_msearch":
+            response = self._msearch(parts[0] if len(parts) > 1 else None, raw)
+            return 200, apply_filter_path(response, filter_path)
+        if parts[-1] == "_search":
+            pipeline = params.get("search_pipeline", [None])[0]
+            if pipeline and pipeline not in self.pipelines:
+                return 404, {"error": {"type": "resource_not_found_exception", "reason": f"pipeline [{pipeline}] not found"}, "status": 404}
+            response = self._search(parts[0], body, self.pipelines.get(pipeline))
+            return 200, apply_filter_path(response, filter_path)
+
+        index_name = parts[0]
+        if len(parts) == 1:
+            if method == "HEAD":
+                return (200 if index_name in self.indices else 404), None
+            if method == "PUT":
+                if index_name in self.indices:
+                    return 400, {"error": {"type": "resource_already_exists_exception"}, "status": 400}
+                self.indices[index_name] = FakeIndex(index_name, body, self.approximate_knn)
+                return 200, {"acknowledged": True, "index": index_name}
+            if method == "DELETE":
+                self.indices.pop(index_name)
+                return 200, {"acknowledged": True}
+            index = self.indices[index_name]
+            return 200, {index_name: {"settings": index.settings, "mappings": index.mappings}}
+        index = self.indices[index_name]
+        action = parts[1]
+        if action == "_settings":
+            if method == "PUT":
+                _merge(index.settings, body)
+                return 200, {"acknowledged": True}
+            return 200, {index_name: {"settings": {"index": _flatten_index_settings(index.settings)}}}
+        if action == "_mapping":
+            return 200, {index_name: {"mappings": index.mappings}}
+        if action in ("_refresh", "_forcemerge", "_flush"):
+            return 200, {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+        if action == "_count":
+            return 200, {"count": len(QueryEvaluator(index).evaluate(body.get("query")))}
+        if action == "_stats":
+            # Stored size is the _source as kept on disk, i.e. without mapping excludes
+            excludes = index.source_excludes()
+            size = sum(len(json.dumps(_filter_source(doc, True, excludes))) for doc in index.docs.values())
+            return 200, {"indices": {index_name: {"primaries": {
+                "docs": {"count": len(index.docs)}, "store": {"size_in_bytes": size}}}}}
+        if action == "_doc" and len(parts) > 2:
+            doc = index.docs[parts[2]]
+            return 200, {"_index": index_name, "_id": parts[2], "found": True, "_source": doc}
+        return 400, {"error": {"type": "unsupported_operation", "reason": "/".join(parts)}, "status": 400}
+
+    def _bulk(self, default_index, raw):
+        lines = [line for line in raw.decode("utf-8").split("\n") if line.strip()]
+        items = []
+        errors = False
+        for action_line, source_line in zip(lines[0::2], lines[1::2]):
+            (op, meta), = json.loads(action_line).items()
+            index_name = meta.get("_index", default_index)
+            doc_id = meta.get("_id") or uuid.uuid4().hex
+            index = self.indices.get(index_name)
+            if index is None:
+                index = self.indices[index_name] = FakeIndex(index_name, approximate_knn=self.approximate_knn)
+            if op == "create" and doc_id in index.docs:
+                errors = True
+                items.append({op: {"_index": index_name, "_id": doc_id, "status": 409,
+                                   "error": {"type": "version_conflict_engine_exception"}}})
+                continue
+            index.index(doc_id, json.loads(source_line))
+            items.append({op: {"_index": index_name, "_id": doc_id, "status": 201, "result": "created"}})
+        return {"took": 1, "errors": errors, "items": items}
+
+    def _search(self, index_name, body, pipeline=None):
+        return search_index(self.indices[index_name], body, pipeline)
+
+    def _msearch(self, default_index, raw):
+        lines = [line for line in raw.decode("utf-8").split("\n") if line.strip()]
+        responses = []
+        for header_line, body_line in zip(lines[0::2], lines[1::2]):
+            header = json.loads(header_line)
+            index_name = header.get("index", default_index)
+            if isinstance(index_name, list):
+                index_name = index_name[0]
+            try:
+                response = self._search(index_name, json.loads(body_line))
+                response["status"] = 200
+            except KeyError:
+                response = {"error": {"type": "index_not_found_exception", "index": index_name}, "status": 404}
+            responses.append(response)
+        return {"took": sum(r.get("took", 0) for r in responses), "responses": responses}
+
+
+def _merge(target, update):
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+def _flatten_index_settings(settings):
+    flat = {}
+
+    def walk(prefix, node):
+        for key, value in node.items():
+            name = f"{prefix}.{key}" if prefix else key
+            if isinstance(value, dict):
+                walk(name, value)
+            else:
+                flat[name[len("index."):] if name.startswith("index.") else name] = value
+
+    walk("", settings)
+    return flat
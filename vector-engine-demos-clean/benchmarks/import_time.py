@@ -0,0 +1,120 @@
+"""Cold import time of the demo modules
+
+Each module is imported in a fresh interpreter (so nothing is cached in
+sys.modules) with -X importtime. The report lists the wall time, the slowest
+imported packages, and whether any of the heavy optional dependencies that are
+supposed to load lazily (langchain, sentence_transformers, torch) were pulled in.
+
+Run from the vector-engine-demos-clean directory:
+
+    python -m benchmarks.import_time --max-ms 1500
+
+With --max-ms, the exit status is non-zero when a module exceeds the budget or
+imports a lazy dependency eagerly, so the script can gate a CI job.
+"""
+# Python Built-Ins:
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.run_benchmarks import ROOT, setup_environment
+
+MODULES = [
+    "utils.bedrockopensearch",
+    "utils.bedrockopensearch_async",
+    "utils.opensearch",
+    "indexer.movies_loader",
+]
+
+# Top-level packages that must only be imported when first used
+LAZY_PACKAGES = ("langchain", "langchain_aws", "langchain_community", "sentence_transformers", "torch")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted({{m.split(".")[0] for m in sys.modules}})}}))
+"""
+
+
+def parse_importtime(stderr, top):
+    """Slowest direct imports by cumulative time, from -X importtime output"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        if not cumulative_us.strip().isdigit():
+            continue
+        # Nesting is shown as two spaces of indentation per level; level 1 are the
+        # modules imported by the measured module (and by its parent packages)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            entries.append((int(cumulative_us), name.strip()))
+    return [{"module": name, "cumulative_ms": us / 1000} for us, name in sorted(entries, reverse=True)[:top]]
+
+
+def measure(module, repeat=3, top=8):
+    """Import module in fresh interpreters and return timings and eagerly loaded lazy packages"""
+    samples = []
+    stderr = ""
+    loaded = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+            cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            return {"module": module, "error": result.stderr.strip().splitlines()[-1:]}
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        samples.append(probe["seconds"])
+        loaded = probe["modules"]
+        stderr = result.stderr
+    return {
+        "module": module,
+        "median_ms": statistics.median(samples) * 1000,
+        "min_ms": min(samples) * 1000,
+        "eager_lazy_packages": [name for name in LAZY_PACKAGES if name in loaded],
+        "slowest_packages": parse_importtime(stderr, top),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Cold import time of the demo modules")
+    parser.add_argument("modules", nargs="*", default=MODULES, help="modules to import (default: the demo modules)")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per module")
+    parser.add_argument("--max-ms", type=float, help="fail when a module's median import time exceeds this")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    setup_environment()
+    results = [measure(module, args.repeat) for module in args.modules]
+
+    output = json.dumps({"imports": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    failures = []
+    for result in results:
+        if "error" in result:
+            failures.append(f"{result['module']}: import failed: {result['error']}")
+            continue
+        if result["eager_lazy_packages"]:
+            failures.append(f"{result['module']}: imports {', '.join(result['eager_lazy_packages'])} eagerly")
+        if args.max_ms is not None and result["median_ms"] > args.max_ms:
+            failures.append(f"{result['module']}: {result['median_ms']:.0f} ms > {args.max_ms:.0f} ms")
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    if failures and args.max_ms is not None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
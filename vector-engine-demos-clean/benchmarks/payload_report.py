@@ -0,0 +1,157 @@
+"""Stored _source size and per-query response bytes with and without the lean-payload options
+
+Indexes the movie file twice into a local FakeOpenSearchServer using the loader's
+mapping: once with the vectors kept in _source and once with
+AOSS_SOURCE_EXCLUDE_VECTORS, and reports the stored _source bytes per document.
+query_movies, query_movies_hybrid and query_qna are then run with response
+trimming (AOSS_TRIM_RESPONSES, filter_path) off and on, and the response bytes
+per call are compared. A full-document fetch (match_all without _source
+filtering), as done by tools that page through the index, shows what the
+vectors cost on reads.
+
+Run from the vector-engine-demos-clean directory:
+
+    python -m benchmarks.payload_report --output payload.json
+"""
+# Python Built-Ins:
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.run_benchmarks import (
+    FILTERS, QUERIES, ROOT, SAMPLE_FILE, git_revision, load_qna_index, prepare_input, setup_environment
+)
+
+
+def load_movies(input_path, limit):
+    movies = []
+    with open(input_path) as f:
+        for line in f:
+            if line.strip():
+                movies.append(json.loads(line))
+    return movies[:limit] if limit else movies
+
+
+def index_movies(client, bedrock_stub, movies, index_name, body):
+    client.indices.create(index=index_name, body=body)
+    lines = []
+    for n, movie in enumerate(movies):
+        doc = dict(movie)
+        doc["v_title"] = bedrock_stub.embed(doc["title"]).tolist()
+        if doc.get("plot"):
+            doc["v_plot"] = bedrock_stub.embed(doc["plot"]).tolist()
+        lines.append(json.dumps({"index": {"_index": index_name, "_id": f"movie-{n}"}}))
+        lines.append(json.dumps(doc))
+    client.bulk(body="\n".join(lines) + "\n")
+
+
+def stored_bytes(client, index_name):
+    stats = client.indices.stats(index=index_name)["indices"][index_name]["primaries"]
+    return stats["store"]["size_in_bytes"], stats["docs"]["count"]
+
+
+def response_bytes(server, func, calls):
+    server.reset_counters()
+    for args in calls:
+        func(*args)
+    traffic = server.traffic()
+    # The fake counts a request before answering it, so every call is in traffic() by now
+    requests = sum(stats["requests"] for stats in traffic["endpoints"].values())
+    if requests < len(calls):
+        raise RuntimeError(f"{len(calls)} calls but only {requests} requests counted by the server")
+    return {"calls": len(calls), "response_bytes": traffic["response_bytes"],
+            "bytes_per_call": traffic["response_bytes"] / max(len(calls), 1),
+            "endpoints": {name: {"requests": stats["requests"], "response_bytes": stats["response_bytes"]}
+                          for name, stats in traffic["endpoints"].items()}}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Stored and transferred bytes with and without the lean-payload options")
+    parser.add_argument("--input", default=SAMPLE_FILE, help="movie file (NDJSON)")
+    parser.add_argument("--limit", type=int, default=0, help="only index the first N movies")
+    parser.add_argument("--dimension", type=int, default=1536, help="embedding dimension")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    setup_environment()
+    os.environ["AOSS_EMBEDDING_CACHE"] = "off"
+    workdir = tempfile.mkdtemp(prefix="aoss-payload-")
+
+    from benchmarks.fakes import FakeBedrockRuntime, FakeOpenSearchServer
+
+    bedrock_stub = FakeBedrockRuntime(dimension=args.dimension, latency=0.0)
+    input_path = prepare_input(args.input, workdir)
+    movies = load_movies(input_path, args.limit)
+
+    # Keep the modules' import-time client logging out of the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        from indexer import movies_loader
+        from utils import bedrockopensearch
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "input": os.path.relpath(args.input, ROOT),
+            "documents": len(movies),
+            "dimension": args.dimension,
+        },
+        "storage": {},
+        "queries": {},
+    }
+
+    with FakeOpenSearchServer() as server:
+        client = server.client()
+        bedrockopensearch.boto3_bedrock = bedrock_stub
+        bedrockopensearch.client = client
+
+        for label, exclude in (("vectors_in_source", False), ("vectors_excluded", True)):
+            index_name = f"movies_{label}"
+            index_movies(client, bedrock_stub, movies, index_name,
+                         movies_loader.movies_index_body({"index.knn": True}, exclude_vectors=exclude))
+            size, count = stored_bytes(client, index_name)
+            fetch = response_bytes(server, lambda: client.search(index=index_name, body={"size": 10, "query": {"match_all": {}}}), [()])
+            report["storage"][label] = {
+                "source_bytes": size,
+                "source_bytes_per_doc": size / max(count, 1),
+                "full_fetch_bytes_per_hit": fetch["response_bytes"] / 10,
+            }
+
+        load_qna_index(client, bedrock_stub, input_path, "opensearch_qna")
+        index_name = "movies_vectors_excluded"
+        movie_calls = [(q, sort, genres, rating, index_name) for q in QUERIES for sort, genres, rating in FILTERS]
+        qna_calls = [(q, "opensearch_qna") for q in QUERIES]
+        for trim in (False, True):
+            bedrockopensearch.trim_responses = trim
+            label = "trimmed" if trim else "untrimmed"
+            report["queries"][label] = {
+                "query_movies": response_bytes(server, bedrockopensearch.query_movies, movie_calls),
+                "query_movies_hybrid": response_bytes(server, bedrockopensearch.query_movies_hybrid, movie_calls),
+                "query_qna": response_bytes(server, bedrockopensearch.query_qna, qna_calls),
+            }
+
+    storage = report["storage"]
+    report["savings"] = {
+        "source_bytes_saved_pct": 100 * (1 - storage["vectors_excluded"]["source_bytes"]
+                                         / max(storage["vectors_in_source"]["source_bytes"], 1)),
+        "query_bytes_saved_pct": {
+            name: 100 * (1 - report["queries"]["trimmed"][name]["response_bytes"]
+                         / max(report["queries"]["untrimmed"][name]["response_bytes"], 1))
+            for name in report["queries"]["trimmed"]
+        },
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,291 @@
+"""Offline benchmarks for movies_loader.full_load, query_movies, query_qna and the streamed Q&A answer
+
+Runs the real loader and query code against FakeBedrockRuntime and a local
+FakeOpenSearchServer, so no AWS endpoint is needed, and prints a JSON report with
+ingest docs/sec, query latency percentiles and bytes sent over the wire.
+
+Run from the vector-engine-demos-clean directory:
+
+    python -m benchmarks.run_benchmarks --output results.json
+"""
+# Python Built-Ins:
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SAMPLE_FILE = os.path.join(ROOT, "indexer", "sample-movies-1500.json")
+
+QUERIES = [
+    "Movie to watch in holidays",
+    "space adventure with aliens",
+    "romantic comedy in new york",
+    "detective solving a murder mystery",
+    "superhero saves the world",
+    "family drama about a father and son",
+    "animated film for kids",
+    "war movie based on a true story",
+    "haunted house horror",
+    "heist with a clever twist",
+    "high school coming of age",
+    "robots and artificial intelligence",
+]
+FILTERS = [("score", "*", 0.0), ("year", "Comedy", 5.0), ("rating", "Action", 7.0), ("score", "Romance", 6.0)]
+
+
+def setup_environment():
+    """Point the demo modules at local stand-ins before they are imported"""
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault("AOSS_VECTORSEARCH_REGION", "us-east-1")
+    os.environ.setdefault("AOSS_VECTORSEARCH_ENDPOINT", "localhost")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    # Keep per-query JSON trace lines out of the benchmark output
+    os.environ.setdefault("AOSS_METRICS_LOG", "off")
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def prepare_input(input_path, workdir):
+    """Copy the movie file, filling the poster field the search page reads from image_url"""
+    prepared = os.path.join(workdir, "movies.json")
+    with open(input_path) as source, open(prepared, "w") as target:
+        for line in source:
+            if not line.strip():
+                continue
+            movie = json.loads(line)
+            movie.setdefault("poster", movie.get("image_url"))
+            target.write(json.dumps(movie) + "\n")
+    return prepared
+
+
+def bench_ingest(server, bedrock_stub, input_path, index_name, workdir, bulk_mode=False, workers=0):
+    from indexer import movies_loader
+
+    movies_loader.bedrock_runtime = bedrock_stub
+    movies_loader.json_file_path = input_path
+    movies_loader.checkpoint_path = os.path.join(workdir, "checkpoint.json")
+    movies_loader.failed_documents_path = os.path.join(workdir, "failed-documents.ndjson")
+
+    client = server.client()
+    server.reset_counters()
+    calls_before = bedrock_stub.calls
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        movies_loader.full_load(index_name, client, bulk_mode=bulk_mode, workers=workers, client_factory=server.client,
+                                status_path=os.path.join(workdir, "load-status.json"))
+    elapsed = time.perf_counter() - start
+
+    docs = len(server.indices[index_name].docs)
+    return {
+        "documents": docs,
+        "seconds": elapsed,
+        "docs_per_sec": docs / elapsed if elapsed else None,
+        "workers": workers,
+        # Calls made in worker processes are not counted by the parent's stub
+        "embedding_calls": None if workers else bedrock_stub.calls - calls_before,
+        "wire": server.traffic(),
+    }
+
+
+def load_qna_index(client, bedrock_stub, input_path, index_name):
+    """Index movie plots as Q&A passages (setup only, not measured)"""
+    client.indices.create(index=index_name, body={
+        "settings": {"index.knn": True},
+        "mappings": {"properties": {
+            "content": {"type": "text"},
+            "title": {"type": "text"},
+            "v_content": {"type": "knn_vector", "dimension": bedrock_stub.dimension},
+        }},
+    })
+    body = []
+    with open(input_path) as f:
+        for n, line in enumerate(f):
+            movie = json.loads(line)
+            if not movie.get("plot"):
+                continue
+            body.append(json.dumps({"index": {"_index": index_name, "_id": str(n)}}))
+            body.append(json.dumps({
+                "title": movie["title"],
+                "content": movie["plot"],
+                "v_content": bedrock_stub.embed(movie["plot"]).tolist(),
+            }))
+    client.bulk(body="\n".join(body) + "\n")
+
+
+def timed_calls(func, calls, before_each=None):
+    samples = []
+    for args in calls:
+        if before_each:
+            before_each()
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_qna(qna_index, iterations):
+    """Retrieval, context packing and a streamed answer per query: time to first token against the full answer
+
+    The first pass over the questions calls the model; later passes are answered
+    from the semantic answer cache, reported as cached_answer.
+    """
+    from utils import metrics, qna
+
+    qna.semantic_cache.clear()
+    first_token, total, cached, tokens = [], [], [], []
+    for question in QUERIES * max(iterations, 2):
+        with metrics.trace("qna_answer") as t:
+            packed = qna.retrieve_context(question, qna_index)
+            for _ in qna.answer(question, packed):
+                pass
+        if "semantic_cache_hit" in t.stages:
+            cached.append(t.total_ms / 1000)
+            continue
+        first_token.append(t.stages["time_to_first_token"] / 1000)
+        total.append(t.total_ms / 1000)
+        tokens.append(packed["tokens"])
+    return {
+        "time_to_first_token": percentiles(first_token),
+        "full_answer": percentiles(total),
+        "cached_answer": percentiles(cached),
+        "context_tokens_mean": sum(tokens) / len(tokens),
+        "context_budget_tokens": qna.QNA_CONTEXT_TOKENS,
+        "semantic_cache": qna.semantic_cache_stats(),
+    }
+
+
+def bench_queries(server, bedrock_stub, movies_index, qna_index, iterations):
+    # Keep the module's import-time client logging out of the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        from utils import bedrockopensearch
+
+    bedrockopensearch.boto3_bedrock = bedrock_stub
+    bedrockopensearch.client = server.client()
+
+    movie_calls = [(q, sort, genres, rating, movies_index) for q in QUERIES for sort, genres, rating in FILTERS] * iterations
+    qna_calls = [(q, qna_index) for q in QUERIES] * iterations
+    clear = bedrockopensearch.query_embedding_cache.clear
+    results = {}
+
+    server.reset_counters()
+    results["query_movies_cold"] = percentiles(timed_calls(bedrockopensearch.query_movies, movie_calls, clear))
+    results["query_movies_cold"]["wire"] = server.traffic()
+
+    server.reset_counters()
+    results["query_movies_warm"] = percentiles(timed_calls(bedrockopensearch.query_movies, movie_calls))
+    results["query_movies_warm"]["wire"] = server.traffic()
+
+    server.reset_counters()
+    results["query_qna_cold"] = percentiles(timed_calls(bedrockopensearch.query_qna, qna_calls, clear))
+    results["query_qna_cold"]["wire"] = server.traffic()
+
+    searches = [(q, sort, genres, rating) for q in QUERIES for sort, genres, rating in FILTERS]
+    server.reset_counters()
+    clear()
+    start = time.perf_counter()
+    bedrockopensearch.query_movies_batch(searches, movies_index)
+    elapsed = time.perf_counter() - start
+    results["query_movies_batch"] = {
+        "searches": len(searches),
+        "seconds": elapsed,
+        "searches_per_sec": len(searches) / elapsed if elapsed else None,
+        "wire": server.traffic(),
+    }
+    results["qna_answer"] = bench_qna(qna_index, iterations)
+    results["query_embedding_cache"] = bedrockopensearch.query_cache_stats()
+    # Per-stage histograms over all the runs above, with OpenSearch took next to the wall time
+    results["query_stages"] = bedrockopensearch.metrics.registry.snapshot()
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Offline benchmarks with local OpenSearch and Bedrock stand-ins")
+    parser.add_argument("--input", default=SAMPLE_FILE, help="movie file to ingest (NDJSON)")
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0, help="simulated Bedrock latency per call")
+    parser.add_argument("--embed-jitter-ms", type=float, default=5.0, help="random extra latency per call")
+    parser.add_argument("--dimension", type=int, default=1536, help="embedding dimension")
+    parser.add_argument("--iterations", type=int, default=3, help="passes over the query set")
+    parser.add_argument("--with-embedding-cache", action="store_true",
+                        help="keep the persistent embedding cache enabled (disabled by default so runs are comparable)")
+    parser.add_argument("--bulk-mode", action="store_true", help="run the loader in bulk-load mode")
+    parser.add_argument("--ingest-workers", type=int, default=0,
+                        help="load with this many worker processes (default 0: in the benchmark process)")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    setup_environment()
+    workdir = tempfile.mkdtemp(prefix="aoss-bench-")
+    if args.with_embedding_cache:
+        os.environ.setdefault("AOSS_EMBEDDING_CACHE_DIR", os.path.join(workdir, "embedding-cache"))
+    else:
+        os.environ["AOSS_EMBEDDING_CACHE"] = "off"
+
+    from benchmarks.fakes import FakeBedrockRuntime, FakeOpenSearchServer
+
+    bedrock_stub = FakeBedrockRuntime(
+        dimension=args.dimension,
+        latency=args.embed_latency_ms / 1000,
+        jitter=args.embed_jitter_ms / 1000,
+    )
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "input": os.path.relpath(args.input, ROOT),
+            "embed_latency_ms": args.embed_latency_ms,
+            "embed_jitter_ms": args.embed_jitter_ms,
+            "dimension": args.dimension,
+            "iterations": args.iterations,
+        }
+    }
+
+    input_path = prepare_input(args.input, workdir)
+    with FakeOpenSearchServer() as server:
+        report["ingest"] = bench_ingest(server, bedrock_stub, input_path, "opensearch_movies", workdir,
+                                        bulk_mode=args.bulk_mode, workers=args.ingest_workers)
+        load_qna_index(server.client(), bedrock_stub, input_path, "opensearch_qna")
+        report.update(bench_queries(server, bedrock_stub, "opensearch_movies", "opensearch_qna", args.iterations))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,194 @@
+"""Index size and recall impact of the vector dimension / data type / on-disk options
+
+Embeds the movie plots once per dimension supported by the model, then for every
+utils.vector_config option estimates the k-NN memory and disk footprint and measures
+recall@k against exact search over full-precision vectors of the largest dimension.
+Quantization is simulated in NumPy the way the engine encoders store vectors (fp16
+casts, int7 scalar quantization, 1-bit thresholds at the per-dimension mean, and
+quantized first pass plus full-precision rescoring for on_disk mode), so the recall
+numbers are close to what the cluster returns with exact search.
+
+Run from the vector-engine-demos-clean directory. FakeBedrockRuntime is used unless
+--bedrock is given, in which case the real model is called (AOSS_VECTORSEARCH_REGION):
+
+    python -m benchmarks.vector_storage_report --output vector-storage.json
+    python -m benchmarks.vector_storage_report --bedrock --model amazon.titan-embed-text-v2:0
+"""
+# Python Built-Ins:
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# External Dependencies:
+import numpy as np
+
+from benchmarks.run_benchmarks import QUERIES, ROOT, SAMPLE_FILE, git_revision, setup_environment
+
+# Candidates fetched by the quantized first pass before rescoring, per on_disk compression level
+OVERSAMPLE = {"8x": 2.0, "16x": 2.0, "32x": 3.0}
+BITS = {"8x": 4, "16x": 2, "32x": 1}
+
+
+def load_corpus(input_path, max_queries):
+    """Movie plots to index and queries (fixed phrases plus movie titles)"""
+    plots, titles = [], []
+    with open(input_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            movie = json.loads(line)
+            if movie.get("plot"):
+                plots.append(movie["plot"])
+                titles.append(movie["title"])
+    queries = list(QUERIES) + titles[:max(0, max_queries - len(QUERIES))]
+    return plots, queries
+
+
+def embed_all(runtime, config, texts, concurrency):
+    def embed(text):
+        response = runtime.invoke_model(
+            modelId=config.model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=json.dumps(config.embedding_request(text)),
+        )
+        return json.loads(response["body"].read())["embedding"]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return np.asarray(list(executor.map(embed, texts)), dtype=np.float32)
+
+
+def top_k(distances, k):
+    candidates = np.argpartition(distances, min(k, distances.shape[1] - 1), axis=1)[:, :k]
+    order = np.take_along_axis(distances, candidates, axis=1).argsort(axis=1)
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def l2_distances(queries, docs):
+    return (queries * queries).sum(1)[:, None] - 2 * queries @ docs.T + (docs * docs).sum(1)[None, :]
+
+
+def bucketize(vectors, thresholds):
+    """Map every component to its quantization bucket given per-dimension thresholds"""
+    codes = np.zeros(vectors.shape, dtype=np.float32)
+    for threshold in thresholds:
+        codes += vectors > threshold
+    return codes
+
+
+def quantized_distances(config, queries, docs):
+    """Distances the engine computes against the stored (quantized) vectors"""
+    if config.mode == "on_disk":
+        bits = BITS[config.compression]
+        quantiles = np.linspace(0, 1, 2 ** bits + 1)[1:-1]
+        thresholds = np.quantile(docs, quantiles, axis=0) if bits > 1 else [docs.mean(axis=0)]
+        return l2_distances(bucketize(queries, thresholds), bucketize(docs, thresholds))
+    if config.data_type == "fp16":
+        return l2_distances(queries, docs.astype(np.float16).astype(np.float32))
+    if config.data_type == "byte":
+        low, high = np.quantile(docs, [0.001, 0.999])
+        scale = (high - low) / 127
+        stored = np.round((np.clip(docs, low, high) - low) / scale) * scale + low
+        return l2_distances(queries, stored.astype(np.float32))
+    if config.data_type == "binary":
+        threshold = docs.mean(axis=0)
+        return l2_distances(bucketize(queries, [threshold]), bucketize(docs, [threshold]))
+    return l2_distances(queries, docs)
+
+
+def search(config, queries, docs, k):
+    distances = quantized_distances(config, queries, docs)
+    if config.mode != "on_disk":
+        return top_k(distances, k)
+    # First pass on the quantized vectors, then rescore the oversampled candidates at full precision
+    candidates = top_k(distances, int(k * OVERSAMPLE[config.compression]))
+    exact = np.stack([((docs[row] - query) ** 2).sum(1) for row, query in zip(candidates, queries)])
+    return np.take_along_axis(candidates, exact.argsort(axis=1)[:, :k], axis=1)
+
+
+def recall(results, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(r) & set(t)) / k for r, t in zip(results, truth)]))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Index size and recall of the vector storage options")
+    parser.add_argument("--input", default=SAMPLE_FILE, help="movie file (NDJSON)")
+    parser.add_argument("--model", default=None, help="embedding model (default: AOSS_EMBEDDING_MODEL_ID or Titan v2)")
+    parser.add_argument("--bedrock", action="store_true", help="call the real Bedrock model instead of the local stand-in")
+    parser.add_argument("--queries", type=int, default=200, help="number of queries")
+    parser.add_argument("--k", type=int, default=10, help="neighbours per query for recall@k")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel embedding calls")
+    parser.add_argument("--project-documents", type=int, default=1_000_000,
+                        help="also report the footprint for an index of this many documents")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    setup_environment()
+    from utils import vector_config
+
+    model_id = args.model or os.environ.get("AOSS_EMBEDDING_MODEL_ID", vector_config.TITAN_V2)
+    if args.bedrock:
+        import boto3
+        runtime = boto3.client("bedrock-runtime", region_name=os.environ.get("AOSS_VECTORSEARCH_REGION"))
+    else:
+        from benchmarks.fakes import FakeBedrockRuntime
+        runtime = FakeBedrockRuntime(dimension=max(vector_config.MODEL_DIMENSIONS[model_id]), latency=0, jitter=0)
+
+    plots, queries = load_corpus(args.input, args.queries)
+    configs = vector_config.options(model_id)
+    embeddings = {}
+    start = time.perf_counter()
+    for dimension in vector_config.MODEL_DIMENSIONS[model_id]:
+        config = vector_config.VectorConfig(model_id, dimension)
+        embeddings[dimension] = (embed_all(runtime, config, queries, args.concurrency),
+                                 embed_all(runtime, config, plots, args.concurrency))
+    embed_seconds = time.perf_counter() - start
+
+    baseline = configs[0]
+    query_vectors, doc_vectors = embeddings[baseline.dimension]
+    truth = top_k(l2_distances(query_vectors, doc_vectors), args.k)
+
+    rows = []
+    for config in configs:
+        query_vectors, doc_vectors = embeddings[config.dimension]
+        row = config.describe()
+        row["option"] = config.name
+        # Two vector fields (v_title, v_plot) per document
+        row["index_graph_mb"] = round(2 * len(plots) * config.graph_bytes_per_vector() / 2 ** 20, 2)
+        row["index_disk_mb"] = round(2 * len(plots) * config.disk_bytes_per_vector() / 2 ** 20, 2)
+        row["projected_graph_gb"] = round(2 * args.project_documents * config.graph_bytes_per_vector() / 2 ** 30, 2)
+        row[f"recall_at_{args.k}"] = round(recall(search(config, query_vectors, doc_vectors, args.k), truth), 4)
+        rows.append(row)
+        print(f"{config.name:>20}  graph {row['index_graph_mb']:8.2f} MB  recall@{args.k} {row[f'recall_at_{args.k}']:.3f}",
+              file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "input": os.path.relpath(args.input, ROOT),
+            "model_id": model_id,
+            "embeddings": "bedrock" if args.bedrock else "fake",
+            "documents": len(plots),
+            "queries": len(queries),
+            "k": args.k,
+            "baseline": baseline.name,
+            "embed_seconds": embed_seconds,
+            "project_documents": args.project_documents,
+        },
+        "options": rows,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
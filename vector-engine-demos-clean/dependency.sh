@@ -30,7 +30,7 @@ cd ..
 # download requirements
 python3 -m ensurepip --upgrade
 python3 -m pip install --upgrade pip
-python3 -m pip install --ignore-installed opensearch-py requests_aws4auth
+python3 -m pip install --ignore-installed "opensearch-py[async]" requests_aws4auth
 python3 -m pip install langchain pypdf==3.8.1 pydantic==1.10.8
 python3 -m pip install -U langchain-community
 python3 -m pip install pypdf==3.8.1 pydantic==1.10.8
@@ -42,3 +42,8 @@ python3 -m pip install --no-build-isolation --force-reinstall \
     "botocore>=1.31.57"
 
 python3 -m pip install streamlit==1.27.0
+
+# Optional: local CPU embedding models (AOSS_EMBEDDING_MODEL_ID=sentence-transformers/...)
+# python3 -m pip install sentence-transformers
+# Optional: ONNX Runtime backend and int8 quantization (AOSS_LOCAL_EMBED_BACKEND=onnx)
+# python3 -m pip install "sentence-transformers[onnx]"
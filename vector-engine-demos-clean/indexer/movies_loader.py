@@ -1,185 +1,573 @@
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from requests_aws4auth import AWS4Auth
 import json
-import boto3
+import hashlib
+import argparse
+import functools
 import os
+import subprocess
 import time
 import sys
-import signal
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-# Set the vector size for Titan Embeddings model
-vector_size = 1536  # Amazon Titan Embeddings model dimension
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils import clients
+from utils import embedding_cache
+from utils import embeddings
+from utils import ingest_workers
+from utils.bulk_writer import BulkWriter
+from utils.checkpoint import Checkpoint
+from utils.dedup import TextDeduplicator
+from utils.index_settings import BulkLoadMode, wait_for_index
+from utils.lazy import LazyAttributes
+from utils.pipeline import batched, threaded
+from utils.vector_config import get_vector_config
 
-# Initialize Bedrock client
+# Embedding model, vector size and k-NN storage come from the AOSS_EMBEDDING_MODEL_ID /
+# AOSS_VECTOR_* settings shared with the query code (see utils/vector_config.py)
+vector_config = get_vector_config()
+vector_size = vector_config.dimension
+embedding_model_id = vector_config.model_id
+
+# Number of concurrent Bedrock invoke_model calls made by the embedding stage
+embed_concurrency = int(os.environ.get('AOSS_EMBED_CONCURRENCY', '8'))
+
+# Embedded vectors remembered for repeated titles and plots within one load
+dedup_max_entries = int(os.environ.get('AOSS_DEDUP_MAX_ENTRIES', '10000'))
+
+# Bulk-load mode: no refreshes or replicas during the load, serving settings restored
+# afterwards (see utils/index_settings.py; skipped on serverless collections)
+bulk_load_mode = os.environ.get('AOSS_BULK_LOAD_MODE', 'off').lower() in ('1', 'on', 'true', 'yes')
+
+# Keep v_title / v_plot out of the stored _source (they stay searchable); applies
+# when the index is created
+exclude_vectors_from_source = os.environ.get('AOSS_SOURCE_EXCLUDE_VECTORS', 'on').lower() in ('1', 'on', 'true', 'yes')
+
+# Bulk request limits; the writer shrinks them when the collection throttles
+bulk_max_docs = int(os.environ.get('AOSS_BULK_MAX_DOCS', '500'))
+bulk_max_bytes = int(os.environ.get('AOSS_BULK_MAX_BYTES', str(5 * 1024 * 1024)))
+
+# Number of bulk requests kept in flight
+bulk_writers = int(os.environ.get('AOSS_BULK_WRITERS', '4'))
+
+# Documents that could not be embedded or indexed after retries are written here with the
+# error, as bulk action and source lines (without vectors when embedding failed)
+failed_documents_path = "failed-documents.ndjson"
+
+# Capacity of the queues between pipeline stages; bounds memory regardless of input size
+queue_size = int(os.environ.get('AOSS_PIPELINE_QUEUE_SIZE', '64'))
+
+# Initialize Bedrock client, sized so every embedding worker gets its own connection
 region = os.environ.get('AOSS_VECTORSEARCH_REGION')
-bedrock_runtime = boto3.client('bedrock-runtime', region_name=region)
+bedrock_runtime = clients.create_bedrock_runtime(
+    region=region,
+    max_pool_connections=max(clients.BEDROCK_POOL_MAXSIZE, embed_concurrency)
+)
 
-def generate_embedding(text):
-    """Generate embeddings using Amazon Bedrock Titan Embeddings model"""
+def invoke_embedding_model(text):
+    """Call the Amazon Bedrock Titan Embeddings model"""
     response = bedrock_runtime.invoke_model(
-        modelId='amazon.titan-embed-text-v1',
+        modelId=embedding_model_id,
         contentType='application/json',
         accept='application/json',
-        body=json.dumps({
-            'inputText': text
-        })
+        body=json.dumps(vector_config.embedding_request(text))
     )
     
     response_body = json.loads(response['body'].read())
     return response_body['embedding']
 
+def create_embedding_provider(concurrency=embed_concurrency):
+    """Bedrock (through invoke_embedding_model) or local provider for the configured model"""
+    return embeddings.create_provider(vector_config, invoke=lambda text: invoke_embedding_model(text), concurrency=concurrency)
+
+# A local model is only loaded when the first document is embedded
+_lazy = LazyAttributes(globals(), embedding_provider=create_embedding_provider)
+__getattr__ = _lazy.module_getattr
+
+def get_embedding_provider():
+    return _lazy.get("embedding_provider")
+
+def generate_embedding(text):
+    """Generate an embedding with the configured provider, reading through the local embedding cache"""
+    return get_embedding_provider().embed(text)
+
+# - Ingestion pipeline: read -> parse -> embed -> serialize -> bulk, connected by bounded queues
+
+def read_lines(path, start_offset=0, end_offset=None):
+    """Yield (end byte offset, line) for every line of the input file starting in [start_offset, end_offset)"""
+    with open(path, 'rb') as file:
+        file.seek(start_offset)
+        offset = start_offset
+        for line in file:
+            if end_offset is not None and offset >= end_offset:
+                return
+            offset += len(line)
+            yield offset, line
+
+def parse_documents(lines):
+    """Decode movie documents, skipping bulk action lines and malformed input"""
+    for offset, line in lines:
+        if not line.strip():
+            continue
+        try:
+            json_data = json.loads(line)
+            if 'index' in json_data:
+                continue
+            if 'title' not in json_data:
+                raise KeyError('title')
+        except Exception as e:
+            print(f"Error processing document: {e}")
+            continue
+        yield offset, json_data
+
+def embed_batch(provider, batch, dedup=None):
+    """Embed the titles and plots of a batch of documents with one embed_many call
+
+    With a TextDeduplicator, repeated texts are embedded once per load and empty or
+    placeholder plots get no v_plot.
+    """
+    texts = []
+    for _, doc in batch:
+        texts.append(doc['title'])
+        if 'plot' in doc:
+            texts.append(doc['plot'])
+    if dedup is None:
+        vectors = iter(provider.embed_many(texts))
+    else:
+        vectors = iter(dedup.embed_many(texts, provider.embed_many))
+    for _, doc in batch:
+        v_title = next(vectors)
+        if v_title is not None:
+            doc['v_title'] = v_title
+        if 'plot' in doc:
+            v_plot = next(vectors)
+            if v_plot is not None:
+                doc['v_plot'] = v_plot
+    return batch
+
+def embed_documents(docs, provider, executor, window, dedup=None, on_failed=None):
+    """Embed documents in provider-sized batches with at most window batches in flight, keeping document order
+
+    A document that cannot be embedded on its own is passed to
+    on_failed(offset, doc, error) and left out of the output.
+    """
+    pending = deque()
+
+    def complete(batch, future):
+        try:
+            return future.result()
+        except Exception:
+            # Fall back to one document at a time so a single bad document doesn't drop the batch
+            embedded = []
+            for item in batch:
+                try:
+                    embedded.extend(embed_batch(provider, [item], dedup))
+                except Exception as e:
+                    if on_failed is None:
+                        raise
+                    on_failed(item[0], item[1], f"embedding failed: {e}")
+            return embedded
+
+    # Every document contributes up to two texts (title and plot)
+    for batch in batched(docs, max(1, provider.batch_size // 2)):
+        pending.append((batch, executor.submit(embed_batch, provider, batch, dedup)))
+        if len(pending) >= window:
+            yield from complete(*pending.popleft())
+    while pending:
+        yield from complete(*pending.popleft())
+
+def document_id(doc):
+    """Deterministic document ID, so re-running a load overwrites instead of duplicating"""
+    if doc.get('rank') is not None:
+        return f"movie-{doc['rank']}"
+    key = json.dumps([doc.get('title'), doc.get('year'), doc.get('plot')])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def serialize_documents(docs, index_name):
+    """Render each document as its NDJSON bulk lines so the parsed dict and vectors can be freed"""
+    for offset, doc in docs:
+        action = json.dumps({"index": {"_index": index_name, "_id": document_id(doc)}})
+        yield offset, action + "\n" + json.dumps(doc) + "\n"
+
+def movies_index_body(settings, exclude_vectors=None):
+    """Settings and mappings of the movie index
+
+    With exclude_vectors (default: AOSS_SOURCE_EXCLUDE_VECTORS) v_title and v_plot are
+    indexed for k-NN search but left out of the stored _source, which is otherwise
+    mostly vector floats. Searches and fetches then return documents without them.
+    """
+    exclude_vectors = exclude_vectors_from_source if exclude_vectors is None else exclude_vectors
+    mappings = {
+        'properties': {
+            "title": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
+            "v_title": vector_config.knn_field(),
+            "plot": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
+            "v_plot": vector_config.knn_field(),
+            "actors": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
+            "certificate": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
+            "directors": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
+            "genres": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
+            "image_url": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
+            "gross_earning": {"type":"float"},
+            "metascore": {"type":"float"},
+            "rating": {"type":"double"},
+            "rank": {"type":"long"},
+            "time_minute": {"type":"long"},
+            "vote": {"type":"long"},
+            "year": {"type":"long"}
+        }
+    }
+    if exclude_vectors:
+        mappings["_source"] = {"excludes": ["v_title", "v_plot"]}
+    return {"settings": settings, "mappings": mappings}
+
 # movies in JSON format
 json_file_path = "sample-movies.json"
 
-def full_load(index_name, client):
+# Records the input offset below which every document has been indexed
+checkpoint_path = "movies_loader.checkpoint.json"
+
+
+# Output of a background load (python movies_loader.py load without --foreground)
+log_path = "movies_loader.log"
+
+def partition_checkpoint_path(worker, workers):
+    """Checkpoint file of one worker's byte range; a single worker uses checkpoint_path itself"""
+    if workers == 1:
+        return checkpoint_path
+    root, ext = os.path.splitext(checkpoint_path)
+    return f"{root}.{worker + 1}-of-{workers}{ext}"
+
+def prepare_index(index_name, client, bulk_mode):
+    """Create the index (or take it into bulk-load mode) and wait until it accepts documents"""
+    index_mode = BulkLoadMode(client, index_name)
     # if index_name exists in collection, don't run this again 
     # create a new index
     if not client.indices.exists(index=index_name):
-        print(f"Creating index '{index_name}'...")
-        index_body = {
-            "settings": {
-                "index.knn": True
-            },
-            'mappings': {
-                'properties': {
-                    "title": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
-                    "v_title": { "type": "knn_vector", "dimension": vector_size },
-                    "plot": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
-                    "v_plot": { "type": "knn_vector", "dimension": vector_size },
-                    "actors": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
-                    "certificate": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
-                    "directors": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
-                    "genres": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
-                    "genres": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
-                    "image_url": {"type":"text","fields":{"keyword":{"type":"keyword","ignore_above":256}}},
-                    "gross_earning": {"type":"float"},
-                    "metascore": {"type":"float"},
-                    "rating": {"type":"double"},
-                    "time_minute": {"type":"long"},
-                    "vote": {"type":"long"},
-                    "year": {"type":"long"}
-                }
-            }
-        }
+        print(f"Creating index '{index_name}' with {vector_config.name} vectors from {embedding_model_id}...")
+        settings = index_mode.create_settings() if bulk_mode else {"index.knn": True}
+        index_body = movies_index_body(settings)
+        if exclude_vectors_from_source:
+            print("Vectors are kept in the k-NN index only, not in _source")
 
         client.indices.create(
             index=index_name, 
             body=index_body
         )
+        if bulk_mode:
+            index_mode.created()
         print(f"Index '{index_name}' created successfully.")
-        time.sleep(5)
     else:
         print(f"Index '{index_name}' already exists, continuing with data loading.")
-    
-    actions = []
-    i = 0
-    j = 0
-    action = {"index": {"_index": index_name}}
-
-    # Read and index the JSON data
-    print("Starting to load data...")
-    with open(json_file_path, 'r') as file:
-        data = file.readlines()
-        total_docs = len([line for line in data if not '"index"' in line])
-        print(f"Found {total_docs} documents to process")
-        
-        for item in data:
-            try:
-                json_data = json.loads(item)
-                if 'index' in json_data:
-                    continue
-
-                # Generate embedding for title using Bedrock
-                title = json_data['title']
-                v_title = generate_embedding(title)
-                json_data['v_title'] = v_title
-        
-                if 'plot' in json_data:
-                    # Generate embedding for plot using Bedrock
-                    plot = json_data['plot']
-                    v_plot = generate_embedding(plot)
-                    json_data['v_plot'] = v_plot
-        
-                # Prepare bulk request
-                actions.append(action)
-                actions.append(json_data.copy())
-        
-                if i >= 10:
-                    client.bulk(body=actions)
-                    j += i
-                    if j <= 500:  # Only show progress for first 500 documents
-                        print(f"Processed {j}/{total_docs} documents ({(j/total_docs)*100:.1f}%)")
-                    elif j % 100 == 0:  # After 500, only show occasional updates
-                        print(f"Processed {j}/{total_docs} documents ({(j/total_docs)*100:.1f}%)")
-                    i = 0
-                    actions = []
-                i += 1
-            except Exception as e:
-                print(f"Error processing document: {e}")
-                continue
+        if bulk_mode:
+            index_mode.begin()
+    if index_mode.active:
+        print("Bulk-load mode: refresh disabled and replicas set to 0 until the load completes")
+    elif bulk_mode:
+        print("Bulk-load mode: serverless collection, index settings left unchanged")
+    # Poll for the index's shards (or, on serverless, a working count) instead of a fixed delay
+    wait_for_index(client, index_name, index_mode.serverless)
+    return index_mode
+
+def load_range(index_name, client, checkpoint, start_offset=0, end_offset=None, concurrency=embed_concurrency,
+               max_in_flight=bulk_writers, on_committed=None, on_failed=None, verbose=True):
+    """Embed and index the documents on the input lines starting in [start_offset, end_offset)
+
+    Committed documents advance checkpoint; on_committed(offsets) and
+    on_failed(offset) are called in addition, and progress lines are only printed
+    when verbose. Returns the BulkWriter stats and the TextDeduplicator.
+    """
+    file_size = os.path.getsize(json_file_path)
+    provider = get_embedding_provider()
+    if isinstance(provider, embeddings.BedrockEmbeddingProvider) and provider.concurrency != concurrency:
+        provider = create_embedding_provider(concurrency)
+
+    if verbose:
+        print("Starting to load data...")
+        if isinstance(provider, embeddings.BedrockEmbeddingProvider):
+            print(f"Embedding with {provider.concurrency} concurrent Bedrock requests")
+        else:
+            print(f"Embedding locally with {provider.model_id} ({provider.cache_id}), batches of {provider.batch_size} texts")
+
+    dedup = TextDeduplicator(max_entries=dedup_max_entries)
+    progress = {"docs": 0, "bytes_read": start_offset, "embed_failed": 0}
+    progress_lock = threading.Lock()
+    start = time.time()
+
+    def report_progress(offsets):
+        checkpoint.commit(offsets)
+        if on_committed is not None:
+            on_committed(offsets)
+        with progress_lock:
+            previous = progress["docs"]
+            progress["docs"] += len(offsets)
+            progress["bytes_read"] = max(progress["bytes_read"], max(offsets))
+            j, bytes_read = progress["docs"], progress["bytes_read"]
+        rate = j / max(time.time() - start, 1e-6)
+        if verbose and (j <= 500 or j // 100 > previous // 100):  # Only show occasional updates after 500
+            print(f"Processed {j} documents ({(bytes_read/max(file_size, 1))*100:.1f}% of input) - {rate:.1f} docs/sec")
+
+    def record_failure(payload, offset, error):
+        print(f"Error indexing document ending at byte {offset}: {error}")
+        with progress_lock, open(failed_documents_path, 'a') as failed:
+            failed.write(json.dumps({"error": error, "offset": offset}) + "\n" + payload)
+        # Failed documents are recorded above, so they must not hold the checkpoint back
+        checkpoint.commit([offset])
+        if on_failed is not None:
+            on_failed(offset)
+
+    def record_embed_failure(offset, doc, error):
+        # Recorded like a rejected bulk item (without vectors), so the file lists every lost document
+        with progress_lock:
+            progress["embed_failed"] += 1
+        record_failure(next(serialize_documents([(offset, doc)], index_name))[1], offset, error)
+
+    writer = BulkWriter(
+        client,
+        max_docs=bulk_max_docs,
+        max_bytes=bulk_max_bytes,
+        max_in_flight=max_in_flight,
+        on_committed=report_progress,
+        on_failed=record_failure
+    )
+
+    def tracked(docs):
+        # Track every document before it is embedded, so one that never reaches the
+        # writer holds the checkpoint back and --resume retries it
+        for offset, doc in docs:
+            checkpoint.track(offset)
+            yield offset, doc
+
+    # Two batches in flight: the next one embeds while the previous is serialized and sent
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        lines = threaded(read_lines(json_file_path, start_offset, end_offset), queue_size, "read")
+        docs = threaded(tracked(parse_documents(lines)), queue_size, "parse")
+        embedded = threaded(embed_documents(docs, provider, executor, 2, dedup, record_embed_failure), queue_size, "embed")
+        payloads = threaded(serialize_documents(embedded, index_name), queue_size, "serialize")
+
+        for offset, payload in payloads:
+            writer.add(payload, offset)
+        stats = writer.close()
+    provider.close()
+    stats['failed'] += progress["embed_failed"]
+    checkpoint.save(complete=True)
+    if checkpoint.outstanding:
+        print(f"{checkpoint.outstanding} documents were neither indexed nor recorded as failed; "
+              f"the checkpoint stays at byte {checkpoint.offset} so --resume retries them")
+    return stats, dedup
+
+def print_load_stats(stats, dedup):
+    print(f"Bulk requests: {stats['requests']}, retried documents: {stats['retried']}, throttled: {stats['throttled']} times")
+    if stats['failed']:
+        print(f"{stats['failed']} documents failed to index, see {failed_documents_path}")
+    dedup_stats = dedup.stats()
+    print(f"Deduplication: {dedup_stats['embedded']} unique of {dedup_stats['texts']} texts "
+          f"({dedup_stats['duplicates']} repeated, {dedup_stats['dedup_ratio']*100:.1f}% dedup ratio; "
+          f"{dedup_stats['skipped_empty']} empty skipped), {dedup_stats['calls_saved']} embedding requests saved")
+    cache = embedding_cache.get_cache()
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']*100:.1f}% hit rate), {stats['evictions']} evictions")
+
+def load_workers_supervisor(index_name, client_factory, workers, concurrency=embed_concurrency, resume=False,
+                            status_path=ingest_workers.STATUS_PATH, log=None):
+    """IngestSupervisor loading the input file's byte ranges in worker processes
+
+    Every worker creates its own client with client_factory and keeps a checkpoint
+    for its range, so the same worker count resumes where each range stopped. The
+    embedding concurrency and bulk writers are split between the workers, keeping
+    the total load on Bedrock and the collection unchanged.
+    """
+    ranges = ingest_workers.split_ranges(json_file_path, workers)
+    worker_concurrency = max(1, -(-concurrency // len(ranges)))
+    worker_writers = max(1, -(-bulk_writers // len(ranges)))
+
+    def load_worker(worker, start_offset, end_offset, counters, resume):
+        checkpoint = Checkpoint(partition_checkpoint_path(worker, len(ranges)), json_file_path, index_name)
+        if resume:
+            start_offset = max(start_offset, checkpoint.load())
+        else:
+            # Replace a previous load's checkpoint now: a restart of this worker resumes from it
+            checkpoint.save()
+        counters.begin(worker, start_offset, checkpoint.documents)
+        start = time.time()
+        stats, dedup = load_range(
+            index_name,
+            client_factory(),
+            checkpoint,
+            start_offset,
+            end_offset,
+            concurrency=worker_concurrency,
+            max_in_flight=worker_writers,
+            on_committed=functools.partial(counters.committed, worker),
+            on_failed=functools.partial(counters.failed, worker),
+            verbose=False
+        )
+        print(f"Worker {worker + 1} indexed {stats['committed']} documents from bytes {start_offset}-{end_offset} "
+              f"in {time.time() - start:.1f}s")
+        print_load_stats(stats, dedup)
 
-        # Send any remaining documents
-        if actions:
-            client.bulk(body=actions)
-            j += i
-            print(f"Processed {j}/{total_docs} documents ({(j/total_docs)*100:.1f}%)")
+    return ingest_workers.IngestSupervisor(load_worker, json_file_path, ranges, status_path, index_name, resume,
+                                           log_path=log)
 
-    print(f"\nData loading complete! {j} documents have been indexed.")
-    print("The process will continue in the background.")
+def full_load(index_name, client, concurrency=embed_concurrency, resume=False, bulk_mode=None, workers=0,
+              client_factory=None, status_path=ingest_workers.STATUS_PATH, log=None):
+    """Load the input file into index_name
+
+    With workers=0 the load runs in this process. With one or more workers the
+    byte ranges of the input are loaded by supervised worker processes that
+    publish progress to status_path; client_factory creates each worker's
+    OpenSearch client, and log, the output file of a background load, is shown
+    in the status. Returns the final load state ("complete", "failed" or
+    "interrupted").
+    """
+    bulk_mode = bulk_load_mode if bulk_mode is None else bulk_mode
+    supervisor = None
+    if workers:
+        supervisor = load_workers_supervisor(index_name, client_factory, workers, concurrency, resume, status_path, log)
+        supervisor.write_status("preparing")
+    index_mode = prepare_index(index_name, client, bulk_mode)
+
+    start = time.time()
+    try:
+        if supervisor is not None:
+            print(f"Starting to load data with {len(supervisor.ranges)} worker processes, status in {status_path}")
+            status = supervisor.run()
+            if status["state"] != "finishing":
+                if index_mode.active:
+                    index_mode.end(force_merge=False)
+                print(f"\nData loading {status['state']} after {status['docs']} documents, {status['failed']} failed. "
+                      f"Run again with --resume to continue from the checkpoints.")
+                return status["state"]
+        else:
+            checkpoint = Checkpoint(checkpoint_path, json_file_path, index_name)
+            start_offset = checkpoint.load() if resume else 0
+            if start_offset:
+                print(f"Resuming after {checkpoint.documents} committed documents ({start_offset}/{os.path.getsize(json_file_path)} bytes)")
+            stats, dedup = load_range(index_name, client, checkpoint, start_offset, concurrency=concurrency)
+    except BaseException:
+        # Don't leave the index without refreshes or replicas when the load fails
+        if index_mode.active:
+            index_mode.end(force_merge=False)
+        raise
+
+    elapsed = time.time() - start
+    if index_mode.active:
+        ready_start = time.time()
+        index_mode.end()
+        print(f"Index ready for serving after {time.time() - ready_start:.1f}s")
+
+    if supervisor is not None:
+        status = supervisor.finish()
+        j, failed = status["docs"], status["failed"]
+    else:
+        j, failed = stats['committed'], stats['failed']
+    print(f"\nData loading complete! {j} documents have been indexed in {elapsed:.1f}s ({j / max(elapsed, 1e-6):.1f} docs/sec).")
+    if supervisor is None:
+        print_load_stats(stats, dedup)
+    elif failed:
+        print(f"{failed} documents failed to index, see {failed_documents_path}")
     print("You can now proceed with the next steps of the workshop.")
+    return "complete"
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Embed the movie dataset with Bedrock and load it into OpenSearch")
+    commands = parser.add_subparsers(dest="command")
+    load = commands.add_parser("load", help="load the movie file (the default command)")
+    load.add_argument("--resume", action="store_true",
+                      help="skip documents already committed according to the checkpoint files")
+    load.add_argument("--bulk-mode", action="store_true", default=bulk_load_mode,
+                      help="disable refreshes and replicas during the load and restore them afterwards "
+                           "(self-managed clusters only; AOSS_BULK_LOAD_MODE)")
+    load.add_argument("--checkpoint", default=checkpoint_path,
+                      help=f"checkpoint file location (default: {checkpoint_path}); each worker adds its range to the name")
+    load.add_argument("--workers", type=int, default=ingest_workers.LOAD_WORKERS,
+                      help=f"worker processes, each loading a byte range of the file (default: {ingest_workers.LOAD_WORKERS}; AOSS_LOAD_WORKERS)")
+    load.add_argument("--foreground", action="store_true",
+                      help="run the load in this terminal instead of in the background")
+    load.add_argument("--log", default=log_path, help=f"output of a background load (default: {log_path})")
+    # Set on the detached process started for a background load
+    load.add_argument("--background-child", action="store_true", help=argparse.SUPPRESS)
+    load.add_argument("--status-file", default=ingest_workers.STATUS_PATH,
+                      help="load status file (AOSS_LOAD_STATUS_FILE)")
+    status = commands.add_parser("status", help="show the progress of a running or finished load")
+    status.add_argument("--status-file", default=ingest_workers.STATUS_PATH,
+                        help="load status file (AOSS_LOAD_STATUS_FILE)")
+    status.add_argument("--watch", type=float, metavar="SECONDS",
+                        help="refresh every SECONDS until the load ends")
+    # Without a command (or with only options) the movie file is loaded, as before subcommands existed
+    if not argv or argv[0].startswith("-") and argv[0] not in ("-h", "--help"):
+        argv = ["load", *argv]
+    return parser.parse_args(argv)
+
+def show_status(args):
+    while True:
+        status = ingest_workers.read_status(args.status_file)
+        if status is None:
+            print(f"No load status found in {args.status_file}")
+            return 1
+        print("\n".join(ingest_workers.format_status(status)))
+        if not args.watch or status["state"] not in ingest_workers.ACTIVE_STATES:
+            return 1 if status["state"] in ("failed", "stopped") else 0
+        time.sleep(args.watch)
+        print()
+
+def start_background(argv, args):
+    """Re-run this load as a detached process writing its output to args.log"""
+    with open(args.log, "a") as log:
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), *argv, "--background-child"],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+    print(f"Background load started with PID: {process.pid}, logging to {os.path.abspath(args.log)}")
+    print(f"Check its progress with: python {os.path.basename(__file__)} status --watch 5")
+    print("You can continue with the workshop while data loads in the background.")
+
+def main(argv):
+    global checkpoint_path, log_path
+    args = parse_args(argv)
+    if args.command == "status":
+        sys.exit(show_status(args))
+    checkpoint_path = args.checkpoint
+    log_path = args.log
 
-def main():
     host = os.environ.get('AOSS_VECTORSEARCH_ENDPOINT')
     region = os.environ.get('AOSS_VECTORSEARCH_REGION')
     index = "opensearch_movies"
-    service = 'aoss'
 
     print(f"Starting data loading process to OpenSearch Serverless...")
     print(f"Host: {host}")
     print(f"Region: {region}")
     print(f"Index: {index}")
+    if args.resume:
+        print(f"Resuming from checkpoint: {checkpoint_path}")
+
+    if not (args.foreground or args.background_child):
+        start_background(argv if argv and argv[0] == "load" else ["load", *argv], args)
+        return
+
+    def create_client():
+        # Bulk requests can take minutes; keep a pooled connection for every bulk writer
+        return clients.create_opensearch_client(
+            host=host,
+            region=region,
+            timeout=300,
+            pool_maxsize=max(clients.POOL_MAXSIZE, bulk_writers)
+        )
 
-    credentials = boto3.Session().get_credentials()
-    awsauth = AWS4Auth(credentials.access_key, credentials.secret_key, region, service,
-                   session_token=credentials.token)
-
-    # Build the OpenSearch client
-    client = OpenSearch(
-        hosts = [{'host': host, 'port': 443}],
-        http_auth = awsauth,
-        timeout = 300,
-        use_ssl = True,
-        verify_certs = True,
-        connection_class = RequestsHttpConnection
-    )
-    
-    # Handle SIGINT (Ctrl+C) gracefully
-    def signal_handler(sig, frame):
-        print("\nProcess interrupted. Data loading will continue in the background.")
-        sys.exit(0)
-    
-    signal.signal(signal.SIGINT, signal_handler)
-    
     try:
         print(f"OpenSearch Client - Sending to Amazon OpenSearch Serverless host {host} in Region {region}\n")
-        
-        # Process first 500 documents with detailed logging, then fork to background
-        pid = os.fork()
-        if pid == 0:  # Child process
-            # Redirect stdout and stderr to /dev/null for the background process
-            sys.stdout = open(os.devnull, 'w')
-            sys.stderr = open(os.devnull, 'w')
-            full_load(index, client)
-            sys.exit(0)
-        else:  # Parent process
-            # Wait for a short time to let the child process start
-            time.sleep(1)
-            print(f"Background process started with PID: {pid}")
-            print("You can continue with the workshop while data loads in the background.")
-            sys.exit(0)
+        # The supervisor stops the workers on Ctrl+C or SIGTERM; their checkpoints allow --resume
+        state = full_load(index, create_client(), resume=args.resume, bulk_mode=args.bulk_mode,
+                          workers=max(1, args.workers), client_factory=create_client, status_path=args.status_file,
+                          log=os.path.abspath(log_path) if args.background_child else None)
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
+    sys.exit(0 if state == "complete" else 1)
 
 if __name__ == '__main__':
-    main()
+    main(sys.argv[1:])
@@ -1,34 +1,40 @@
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from requests_aws4auth import AWS4Auth
 import json
-import boto3
 import os
 import sys, getopt
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from utils import clients
+from utils import embedding_cache
+from utils.vector_config import get_vector_config
+
 #provide file name
 json_file_path = "sample-movies.json"
 
-# Set the vector size for Titan Embeddings model
-vector_size = 1536  # Amazon Titan Embeddings model dimension
+# Query vectors must match the model and dimension the index was loaded with
+vector_config = get_vector_config()
+vector_size = vector_config.dimension
+embedding_model_id = vector_config.model_id
 
 # Initialize Bedrock client with explicit region
 region = os.environ.get('AOSS_VECTORSEARCH_REGION')
-bedrock_runtime = boto3.client('bedrock-runtime', region_name=region)
+bedrock_runtime = clients.create_bedrock_runtime(region=region)
 
-def generate_embedding(text):
-    """Generate embeddings using Amazon Bedrock Titan Embeddings model"""
+def invoke_embedding_model(text):
+    """Call the Amazon Bedrock Titan Embeddings model"""
     response = bedrock_runtime.invoke_model(
-        modelId='amazon.titan-embed-text-v1',
+        modelId=embedding_model_id,
         contentType='application/json',
         accept='application/json',
-        body=json.dumps({
-            'inputText': text
-        })
+        body=json.dumps(vector_config.embedding_request(text))
     )
     
     response_body = json.loads(response['body'].read())
     return response_body['embedding']
 
+def generate_embedding(text):
+    """Generate embeddings using Amazon Bedrock Titan Embeddings model, reading through the local embedding cache"""
+    return embedding_cache.cached_embedding(vector_config.cache_id, text, invoke_embedding_model)
+
 def semantic_search(json_file_path, index_name, client):
     # Search for the Documents
     q = input("What are you looking for? ")
@@ -64,21 +70,9 @@ def main(argv):
     host = os.environ.get('AOSS_VECTORSEARCH_ENDPOINT')
     region = os.environ.get('AOSS_VECTORSEARCH_REGION')
     index = "opensearch_movies"
-    service = 'aoss'
 
-    credentials = boto3.Session().get_credentials()
-    awsauth = AWS4Auth(credentials.access_key, credentials.secret_key, region, service,
-    session_token=credentials.token)
-    
     # Create an OpenSearch client
-    client = OpenSearch(
-        hosts = [{'host': host, 'port': 443}],
-        http_auth = awsauth,
-        timeout = 300,
-        use_ssl = True,
-        verify_certs = True,
-        connection_class = RequestsHttpConnection
-    )
+    client = clients.create_opensearch_client(host=host, region=region)
     semantic_search(json_file_path, index, client)
     
 if __name__ == '__main__':
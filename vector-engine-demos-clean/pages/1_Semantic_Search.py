@@ -7,6 +7,9 @@ sys.path.append(os.path.abspath(module_path))
 
 # from utils import opensearch
 from utils import bedrockopensearch as opensearch
+from utils import bedrockopensearch_async as opensearch_async
+from utils import ingest_workers
+from utils import metrics
 
 st.set_page_config(
     page_title="Semantic Search using OpenSearch",
@@ -14,6 +17,51 @@ st.set_page_config(
     page_icon=":technologist:"
 )
 
+# Search results for the same inputs are reused across reruns and sessions for a while
+result_cache_ttl = int(os.environ.get('AOSS_RESULT_CACHE_TTL', '300'))
+result_cache_max_entries = int(os.environ.get('AOSS_RESULT_CACHE_MAX_ENTRIES', '256'))
+
+@st.cache_resource(show_spinner="Connecting to OpenSearch and Bedrock...")
+def search_clients():
+    """OpenSearch and Bedrock clients, built once per server process and shared by all sessions"""
+    return opensearch.get_opensearch_client(), opensearch.get_bedrock_runtime()
+
+@st.cache_resource
+def metrics_server():
+    """Prometheus /metrics endpoint on AOSS_METRICS_PORT, started once per server process"""
+    return metrics.start_http_server()
+
+@st.cache_data(ttl=result_cache_ttl, max_entries=result_cache_max_entries, show_spinner="Searching...")
+def search_movies(question, sort_by, genres_filter, rating_filter, index, size, page, search_after):
+    # AOSS_ASYNC_QUERIES overlaps the lexical search with the query embedding
+    query_movies_page = opensearch_async.query_movies_page_sync if opensearch_async.async_queries else opensearch.query_movies_page
+    return query_movies_page(question, sort_by, genres_filter, rating_filter, index,
+                             size=size, page=page, search_after=search_after)
+
+@st.cache_data(ttl=result_cache_ttl, max_entries=result_cache_max_entries, show_spinner="Searching...")
+def search_movies_hybrid(question, sort_by, genres_filter, rating_filter, index, size):
+    return opensearch.query_movies_hybrid(question, sort_by, genres_filter, rating_filter, index, size=size)
+
+def cursor_key(cursor):
+    # Hashable form of a page's (knn, keyword) search_after cursors for the result cache
+    return tuple(tuple(c) if isinstance(c, list) else c for c in cursor)
+
+def showing(results, doc_count, offset):
+    if doc_count is None:
+        return "No more matched documents"
+    if not results:
+        return f"Showing **0 out of {doc_count}** matched documents"
+    return f"Showing **{offset + 1}-{offset + len(results)} out of {doc_count}** matched documents"
+
+def next_page(cursor):
+    st.session_state.page_cursors.append(cursor_key(cursor))
+
+def previous_page():
+    st.session_state.page_cursors.pop()
+
+search_clients()
+metrics_server()
+
 st.sidebar.header("Search Filters")
 
 st.header('Compare lexical search with semantic search :technologist:')
@@ -21,42 +69,117 @@ st.write("This demo shows the difference between lexical search and semantic sea
 st.divider() 
 question = st.text_input("Enter your search term", "Movie to watch in holidays")
 
-# Filters
+# Filters; widgets inside the form only rerun the page when the form is submitted
 with st.sidebar.form("Filters"):
-    # dataset = st.sidebar.selectbox("Select Dataset", ["Movies", "Headsets"])
-    sort_by = st.sidebar.selectbox("Sort By", ["score", "year", "rating"])
-    genres_filter = st.sidebar.selectbox("Select Genre", ["*", "Comedy", "Mystery", "Action", "Romance" ])
-    rating_filter = st.sidebar.slider('Enter rating', min_value=0.0, max_value=10.0, value=5.0)
-
-if question:
-    response_knn, doc_count_knn, response_kw, doc_count_kw = opensearch.query_movies(question, sort_by, genres_filter, rating_filter, "opensearch_movies")
-
-    with st.container():
-        knn, kw = st.columns(2)
-        with knn:
-            st.subheader("Semantic Search using kNN")
-            st.write(f"Showing **{len(response_knn)} out of {doc_count_knn}** matched documents")
-            st.divider()
-        with kw:
-            st.subheader("Lexical Search using keywords")
-            st.write(f"Showing **{len(response_kw)} out of {doc_count_kw}** matched documents")
+    # dataset = st.selectbox("Select Dataset", ["Movies", "Headsets"])
+    sort_by = st.selectbox("Sort By", ["score", "year", "rating"])
+    genres_filter = st.selectbox("Select Genre", ["*", "Comedy", "Mystery", "Action", "Romance" ])
+    rating_filter = st.slider('Enter rating', min_value=0.0, max_value=10.0, value=5.0)
+    search_mode = st.radio("Search mode", ["Compare", "Hybrid"], help="Hybrid blends lexical and kNN scores into a single ranked list")
+    page_size = st.selectbox("Results per page", [3, 5, 10, 20])
+    st.form_submit_button("Apply filters")
+
+# Compare mode pages with search_after: page_cursors holds the cursors each visited page
+# started from, and any change to the search starts over at the first page
+search_key = (question, sort_by, genres_filter, rating_filter, search_mode, page_size)
+if st.session_state.get("search_key") != search_key:
+    st.session_state.search_key = search_key
+    st.session_state.page_cursors = [(None, None)]
+page = len(st.session_state.page_cursors) - 1
+
+# Each run is traced: the (possibly cached) search, its query stages when it ran, and rendering
+query_trace = None
+with metrics.trace("semantic_search_page", mode=search_mode) as page_trace:
+    if question and search_mode == "Hybrid":
+        previous_trace = metrics.last_trace()
+        with metrics.stage("search"):
+            response_hybrid, doc_count_hybrid = search_movies_hybrid(question, sort_by, genres_filter, rating_filter, "opensearch_movies", page_size)
+        if metrics.last_trace() is not previous_trace:
+            query_trace = metrics.last_trace()
+
+        with metrics.stage("render"), st.container():
+            st.subheader("Hybrid Search (lexical + kNN)")
+            st.write(f"Showing **{len(response_hybrid)} out of {doc_count_hybrid}** matched documents")
             st.divider()
-        for i in range(max(len(response_knn), len(response_kw))):
-            headings_knn, image_knn, headings_kw, image_kw = st.columns(4)
-            with headings_knn:           
-                if i < len(response_knn):
-                    st.header(response_knn[i]['title'] + " (" +  str(response_knn[i]["year"]) + ")")
-                    st.write("**" + response_knn[i]["plot"] + "**")
-                    st.write("**"  + str(response_knn[i]["rating"]) + "** :star2:     " + "**" + str(response_knn[i]["genres"]) + "**")
-            with image_knn:
-                if i < len(response_knn):
-                    st.image(response_knn[i]["poster"], caption=response_knn[i]["title"], width=100)    
-            with headings_kw:            
-                if i < len(response_kw):
-                    st.header(response_kw[i]["title"] + " (" +  str(response_kw[i]["year"]) + ")")
-                    st.write("**" + response_kw[i]["plot"] + "**")
-                    st.write("**"  + str(response_kw[i]["rating"]) + "** :star2:     " + "**" + str(response_kw[i]["genres"]) + "**")
-            with image_kw:
-                if i < len(response_kw):
-                    st.image(response_kw[i]["poster"], caption=response_kw[i]["title"], width=100)    
+            for movie in response_hybrid:
+                headings, image = st.columns([3, 1])
+                with headings:
+                    st.header(movie['title'] + " (" +  str(movie["year"]) + ")")
+                    st.write("**" + movie["plot"] + "**")
+                    st.write("**"  + str(movie["rating"]) + "** :star2:     " + "**" + str(movie["genres"]) + "**")
+                with image:
+                    st.image(movie["poster"], caption=movie["title"], width=100)
+
+    elif question:
+        previous_trace = metrics.last_trace()
+        with metrics.stage("search"):
+            response_knn, doc_count_knn, response_kw, doc_count_kw, cursor = search_movies(
+                question, sort_by, genres_filter, rating_filter, "opensearch_movies",
+                page_size, page, st.session_state.page_cursors[-1])
+        if metrics.last_trace() is not previous_trace:
+            query_trace = metrics.last_trace()
+
+        with metrics.stage("render"), st.container():
+            knn, kw = st.columns(2)
+            with knn:
+                st.subheader("Semantic Search using kNN")
+                st.write(showing(response_knn, doc_count_knn, page * page_size))
+                st.divider()
+            with kw:
+                st.subheader("Lexical Search using keywords")
+                st.write(showing(response_kw, doc_count_kw, page * page_size))
+                st.divider()
+            for i in range(max(len(response_knn), len(response_kw))):
+                headings_knn, image_knn, headings_kw, image_kw = st.columns(4)
+                with headings_knn:           
+                    if i < len(response_knn):
+                        st.header(response_knn[i]['title'] + " (" +  str(response_knn[i]["year"]) + ")")
+                        st.write("**" + response_knn[i]["plot"] + "**")
+                        st.write("**"  + str(response_knn[i]["rating"]) + "** :star2:     " + "**" + str(response_knn[i]["genres"]) + "**")
+                with image_knn:
+                    if i < len(response_knn):
+                        st.image(response_knn[i]["poster"], caption=response_knn[i]["title"], width=100)    
+                with headings_kw:            
+                    if i < len(response_kw):
+                        st.header(response_kw[i]["title"] + " (" +  str(response_kw[i]["year"]) + ")")
+                        st.write("**" + response_kw[i]["plot"] + "**")
+                        st.write("**"  + str(response_kw[i]["rating"]) + "** :star2:     " + "**" + str(response_kw[i]["genres"]) + "**")
+                with image_kw:
+                    if i < len(response_kw):
+                        st.image(response_kw[i]["poster"], caption=response_kw[i]["title"], width=100)    
+
+            previous, _, following = st.columns([1, 4, 1])
+            previous.button("Previous", on_click=previous_page, disabled=page == 0)
+            following.button("Next", on_click=next_page, args=(cursor,), disabled=cursor == (None, None))
+
+# Progress of a movie load running in the background (python indexer/movies_loader.py, see its status command)
+load_status = ingest_workers.read_status()
+if load_status is not None:
+    loading = load_status["state"] in ingest_workers.ACTIVE_STATES
+    with st.sidebar.expander(f"Data load: {load_status['state']}", expanded=loading):
+        st.progress(min(load_status["progress"], 1.0), text=f"{load_status['progress']:.0%} of the input file")
+        st.write(f"**{load_status['docs']}** documents indexed into {load_status['index']}, **{load_status['failed']}** failed")
+        st.write(f"{load_status['docs_per_sec']:.1f} docs/sec, ETA {ingest_workers.format_duration(load_status['eta_seconds'])}")
+        for worker in load_status["workers"]:
+            if worker["error"]:
+                st.warning(f"Worker {worker['worker']} ({worker['state']}, {worker['restarts']} restarts): {worker['error']}")
+        if loading:
+            st.button("Refresh load status")
 
+# Debug panel: this run's breakdown and the process-wide stage histograms
+with st.sidebar.expander("Latency (debug)"):
+    st.write(f"Page run: **{page_trace.total_ms:.1f} ms**")
+    st.table([{"stage": name, "ms": round(ms, 1)} for name, ms in page_trace.stages.items()])
+    if query_trace is not None:
+        st.write(f"{query_trace.operation}: **{query_trace.total_ms:.1f} ms**")
+        st.table([{"stage": name, "ms": round(ms, 1)} for name, ms in query_trace.stages.items()])
+        if query_trace.took_ms:
+            search_ms = sum(ms for name, ms in query_trace.stages.items() if "search" in name)
+            st.write(f"OpenSearch took: {query_trace.took_ms} ms, client wall time {search_ms:.1f} ms")
+    elif question:
+        st.write("Results served from the result cache")
+    histograms = metrics.registry.snapshot()
+    rows = [{"metric": name.replace("aoss_", ""), "labels": labels, **summary}
+            for name, series in histograms.items() for labels, summary in series.items()]
+    if rows:
+        st.dataframe(rows, hide_index=True)
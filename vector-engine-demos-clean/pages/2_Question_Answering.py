@@ -0,0 +1,111 @@
+import streamlit as st
+import sys
+import os
+
+module_path = ".."
+sys.path.append(os.path.abspath(module_path))
+
+from utils import bedrockopensearch as opensearch
+from utils import metrics
+from utils import qna
+
+st.set_page_config(
+    page_title="Q&A using OpenSearch and Bedrock",
+    layout="wide",
+    page_icon=":technologist:"
+)
+
+# Retrieved and packed context for the same inputs is reused across reruns and sessions for a while
+result_cache_ttl = int(os.environ.get('AOSS_RESULT_CACHE_TTL', '300'))
+result_cache_max_entries = int(os.environ.get('AOSS_RESULT_CACHE_MAX_ENTRIES', '256'))
+
+MODELS = {
+    "Claude Instant": "anthropic.claude-instant-v1",
+    "Titan Text": "amazon.titan-tg1-large",
+}
+if qna.QNA_MODEL not in MODELS.values():
+    MODELS = {qna.QNA_MODEL: qna.QNA_MODEL, **MODELS}
+
+@st.cache_resource(show_spinner="Connecting to OpenSearch and Bedrock...")
+def search_clients():
+    """OpenSearch and Bedrock clients, built once per server process and shared by all sessions"""
+    return opensearch.get_opensearch_client(), opensearch.get_bedrock_runtime()
+
+@st.cache_resource
+def metrics_server():
+    """Prometheus /metrics endpoint on AOSS_METRICS_PORT, started once per server process"""
+    return metrics.start_http_server()
+
+@st.cache_data(ttl=result_cache_ttl, max_entries=result_cache_max_entries, show_spinner="Retrieving passages...")
+def retrieve_context(question, index, candidates, budget_tokens):
+    return qna.retrieve_context(question, index, candidates=candidates, budget_tokens=budget_tokens)
+
+def write_stream(chunks):
+    """Show streamed text as it arrives; st.write_stream needs Streamlit 1.31 and dependency.sh installs 1.27"""
+    placeholder = st.empty()
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        placeholder.markdown(text + "▌")
+    placeholder.markdown(text)
+    return text
+
+search_clients()
+metrics_server()
+
+st.sidebar.header("Answer Settings")
+
+st.header('Ask questions over your documents with OpenSearch and Bedrock :technologist:')
+st.write("Passages retrieved with kNN search are packed into the prompt within a token budget, and the answer is streamed as the model writes it")
+st.divider()
+question = st.text_input("Enter your question", "Which movie is about a heist with a clever twist?")
+
+with st.sidebar.form("Settings"):
+    model_name = st.selectbox("Model", list(MODELS), index=list(MODELS.values()).index(qna.QNA_MODEL))
+    use_knowledge_base = st.checkbox("Answer from the knowledge base", value=True)
+    budget_tokens = st.slider("Context budget (tokens)", min_value=200, max_value=4000, value=qna.QNA_CONTEXT_TOKENS, step=100)
+    candidates = st.slider("Passages retrieved", min_value=1, max_value=50, value=qna.QNA_CANDIDATES)
+    st.form_submit_button("Apply settings")
+
+# Each run is traced: retrieval (when not cached), time to the first answer token and the full generation
+query_trace = None
+packed = None
+with metrics.trace("qna_page", model=MODELS[model_name]) as page_trace:
+    if question:
+        if use_knowledge_base:
+            previous_trace = metrics.last_trace()
+            with metrics.stage("retrieval"):
+                packed = retrieve_context(question, "opensearch_qna", candidates, budget_tokens)
+            if metrics.last_trace() is not previous_trace:
+                query_trace = metrics.last_trace()
+
+        st.subheader("Answer")
+        write_stream(qna.answer(question, packed, model_id=MODELS[model_name]))
+
+        if packed:
+            with st.expander(f"Context: {len(packed['passages'])} passages, ~{packed['tokens']} tokens"):
+                st.caption(f"Dropped {packed['duplicates']} duplicate and {packed['over_budget']} over-budget passages")
+                for n, passage in enumerate(packed["passages"], 1):
+                    st.write(f"**[{n}] {passage['title']}** (score {passage['score']:.3f})")
+                    st.write(passage["content"])
+
+# Debug panel: this run's breakdown and the process-wide stage histograms
+with st.sidebar.expander("Latency (debug)"):
+    st.write(f"Page run: **{page_trace.total_ms:.1f} ms**")
+    if "time_to_first_token" in page_trace.stages:
+        st.write(f"Time to first token: **{page_trace.stages['time_to_first_token']:.1f} ms**")
+    elif "semantic_cache_hit" in page_trace.stages:
+        st.write("Answer served from the semantic cache")
+    cache_stats = qna.semantic_cache_stats()
+    st.write(f"Semantic cache: {cache_stats['entries']} answers, hit rate {cache_stats['hit_rate']:.0%}")
+    st.table([{"stage": name, "ms": round(ms, 1)} for name, ms in page_trace.stages.items()])
+    if query_trace is not None:
+        st.write(f"{query_trace.operation}: **{query_trace.total_ms:.1f} ms**")
+        st.table([{"stage": name, "ms": round(ms, 1)} for name, ms in query_trace.stages.items()])
+    elif packed:
+        st.write("Context served from the result cache")
+    histograms = metrics.registry.snapshot()
+    rows = [{"metric": name.replace("aoss_", ""), "labels": labels, **summary}
+            for name, series in histograms.items() for labels, summary in series.items()]
+    if rows:
+        st.dataframe(rows, hide_index=True)
@@ -5,9 +5,7 @@
 import os
 from typing import Optional
 
-# External Dependencies:
-import boto3
-from botocore.config import Config
+from utils import clients
 
 
 def get_bedrock_client(
@@ -42,26 +40,17 @@ def get_bedrock_client(
         print(f"  Using profile: {profile_name}")
         session_kwargs["profile_name"] = profile_name
 
-    retry_config = Config(
-        region_name=target_region,
-        retries={
-            "max_attempts": 10,
-            "mode": "standard",
-        },
-    )
-    session = boto3.Session(**session_kwargs)
+    # Pooled keep-alive connections with standard retries
+    retry_config = clients.bedrock_config(region=target_region)
 
     if assumed_role:
-        print(f"  Using role: {assumed_role}", end='')
-        sts = session.client("sts")
-        response = sts.assume_role(
-            RoleArn=str(assumed_role),
-            RoleSessionName="langchain-llm-1"
-        )
-        print(" ... successful!")
-        client_kwargs["aws_access_key_id"] = response["Credentials"]["AccessKeyId"]
-        client_kwargs["aws_secret_access_key"] = response["Credentials"]["SecretAccessKey"]
-        client_kwargs["aws_session_token"] = response["Credentials"]["SessionToken"]
+        # Role credentials are fetched on first use and refreshed before they expire
+        print(f"  Using role: {assumed_role}")
+    session = clients.aws_session(
+        assumed_role=assumed_role,
+        region=target_region,
+        profile_name=session_kwargs.get("profile_name"),
+    )
 
     if runtime:
         service_name='bedrock-runtime'
@@ -1,49 +1,120 @@
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from requests_aws4auth import AWS4Auth
-import boto3
+from opensearchpy.exceptions import NotFoundError, TransportError
 import os
 import sys
 import json
-#from langchain.llms.bedrock import Bedrock
-from langchain_aws import BedrockLLM
 
 module_path = "./"
 sys.path.append(os.path.abspath(module_path))
 from utils import bedrock
+from utils import clients
+from utils import embeddings
+from utils.lazy import LazyAttributes
+from utils import local_search
+from utils import metrics
+from utils import query_builder
+from utils.fusion import reciprocal_rank_fusion
+from utils.query_cache import TTLCache
+from utils.vector_config import get_vector_config
 
-# Set the desired vector size for Titan Embeddings
-vector_size = 1536
+# Query vectors must match the model and dimension the index was loaded with
+vector_config = get_vector_config()
+vector_size = vector_config.dimension
+embedding_model_id = vector_config.model_id
 
 # OpenSearch
 host = os.environ.get('AOSS_VECTORSEARCH_ENDPOINT')
 region = os.environ.get('AOSS_VECTORSEARCH_REGION')
 
-# Bedrock Clients connection
-boto3_bedrock = bedrock.get_bedrock_client(
-    assumed_role=os.environ.get("AOSS_BEDROCK_ASSUME_ROLE", None),
-    region=os.environ.get("AOSS_VECTORSEARCH_REGION", None),
-    runtime=True
+# "opensearch" queries the collection; "local" serves query_movies from utils.local_search
+search_backend = os.environ.get('AOSS_SEARCH_BACKEND', 'opensearch')
+
+# Clients and LLMs are created on first use rather than at import, so pages that
+# don't need them (or only need some) start quickly
+def create_bedrock_client():
+    return bedrock.get_bedrock_client(
+        assumed_role=os.environ.get("AOSS_BEDROCK_ASSUME_ROLE", None),
+        region=os.environ.get("AOSS_VECTORSEARCH_REGION", None),
+        runtime=True
+    )
+
+def create_claude_llm():
+    from langchain_aws import BedrockLLM
+    #claude_llm = Bedrock(model_id="anthropic.claude-instant-v1", client=boto3_bedrock, model_kwargs={'max_tokens_to_sample':1000})
+    return BedrockLLM(model_id="anthropic.claude-instant-v1", client=get_bedrock_runtime(), model_kwargs={'max_tokens_to_sample':1000})
+
+def create_embedding_provider():
+    # Bedrock requests go through invoke_embedding_model so a replaced boto3_bedrock is honoured
+    return embeddings.create_provider(vector_config, invoke=lambda text: invoke_embedding_model(text))
+
+def create_titan_llm():
+    from langchain_aws import BedrockLLM
+    return BedrockLLM(model_id= "amazon.titan-tg1-large", client=get_bedrock_runtime())
+
+# Module attributes boto3_bedrock, client, embedding_provider, claude_llm and titan_llm resolve through _lazy
+_lazy = LazyAttributes(
+    globals(),
+    boto3_bedrock=create_bedrock_client,
+    client=clients.get_opensearch_client,
+    embedding_provider=create_embedding_provider,
+    claude_llm=create_claude_llm,
+    titan_llm=create_titan_llm,
 )
+__getattr__ = _lazy.module_getattr
+
+def get_bedrock_runtime():
+    return _lazy.get("boto3_bedrock")
+
+def get_opensearch_client():
+    return _lazy.get("client")
+
+def get_embedding_provider():
+    return _lazy.get("embedding_provider")
+
+def get_claude_llm():
+    return _lazy.get("claude_llm")
+
+def get_titan_llm():
+    return _lazy.get("titan_llm")
 
 # Function to generate embeddings using Bedrock
-def generate_embedding(text):
-    """Generate embeddings using Amazon Bedrock Titan Embeddings model"""
-    response = boto3_bedrock.invoke_model(
-        modelId='amazon.titan-embed-text-v1',
+def invoke_embedding_model(text):
+    """Call the Amazon Bedrock Titan Embeddings model"""
+    response = get_bedrock_runtime().invoke_model(
+        modelId=embedding_model_id,
         contentType='application/json',
         accept='application/json',
-        body=json.dumps({
-            'inputText': text
-        })
+        body=json.dumps(vector_config.embedding_request(text))
     )
     
     response_body = json.loads(response['body'].read())
     return response_body['embedding']
 
-# - create the LLM Model
-#claude_llm = Bedrock(model_id="anthropic.claude-instant-v1", client=boto3_bedrock, model_kwargs={'max_tokens_to_sample':1000})
-claude_llm = BedrockLLM(model_id="anthropic.claude-instant-v1", client=boto3_bedrock, model_kwargs={'max_tokens_to_sample':1000})
-titan_llm = BedrockLLM(model_id= "amazon.titan-tg1-large", client=boto3_bedrock)
+def generate_embedding(text):
+    """Generate an embedding with the configured provider, reading through the local embedding cache"""
+    return get_embedding_provider().embed(text)
+
+# Streamlit reruns the page on every widget change, so keep recent query vectors in memory
+query_embedding_cache = TTLCache(
+    max_entries=int(os.environ.get('AOSS_QUERY_CACHE_MAX_ENTRIES', '1024')),
+    ttl=float(os.environ.get('AOSS_QUERY_CACHE_TTL', '3600'))
+)
+
+def embed_query(query):
+    """Return the embedding for a search query, reusing it across reruns with the same query"""
+    return query_embedding_cache.get_or_compute(query, lambda: generate_embedding(query))
+
+def embed_queries(queries):
+    """Embeddings for several queries; the ones not in the query cache are embedded in one embed_many call"""
+    vectors = {query: query_embedding_cache.get(query) for query in dict.fromkeys(queries)}
+    missing = [query for query, vector in vectors.items() if vector is None]
+    for query, vector in zip(missing, get_embedding_provider().embed_many(missing)):
+        query_embedding_cache.put(query, vector)
+        vectors[query] = vector
+    return [vectors[query] for query in queries]
+
+def query_cache_stats():
+    """Hit-rate statistics of the in-process query embedding cache"""
+    return query_embedding_cache.stats()
 
 # - Create Prompts
 def get_claude_prompt(context, user_question, knowledgebase_filter):
@@ -78,186 +149,313 @@ def get_titan_prompt(context, user_question, knowledgebase_filter):
         """
         return prompt
 
-service = 'aoss'
-credentials = boto3.Session().get_credentials()
-awsauth = AWS4Auth(credentials.access_key, credentials.secret_key, region, service,
-session_token=credentials.token)
-
-# Create an OpenSearch client
-client = OpenSearch(
-    hosts = [{'host': host, 'port': 443}],
-    http_auth = awsauth,
-    timeout = 300,
-    use_ssl = True,
-    verify_certs = True,
-    connection_class = RequestsHttpConnection
-)
-
 # Define queries for OpenSearch
-def query_qna(query, index):
-    query_embedding = generate_embedding(query)
-    query_qna = {
-        "size": 3,
+def build_qna_query(query_embedding, size=3):
+    return {
+        "size": size,
         "fields": ["content", "title"],
         "_source": False,
-        "query": {
-            "knn": {
-            "v_content": {
-                "vector": query_embedding,
-                "k": 3  # Number of nearest neighbors to find
-            }
-            }
-        }
+        "query": query_builder.knn_clause("v_content", query_embedding, query_builder.knn_k(size, pages=1))
     }
 
-    relevant_documents = client.search(
-        body = query_qna,
-        index = index
-    )
-    return relevant_documents
+# Response trimming: filter_path drops what the result extraction never reads (shard
+# statistics, _index, _score, max_score); vectors are never requested in _source
+trim_responses = os.environ.get('AOSS_TRIM_RESPONSES', 'on').lower() in ('1', 'on', 'true', 'yes')
 
-def query_movies(query, sort, genres, rating, index):
-    if sort == 'year':
-        sort_type = "year"
-    elif sort == 'rating':
-        sort_type = "rating"
-    else:
-        sort_type = "_score"
+# hits.hits.sort carries the search_after cursor of the next page
+SEARCH_FILTER_PATH = ["took", "error", "hits.total.value", "hits.hits._id", "hits.hits._source", "hits.hits.sort"]
+QNA_FILTER_PATH = ["took", "error", "hits.total.value", "hits.hits._id", "hits.hits._score", "hits.hits.fields"]
+
+def search_params(filter_path=SEARCH_FILTER_PATH, msearch=False, **params):
+    """Query parameters for search / msearch calls, with filter_path when trimming is on"""
+    if trim_responses:
+        if msearch:
+            filter_path = ["took"] + [f"responses.{path}" for path in filter_path] + ["responses.status"]
+        params["filter_path"] = ",".join(filter_path)
+    return params
 
+def query_qna(query, index, size=3):
+    with metrics.trace("query_qna", index=index) as trace:
+        with metrics.stage("embedding"):
+            query_embedding = embed_query(query)
+        query_qna = build_qna_query(query_embedding, size=size)
+
+        with metrics.stage("knn_search"):
+            relevant_documents = get_opensearch_client().search(
+                body = query_qna,
+                index = index,
+                params = search_params(QNA_FILTER_PATH)
+            )
+        trace.took("knn", relevant_documents.get('took'))
+    return relevant_documents
+
+def movie_search_params(sort, genres, rating):
+    """Normalize the page's sort/genre/rating inputs into query parameters"""
     if genres == '':
         genres = '*'
 
     if rating == '':
         rating = 0
 
-    # Generate embedding using Bedrock instead of SentenceTransformer
-    query_embedding = generate_embedding(query)
-    
-    query_knn = {
-        "size": 3,
-        "sort": [
-            {
-                sort_type: {
-                    "order": "desc"
-                }
-            }
-        ],
-        "_source": {
-            "includes": [
-                "title",
-                "plot",
-                "rating",
-                "year",
-                "poster",
-                "genres"
+    return query_builder.sort_type(sort), genres, rating
+
+def movie_filters(genres, rating):
+    return query_builder.movie_filters(genres, rating)
+
+def build_movies_knn_query(query_embedding, sort_type, genres, rating, size=3, k=None, search_after=None):
+    return query_builder.knn_query(query_embedding, size=size, k=k, filters=movie_filters(genres, rating),
+                                   sort_field=sort_type, search_after=search_after)
+
+def build_movies_kw_query(query, sort_type, genres, rating, size=3, search_after=None):
+    return query_builder.keyword_query(query, size=size, filters=movie_filters(genres, rating),
+                                       sort_field=sort_type, search_after=search_after)
+
+def movie_result(hit):
+    # _source holds MOVIE_SOURCE; a movie without a plot or poster has no such key
+    return query_builder.movie_result(hit['_source'])
+
+def response_hits(response):
+    """(hits, total) of a search response; filter_path leaves out hits.hits when nothing matched"""
+    if 'error' in response:
+        raise RuntimeError(f"OpenSearch search failed: {response['error']}")
+    hits = response.get('hits', {})
+    return hits.get('hits', []), hits.get('total', {}).get('value', 0)
+
+def extract_movies(response):
+    """Extract relevant information from a search result as (results, doc_count)"""
+    hits, doc_count = response_hits(response)
+    results = [movie_result(hit) for hit in hits]
+    return results, doc_count
+
+def query_movies(query, sort, genres, rating, index, size=3):
+    results_knn, doc_count_knn, results_kw, doc_count_kw, _ = query_movies_page(query, sort, genres, rating, index, size=size)
+    return results_knn, doc_count_knn, results_kw, doc_count_kw
+
+def query_movies_page(query, sort, genres, rating, index, size=3, page=0, search_after=(None, None)):
+    """One page of kNN and lexical results, with the cursors of the next page
+
+    page is the 0-based page number and search_after the (knn, keyword) cursors
+    returned with the previous page. Returns (results_knn, doc_count_knn,
+    results_kw, doc_count_kw, (cursor_knn, cursor_kw)). A None cursor means that
+    list has no further page; passed back in for a later page, the list is not
+    searched again and comes back empty with a None doc count. Cursors are opaque:
+    sort values for OpenSearch, result offsets for the local backend.
+    """
+    active = [page == 0 or cursor is not None for cursor in search_after]
+    with metrics.trace("query_movies", index=index, sort=sort, backend=search_backend, page=page) as trace:
+        sort_type, genres, rating = movie_search_params(sort, genres, rating)
+
+        # Generate embedding using Bedrock instead of SentenceTransformer
+        with metrics.stage("embedding"):
+            query_embedding = embed_query(query)
+
+        if search_backend == 'local':
+            local_index = local_search.get_local_index(generate_embedding)
+            with metrics.stage("local_search"):
+                offsets = tuple(cursor or 0 for cursor in search_after)
+                local_results = local_index.query_movies(query, query_embedding, sort_type, genres, rating,
+                                                         size=size, offsets=offsets)
+            pages = []
+            for is_active, offset, results, count in zip(active, offsets, local_results[0::2], local_results[1::2]):
+                if not is_active:
+                    pages.append(([], None, None))
+                else:
+                    pages.append((results, count, offset + size if offset + size < count else None))
+        else:
+            cursor_knn, cursor_kw = search_after
+            searches = [
+                build_movies_knn_query(query_embedding, sort_type, genres, rating, size=size, search_after=cursor_knn),
+                build_movies_kw_query(query, sort_type, genres, rating, size=size, search_after=cursor_kw),
             ]
-        },
-        "query": {
-            "bool": {
-                "should": [
-                    {
-                        "knn": {
-                            "v_plot": {
-                                "vector": query_embedding,
-                                "k": 3  # Number of nearest neighbors to find
-                            }
-                        }
-                    },
-                    {
-                        "knn": {
-                            "v_title": {
-                                "vector": query_embedding,
-                                "k": 3  # Number of nearest neighbors to find
-                            }
-                        }
-                    }
-                ],
-                "filter": [
-                    {
-                        "query_string": {
-                            "query": genres,
-                            "fields": [
-                                "genres"
-                            ]
-                        }
-                    },
-                    {
-                      "range": {
-                        "rating": {
-                          "gte": rating
-                        }
-                      }
-                    }
-                ]
-            }
-        }
-    }
-    response_knn = client.search(
-        body = query_knn,
-        index = index
-    )
+            body = []
+            for is_active, search in zip(active, searches):
+                if is_active:
+                    body += [{"index": index}, search]
+
+            # Send the kNN and lexical queries in a single round trip; the per-search took
+            # values show how much of the wall time is spent in the cluster
+            with metrics.stage("msearch"):
+                responses = iter(get_opensearch_client().msearch(body = body, params = search_params(msearch=True))['responses'])
+
+            pages = []
+            with metrics.stage("extract"):
+                for is_active, name in zip(active, ("knn", "keyword")):
+                    if not is_active:
+                        pages.append(([], None, None))
+                        continue
+                    response = next(responses)
+                    trace.took(name, response.get('took'))
+                    results, doc_count = extract_movies(response)
+                    pages.append((results, doc_count, query_builder.next_search_after(response, size)))
+
+    (results_knn, doc_count_knn, next_knn), (results_kw, doc_count_kw, next_kw) = pages
+    return results_knn, doc_count_knn, results_kw, doc_count_kw, (next_knn, next_kw)
+
+def query_movies_batch(searches, index):
+    """Run many searches in one msearch request, for offline evaluation and cache warm-up
+
+    searches is a list of (query, sort, genres, rating) tuples. Returns one
+    (results_knn, doc_count_knn, results_kw, doc_count_kw) tuple per search, in order.
+    """
+    searches = list(searches)
+    if not searches:
+        return []
+
+    with metrics.trace("query_movies_batch", index=index, searches=len(searches), backend=search_backend) as trace:
+        # Embed the distinct query strings in one batch, warming the query embedding cache
+        queries = list(dict.fromkeys(search[0] for search in searches))
+        with metrics.stage("embedding"):
+            query_vectors = dict(zip(queries, embed_queries(queries)))
 
-    # Extract relevant information from the search result
-    hits_knn = response_knn['hits']['hits']
-    doc_count_knn = response_knn['hits']['total']['value']
-    results_knn = [{'genres':  hit['_source']['genres'],'poster':  hit['_source']['poster'],'title': hit['_source']['title'], 'rating': hit['_source']['rating'], 'year': hit['_source']['year'], 'plot' : hit['_source']['plot']} for hit in hits_knn]
+        if search_backend == 'local':
+            local_index = local_search.get_local_index(generate_embedding)
+            with metrics.stage("local_search"):
+                return [local_index.query_movies(query, query_vectors[query], *movie_search_params(sort, genres, rating))
+                        for query, sort, genres, rating in searches]
 
-    query_kw = {
-        "size": 3,
-        "sort": [
+        body = []
+        for query, sort, genres, rating in searches:
+            sort_type, genres, rating = movie_search_params(sort, genres, rating)
+            body.append({"index": index})
+            body.append(build_movies_knn_query(query_vectors[query], sort_type, genres, rating))
+            body.append({"index": index})
+            body.append(build_movies_kw_query(query, sort_type, genres, rating))
+
+        with metrics.stage("msearch"):
+            response = get_opensearch_client().msearch(body = body, params = search_params(msearch=True))
+        trace.took("msearch", response.get('took'))
+        responses = response['responses']
+
+        results = []
+        with metrics.stage("extract"):
+            for response_knn, response_kw in zip(responses[0::2], responses[1::2]):
+                results_knn, doc_count_knn = extract_movies(response_knn)
+                results_kw, doc_count_kw = extract_movies(response_kw)
+                results.append((results_knn, doc_count_knn, results_kw, doc_count_kw))
+    return results
+
+# - Hybrid search: one ranked list combining lexical and kNN scores
+
+hybrid_pipeline_name = os.environ.get('AOSS_HYBRID_PIPELINE', 'movies-hybrid-pipeline')
+
+# Weights of the lexical and kNN sub-queries, in that order
+hybrid_weights = [0.3, 0.7]
+
+# Candidates fetched per list for the client-side reciprocal rank fusion fallback
+rrf_candidates = 50
+
+_hybrid_pipeline_available = None
+
+def hybrid_pipeline_body():
+    return {
+        "description": "Min-max normalize lexical and kNN scores and combine them with a weighted mean",
+        "phase_results_processors": [
             {
-                sort_type: {
-                    "order": "desc"
+                "normalization-processor": {
+                    "normalization": {"technique": "min_max"},
+                    "combination": {
+                        "technique": "arithmetic_mean",
+                        "parameters": {"weights": hybrid_weights}
+                    }
                 }
             }
-        ],
-        "_source": {
-            "includes": [
-                "title",
-                "plot",
-                "rating",
-                "year",
-                "poster",
-                "genres"
-            ]
-        },
+        ]
+    }
+
+def ensure_hybrid_pipeline():
+    """Create the normalization search pipeline if it is missing; False if the cluster has no search pipelines"""
+    global _hybrid_pipeline_available
+    if _hybrid_pipeline_available is None:
+        path = f"/_search/pipeline/{hybrid_pipeline_name}"
+        try:
+            get_opensearch_client().transport.perform_request("GET", path)
+            _hybrid_pipeline_available = True
+        except NotFoundError:
+            try:
+                get_opensearch_client().transport.perform_request("PUT", path, body=hybrid_pipeline_body())
+                _hybrid_pipeline_available = True
+            except TransportError as e:
+                print(f"Search pipelines unavailable, using client-side rank fusion: {e}")
+                _hybrid_pipeline_available = False
+        except TransportError as e:
+            print(f"Search pipelines unavailable, using client-side rank fusion: {e}")
+            _hybrid_pipeline_available = False
+    return _hybrid_pipeline_available
+
+def build_movies_hybrid_query(query, query_embedding, sort_type, genres, rating, size=3):
+    query_kw = build_movies_kw_query(query, sort_type, genres, rating, size=size)
+    query_knn = build_movies_knn_query(query_embedding, sort_type, genres, rating, size=size)
+    body = {
+        "size": size,
+        "_source": query_kw["_source"],
         "query": {
-            "bool": {
-                "must": {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["plot", "title"]
-                    }
-                },
-                "filter": [
-                    {
-                        "query_string": {
-                            "query": genres,
-                            "fields": [
-                                "genres"
-                            ]
-                        }
-                    },
-                    {
-                      "range": {
-                        "rating": {
-                          "gte": rating
-                        }
-                      }
-                    }
-                ]
+            "hybrid": {
+                "queries": [query_kw["query"], query_knn["query"]]
             }
         }
     }
+    if sort_type != "_score":
+        body["sort"] = query_kw["sort"]
+    return body
 
-    response_kw = client.search(
-        body = query_kw,
-        index = index
-    )
+def fuse_movies(response_kw, response_knn, sort_type, size=3):
+    """Reciprocal rank fusion of lexical and kNN hits, returned as (results, doc_count)"""
+    hits = {}
+    rankings = []
+    totals = []
+    for response in (response_kw, response_knn):
+        response_hit_list, total = response_hits(response)
+        ranking = []
+        for hit in response_hit_list:
+            hits.setdefault(hit['_id'], hit)
+            ranking.append(hit['_id'])
+        rankings.append(ranking)
+        totals.append(total)
+    ids, _ = reciprocal_rank_fusion(rankings, weights=hybrid_weights)
+    if sort_type != "_score":
+        ids = sorted(ids, key=lambda doc_id: hits[doc_id]['_source'].get(sort_type) or 0, reverse=True)
+    # Hits matched by either sub-query; at least the larger of the two totals
+    doc_count = max(totals)
+    return [movie_result(hits[doc_id]) for doc_id in ids[:size]], doc_count
+
+def query_movies_hybrid(query, sort, genres, rating, index, size=3):
+    """Single ranked list combining lexical and semantic relevance, as (results, doc_count)
+
+    Uses an OpenSearch hybrid query with a normalization search pipeline when the
+    cluster supports it, and client-side reciprocal rank fusion otherwise.
+    """
+    with metrics.trace("query_movies_hybrid", index=index, sort=sort, backend=search_backend) as trace:
+        sort_type, genres, rating = movie_search_params(sort, genres, rating)
+        with metrics.stage("embedding"):
+            query_embedding = embed_query(query)
+
+        if search_backend == 'local':
+            local_index = local_search.get_local_index(generate_embedding)
+            with metrics.stage("local_search"):
+                return local_index.query_movies_hybrid(query, query_embedding, sort_type, genres, rating, size=size,
+                                                       candidates=rrf_candidates, weights=hybrid_weights)
 
-    # Extract relevant information from the search result
-    hits_kw = response_kw['hits']['hits']
-    doc_count_kw = response_kw['hits']['total']['value']
-    results_kw = [{'genres':  hit['_source']['genres'],'poster':  hit['_source']['poster'],'title': hit['_source']['title'], 'rating': hit['_source']['rating'], 'year': hit['_source']['year'], 'plot' : hit['_source']['plot']} for hit in hits_kw]
+        if ensure_hybrid_pipeline():
+            with metrics.stage("hybrid_search"):
+                response = get_opensearch_client().search(
+                    body = build_movies_hybrid_query(query, query_embedding, sort_type, genres, rating, size=size),
+                    index = index,
+                    params = search_params(search_pipeline=hybrid_pipeline_name)
+                )
+            trace.took("hybrid", response.get('took'))
+            with metrics.stage("extract"):
+                return extract_movies(response)
 
-    return results_knn, doc_count_knn, results_kw, doc_count_kw
\ No newline at end of file
+        # Rank fusion needs the candidates in relevance order, whatever the page sort is
+        query_kw = build_movies_kw_query(query, "_score", genres, rating, size=rrf_candidates)
+        query_knn = build_movies_knn_query(query_embedding, "_score", genres, rating, size=rrf_candidates, k=rrf_candidates)
+        with metrics.stage("msearch"):
+            response = get_opensearch_client().msearch(
+                body = [{"index": index}, query_kw, {"index": index}, query_knn],
+                params = search_params(msearch=True)
+            )
+        response_kw, response_knn = response['responses']
+        trace.took("keyword", response_kw.get('took'))
+        trace.took("knn", response_knn.get('took'))
+        with metrics.stage("fusion"):
+            return fuse_movies(response_kw, response_knn, sort_type, size=size)
@@ -0,0 +1,192 @@
+"""Asyncio variant of utils.bedrockopensearch
+
+The lexical search does not need the query embedding, so query_movies_page starts it
+immediately and runs it alongside the embed-then-kNN chain. Page latency becomes
+roughly max(embed + kNN, keyword) instead of their sum. All sessions of a Streamlit
+worker share one background event loop, so concurrent searches don't block each other.
+
+The pages use this path when AOSS_ASYNC_QUERIES is on (default off). It builds the
+same queries and returns the same results and cursors as bedrockopensearch; with
+AOSS_SEARCH_BACKEND=local there is nothing to overlap and the calls are passed to
+bedrockopensearch unchanged. Stage timings are measured on the event loop and
+recorded in the caller's metrics trace; the kNN and keyword stages overlap, so
+they can add up to more than the trace total.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+module_path = "./"
+sys.path.append(os.path.abspath(module_path))
+from utils import bedrockopensearch
+from utils import clients
+from utils import metrics
+from utils import query_builder
+from utils.bedrockopensearch import (
+    build_movies_knn_query,
+    build_movies_kw_query,
+    build_qna_query,
+    extract_movies,
+    movie_search_params,
+    search_params,
+    QNA_FILTER_PATH,
+)
+
+host = os.environ.get('AOSS_VECTORSEARCH_ENDPOINT')
+region = os.environ.get('AOSS_VECTORSEARCH_REGION')
+
+# Route the pages' movie and Q&A searches through this module
+async_queries = os.environ.get('AOSS_ASYNC_QUERIES', 'off').lower() in ('1', 'on', 'true', 'yes')
+
+# aiohttp sessions are bound to the event loop that created them, so keep one client per loop
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_async_client():
+    """Return the AsyncOpenSearch client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = clients.create_async_opensearch_client(host=host, region=region)
+            _clients[loop] = client
+    return client
+
+async def close_async_client():
+    """Close the client bound to the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _clients.pop(loop, None)
+    if client is not None:
+        await client.close()
+
+async def timed(timings, name, awaitable):
+    """Await awaitable, adding its wall time to timings[name] (seconds)"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+async def embed_query(query):
+    """Embed a query without blocking the event loop (boto3 runs in the default executor)"""
+    return await asyncio.to_thread(bedrockopensearch.embed_query, query)
+
+async def query_qna(query, index, size=3, timings=None):
+    timings = {} if timings is None else timings
+    client = get_async_client()
+    query_embedding = await timed(timings, "embedding", embed_query(query))
+    return await timed(timings, "knn_search", client.search(
+        body = build_qna_query(query_embedding, size=size),
+        index = index,
+        params = search_params(QNA_FILTER_PATH)
+    ))
+
+async def query_movies_page(query, sort, genres, rating, index, size=3, page=0, search_after=(None, None), timings=None):
+    """bedrockopensearch.query_movies_page with the keyword search overlapping the query embedding
+
+    Returns (results_knn, doc_count_knn, results_kw, doc_count_kw, (cursor_knn,
+    cursor_kw), took) where took maps "knn" / "keyword" to the took of each search.
+    """
+    timings = {} if timings is None else timings
+    sort_type, genres, rating = movie_search_params(sort, genres, rating)
+    cursor_knn, cursor_kw = search_after
+    client = get_async_client()
+
+    async def no_page():
+        return None
+
+    # Start the keyword search right away, it doesn't need the embedding
+    if page == 0 or cursor_kw is not None:
+        kw_search = asyncio.ensure_future(timed(timings, "keyword_search", client.search(
+            body = build_movies_kw_query(query, sort_type, genres, rating, size=size, search_after=cursor_kw),
+            index = index,
+            params = search_params()
+        )))
+    else:
+        kw_search = asyncio.ensure_future(no_page())
+
+    async def knn_search():
+        if page > 0 and cursor_knn is None:
+            return None
+        query_embedding = await timed(timings, "embedding", embed_query(query))
+        return await timed(timings, "knn_search", client.search(
+            body = build_movies_knn_query(query_embedding, sort_type, genres, rating, size=size, search_after=cursor_knn),
+            index = index,
+            params = search_params()
+        ))
+
+    try:
+        responses = await asyncio.gather(knn_search(), kw_search)
+    except BaseException:
+        kw_search.cancel()
+        raise
+
+    pages, took = [], {}
+    for name, response in zip(("knn", "keyword"), responses):
+        if response is None:
+            pages.append(([], None, None))
+            continue
+        took[name] = response.get('took')
+        results, doc_count = extract_movies(response)
+        pages.append((results, doc_count, query_builder.next_search_after(response, size)))
+
+    (results_knn, doc_count_knn, next_knn), (results_kw, doc_count_kw, next_kw) = pages
+    return results_knn, doc_count_knn, results_kw, doc_count_kw, (next_knn, next_kw), took
+
+# - Synchronous entry points for Streamlit pages
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def _background_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="opensearch-async", daemon=True).start()
+    return _loop
+
+def run(coroutine, timeout=None):
+    """Run a coroutine on the shared background loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coroutine, _background_loop()).result(timeout)
+
+def _record(timings):
+    # Traces are per thread, so stages timed on the loop are recorded from the caller's thread
+    for name, seconds in timings.items():
+        metrics.record(name, seconds)
+
+def query_movies_page_sync(query, sort, genres, rating, index, size=3, page=0, search_after=(None, None)):
+    """Drop-in replacement for bedrockopensearch.query_movies_page backed by the async path"""
+    if bedrockopensearch.search_backend == 'local':
+        return bedrockopensearch.query_movies_page(query, sort, genres, rating, index, size=size, page=page,
+                                                   search_after=search_after)
+    timings = {}
+    with metrics.trace("query_movies", index=index, sort=sort, backend="opensearch_async", page=page) as trace:
+        try:
+            *results, took = run(query_movies_page(query, sort, genres, rating, index, size=size, page=page,
+                                                   search_after=search_after, timings=timings))
+        finally:
+            _record(timings)
+        for name, took_ms in took.items():
+            trace.took(name, took_ms)
+    return tuple(results)
+
+def query_movies_sync(query, sort, genres, rating, index, size=3):
+    """Drop-in replacement for bedrockopensearch.query_movies backed by the async path"""
+    return query_movies_page_sync(query, sort, genres, rating, index, size=size)[:4]
+
+def query_qna_sync(query, index, size=3):
+    """Drop-in replacement for bedrockopensearch.query_qna backed by the async path"""
+    if bedrockopensearch.search_backend == 'local':
+        return bedrockopensearch.query_qna(query, index, size=size)
+    timings = {}
+    with metrics.trace("query_qna", index=index, backend="opensearch_async") as trace:
+        try:
+            response = run(query_qna(query, index, size=size, timings=timings))
+        finally:
+            _record(timings)
+        trace.took("knn", response.get('took'))
+    return response
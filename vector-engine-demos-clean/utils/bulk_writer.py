@@ -0,0 +1,239 @@
+"""Size-aware, parallel OpenSearch bulk writer with per-item error handling
+
+Documents are added as pre-rendered NDJSON (action line + source line) and grouped
+into batches bounded by document count and payload bytes. Several batches are sent
+concurrently. Items rejected with 429/503 (or whole requests throttled) are retried
+with jittered exponential backoff while the batch size is halved, and the retried
+documents are resent in batches of the reduced size; other item-level failures are reported through on_failed so no document is dropped silently.
+"""
+# Python Built-Ins:
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+# External Dependencies:
+from opensearchpy.exceptions import ConnectionError as OpenSearchConnectionError
+
+RETRYABLE_STATUS = (429, 502, 503, 504)
+
+
+class BulkWriter:
+    """Batch NDJSON documents into bulk requests and send them with bounded parallelism
+
+    Parameters
+    ----------
+    client :
+        opensearchpy client used for the bulk calls.
+    max_docs :
+        Upper bound on documents per bulk request.
+    max_bytes :
+        Upper bound on the payload size of a bulk request.
+    max_in_flight :
+        Number of bulk requests sent concurrently. add() blocks once this many
+        batches are outstanding, which applies backpressure to the producer.
+    max_retries :
+        Attempts per document before it is reported as failed.
+    min_docs :
+        Lower bound for max_docs when the writer shrinks batches after throttling.
+    on_committed :
+        Optional callback receiving the list of metas of successfully indexed documents.
+    on_failed :
+        Optional callback receiving (payload, meta, error) for every document that
+        could not be indexed.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_docs: int = 500,
+        max_bytes: int = 5 * 1024 * 1024,
+        max_in_flight: int = 4,
+        max_retries: int = 8,
+        min_docs: int = 10,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 30.0,
+        on_committed: Optional[Callable[[List[Any]], None]] = None,
+        on_failed: Optional[Callable[[str, Any, str], None]] = None,
+    ):
+        self.client = client
+        self.max_docs_limit = max_docs
+        self.max_bytes_limit = max_bytes
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self.min_docs = min(min_docs, max_docs)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.on_committed = on_committed
+        self.on_failed = on_failed
+
+        self.requests = 0
+        self.committed = 0
+        self.failed = 0
+        self.retried = 0
+        self.throttled = 0
+        self.bytes_sent = 0
+
+        self._batch = []
+        self._batch_bytes = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="bulk")
+        self._futures = []
+
+    # - Producer side
+
+    def add(self, payload: str, meta: Any = None):
+        """Queue one document's NDJSON lines, sending a bulk request when the batch is full"""
+        # json.dumps escapes non-ASCII by default, so characters equal bytes here
+        size = len(payload)
+        if self._batch and (len(self._batch) >= self.max_docs or self._batch_bytes + size > self.max_bytes):
+            self.flush()
+        self._batch.append((payload, meta))
+        self._batch_bytes += size
+
+    def flush(self):
+        """Send the current batch without waiting for it to complete"""
+        if not self._batch:
+            return
+        batch, self._batch, self._batch_bytes = self._batch, [], 0
+        self._slots.acquire()
+        future = self._executor.submit(self._send, batch)
+        future.add_done_callback(lambda _: self._slots.release())
+        # Surface errors of completed requests instead of dropping them with their futures
+        for done in [f for f in self._futures if f.done()]:
+            done.result()
+        self._futures = [f for f in self._futures if not f.done()]
+        self._futures.append(future)
+
+    def close(self) -> dict:
+        """Flush, wait for every outstanding request and return the writer statistics"""
+        self.flush()
+        for future in self._futures:
+            future.result()
+        self._executor.shutdown(wait=True)
+        return self.stats()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "committed": self.committed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "throttled": self.throttled,
+            "bytes_sent": self.bytes_sent,
+            "max_docs": self.max_docs,
+            "max_bytes": self.max_bytes,
+        }
+
+    # - Sending
+
+    def _send(self, batch):
+        pending = [(batch, 0)]
+        while pending:
+            batch, attempt = pending.pop(0)
+            body = "".join(payload for payload, _ in batch)
+            with self._lock:
+                self.requests += 1
+                self.bytes_sent += len(body)
+            try:
+                response = self.client.bulk(body=body)
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                if status in RETRYABLE_STATUS or isinstance(e, OpenSearchConnectionError):
+                    if status in (429, 503):
+                        self._throttled()
+                    retry, failures = batch, []
+                else:
+                    retry, failures = [], [(payload, meta, str(e)) for payload, meta in batch]
+            else:
+                retry, failures, committed = self._parse_response(batch, response)
+                self._committed(committed)
+                if not retry:
+                    self._grow()
+
+            attempt += 1
+            if retry and attempt >= self.max_retries:
+                failures.extend((payload, meta, "retries exhausted") for payload, meta in retry)
+                retry = []
+            self._failed(failures)
+
+            if retry:
+                with self._lock:
+                    self.retried += len(retry)
+                # Full jitter: sleep a random time up to the exponential backoff cap
+                time.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt))))
+                pending.insert(0, (retry, attempt))
+            # Throttling shrinks the limits: cut what is left to the reduced size instead of resending it as is
+            pending = [(chunk, tries) for docs, tries in pending for chunk in self._split(docs)]
+
+    def _split(self, batch):
+        """Cut batch into chunks within the current max_docs and max_bytes"""
+        with self._lock:
+            max_docs, max_bytes = self.max_docs, self.max_bytes
+        chunks, chunk, chunk_bytes = [], [], 0
+        for payload, meta in batch:
+            if chunk and (len(chunk) >= max_docs or chunk_bytes + len(payload) > max_bytes):
+                chunks.append(chunk)
+                chunk, chunk_bytes = [], 0
+            chunk.append((payload, meta))
+            chunk_bytes += len(payload)
+        chunks.append(chunk)
+        return chunks
+
+    def _parse_response(self, batch, response):
+        if not response.get("errors"):
+            return [], [], [meta for _, meta in batch]
+        retry, failures, committed = [], [], []
+        throttled = False
+        for (payload, meta), item in zip(batch, response["items"]):
+            result = next(iter(item.values()))
+            status = result.get("status", 500)
+            if status < 300:
+                committed.append(meta)
+            elif status in RETRYABLE_STATUS:
+                throttled = throttled or status in (429, 503)
+                retry.append((payload, meta))
+            else:
+                failures.append((payload, meta, str(result.get("error"))))
+        if throttled:
+            self._throttled()
+        return retry, failures, committed
+
+    def _committed(self, metas):
+        if not metas:
+            return
+        with self._lock:
+            self.committed += len(metas)
+        if self.on_committed:
+            self.on_committed(metas)
+
+    def _failed(self, failures):
+        if not failures:
+            return
+        with self._lock:
+            self.failed += len(failures)
+        for payload, meta, error in failures:
+            if self.on_failed:
+                self.on_failed(payload, meta, error)
+            else:
+                print(f"Failed to index document: {error}")
+
+    # - Adaptive batch size
+
+    def _throttled(self):
+        """Halve the batch limits after the cluster pushed back"""
+        with self._lock:
+            self.throttled += 1
+            self.max_docs = max(self.min_docs, self.max_docs // 2)
+            self.max_bytes = max(64 * 1024, self.max_bytes // 2)
+
+    def _grow(self):
+        """Recover batch limits additively after a clean request"""
+        with self._lock:
+            if self.max_docs < self.max_docs_limit:
+                self.max_docs = min(self.max_docs_limit, self.max_docs + max(1, self.max_docs_limit // 10))
+            if self.max_bytes < self.max_bytes_limit:
+                self.max_bytes = min(self.max_bytes_limit, self.max_bytes + self.max_bytes_limit // 10)
@@ -0,0 +1,110 @@
+"""Ingestion checkpoints recording how far into the input file every document is committed
+
+Documents are tracked by the byte offset where their line ends, in file order. Bulk
+requests complete out of order, so the checkpoint only advances to the highest offset
+below which every tracked document has been committed (or recorded as failed).
+Documents are tracked as soon as they are parsed, before they are embedded, so a
+document lost on the way to the bulk writer holds the checkpoint back instead of
+being skipped. Resuming from it never skips an uncommitted document; documents past
+it may be sent again, which is harmless because document IDs are deterministic.
+"""
+# Python Built-Ins:
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class Checkpoint:
+    """Low-watermark of committed input offsets, persisted atomically to a JSON file
+
+    Parameters
+    ----------
+    path :
+        Location of the checkpoint file.
+    input_path :
+        Input file the offsets refer to. A checkpoint written for another file,
+        a file of different size, or another index is ignored.
+    index_name :
+        Target index of the load.
+    save_interval :
+        Minimum seconds between checkpoint writes while the load is running.
+    """
+
+    def __init__(self, path: str, input_path: str, index_name: str, save_interval: float = 5.0):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+        self.input_size = os.path.getsize(input_path)
+        self.index_name = index_name
+        self.save_interval = save_interval
+        self.offset = 0
+        self.documents = 0
+        self._pending = deque()
+        self._done = set()
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    def load(self) -> int:
+        """Read the checkpoint file and return the offset to resume from (0 if none applies)"""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except ValueError as e:
+            print(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return 0
+        if (state.get("input_path"), state.get("input_size"), state.get("index")) != (self.input_path, self.input_size, self.index_name):
+            print(f"Ignoring checkpoint {self.path}: it was written for a different input file or index")
+            return 0
+        self.offset = state.get("offset", 0)
+        self.documents = state.get("documents", 0)
+        return self.offset
+
+    def track(self, offset: int):
+        """Register a document, in file order, before it is embedded and sent"""
+        with self._lock:
+            self._pending.append(offset)
+
+    def commit(self, offsets):
+        """Mark documents as committed and advance the watermark"""
+        with self._lock:
+            self._done.update(offsets)
+            while self._pending and self._pending[0] in self._done:
+                offset = self._pending.popleft()
+                self._done.discard(offset)
+                self.offset = offset
+                self.documents += 1
+            due = time.monotonic() - self._last_save >= self.save_interval
+        if due:
+            self.save()
+
+    @property
+    def outstanding(self) -> int:
+        """Tracked documents neither committed nor recorded as failed"""
+        with self._lock:
+            # Committed documents behind an outstanding one are still queued, marked done
+            return len(self._pending) - len(self._done)
+
+    def save(self, complete: bool = False):
+        """Atomically write the current watermark
+
+        complete is only recorded when no tracked document is outstanding.
+        """
+        with self._lock:
+            complete = complete and not self._pending
+            state = {
+                "input_path": self.input_path,
+                "input_size": self.input_size,
+                "index": self.index_name,
+                "offset": self.offset,
+                "documents": self.documents,
+                "complete": complete,
+                "updated": time.time(),
+            }
+            self._last_save = time.monotonic()
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
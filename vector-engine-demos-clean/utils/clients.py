@@ -0,0 +1,202 @@
+"""Shared factory for the OpenSearch Serverless and Bedrock clients
+
+Every module used to build its own OpenSearch client with static credentials captured
+at import time and the default pool of 10 connections. Clients built here:
+
+- sign each request with SigV4 from the session's credential provider, so
+  temporary credentials (assumed roles, SSO, instance profiles) are refreshed
+  before they expire instead of failing long-lived workers;
+- keep a connection pool sized for the expected concurrency, block for a free
+  connection instead of opening and discarding extra ones, and enable TCP
+  keep-alive so idle pooled connections survive NAT/load-balancer timeouts;
+- use separate connect and read timeouts, and optionally gzip request bodies.
+
+Settings (AOSS_* environment variables):
+
+    AOSS_VECTORSEARCH_ENDPOINT / AOSS_VECTORSEARCH_REGION   collection host and region
+    AOSS_HTTP_POOL_MAXSIZE      connections kept per host (default 32)
+    AOSS_HTTP_CONNECT_TIMEOUT   seconds to establish a connection (default 5)
+    AOSS_HTTP_TIMEOUT           read timeout of interactive searches (default 30)
+    AOSS_HTTP_KEEPALIVE         TCP keep-alive idle seconds, 0 disables (default 60)
+    AOSS_HTTP_COMPRESS          gzip request bodies (default off)
+    AOSS_BEDROCK_POOL_MAXSIZE   Bedrock runtime connections (default 32)
+    AOSS_BEDROCK_TIMEOUT        Bedrock read timeout (default 60)
+"""
+# Python Built-Ins:
+import os
+import socket
+import threading
+from typing import Optional
+
+# External Dependencies:
+import boto3
+import requests
+from botocore.config import Config
+from botocore.credentials import AssumeRoleCredentialFetcher, DeferredRefreshableCredentials
+from botocore.session import get_session
+from opensearchpy import OpenSearch, RequestsAWSV4SignerAuth, RequestsHttpConnection
+from urllib3.connection import HTTPConnection
+
+SERVICE = "aoss"
+
+POOL_MAXSIZE = int(os.environ.get("AOSS_HTTP_POOL_MAXSIZE", "32"))
+CONNECT_TIMEOUT = float(os.environ.get("AOSS_HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("AOSS_HTTP_TIMEOUT", "30"))
+KEEPALIVE_IDLE = int(os.environ.get("AOSS_HTTP_KEEPALIVE", "60"))
+HTTP_COMPRESS = os.environ.get("AOSS_HTTP_COMPRESS", "off").lower() in ("1", "on", "true", "yes")
+BEDROCK_POOL_MAXSIZE = int(os.environ.get("AOSS_BEDROCK_POOL_MAXSIZE", "32"))
+BEDROCK_TIMEOUT = float(os.environ.get("AOSS_BEDROCK_TIMEOUT", "60"))
+
+
+def keepalive_socket_options(idle: int = KEEPALIVE_IDLE):
+    """urllib3 socket options enabling TCP keep-alive probes after idle seconds"""
+    options = list(HTTPConnection.default_socket_options)
+    if idle <= 0:
+        return options
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle))
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, idle // 4)))
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 4))
+    return options
+
+
+class _PoolAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter whose pool blocks when exhausted and whose sockets use TCP keep-alive"""
+
+    def __init__(self, pool_maxsize: int, keepalive: int):
+        self._socket_options = keepalive_socket_options(keepalive)
+        super().__init__(pool_connections=4, pool_maxsize=pool_maxsize, pool_block=True)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = self._socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+class PooledRequestsHttpConnection(RequestsHttpConnection):
+    """RequestsHttpConnection with a blocking, keep-alive connection pool
+
+    Parameters
+    ----------
+    pool_maxsize :
+        Connections kept open per host. Callers beyond this wait for a free
+        connection rather than opening one that is closed again after the request.
+    keepalive :
+        TCP keep-alive idle time in seconds; 0 leaves the OS default.
+    """
+
+    def __init__(self, *args, pool_maxsize: Optional[int] = None, keepalive: int = KEEPALIVE_IDLE, **kwargs):
+        super().__init__(*args, **kwargs)
+        adapter = _PoolAdapter(pool_maxsize or POOL_MAXSIZE, keepalive)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+
+def aws_session(assumed_role: Optional[str] = None, region: Optional[str] = None,
+                profile_name: Optional[str] = None) -> boto3.Session:
+    """boto3 session whose credentials refresh themselves, including for an assumed role"""
+    session = boto3.Session(region_name=region, profile_name=profile_name)
+    if not assumed_role:
+        return session
+    fetcher = AssumeRoleCredentialFetcher(
+        client_creator=session._session.create_client,
+        source_credentials=session.get_credentials(),
+        role_arn=str(assumed_role),
+        extra_args={"RoleSessionName": "aoss-vector-demo"},
+    )
+    botocore_session = get_session()
+    botocore_session._credentials = DeferredRefreshableCredentials(
+        method="assume-role", refresh_using=fetcher.fetch_credentials
+    )
+    return boto3.Session(botocore_session=botocore_session, region_name=region)
+
+
+def create_opensearch_client(
+    host: Optional[str] = None,
+    region: Optional[str] = None,
+    timeout: float = READ_TIMEOUT,
+    pool_maxsize: int = POOL_MAXSIZE,
+    http_compress: bool = HTTP_COMPRESS,
+    session: Optional[boto3.Session] = None,
+    port: int = 443,
+) -> OpenSearch:
+    """New SigV4-signed OpenSearch Serverless client
+
+    Parameters
+    ----------
+    timeout :
+        Default read timeout in seconds; individual calls can still pass request_timeout.
+    pool_maxsize :
+        Connection pool size; should cover the number of threads sharing the client.
+    http_compress :
+        gzip request bodies (bulk and kNN payloads compress well).
+    session :
+        boto3 session providing the credentials, by default aws_session().
+    """
+    host = host or os.environ.get("AOSS_VECTORSEARCH_ENDPOINT")
+    region = region or os.environ.get("AOSS_VECTORSEARCH_REGION")
+    credentials = (session or aws_session(region=region)).get_credentials()
+    return OpenSearch(
+        hosts = [{'host': host, 'port': port}],
+        http_auth = RequestsAWSV4SignerAuth(credentials, region, SERVICE),
+        timeout = (CONNECT_TIMEOUT, timeout),
+        use_ssl = True,
+        verify_certs = True,
+        http_compress = http_compress,
+        pool_maxsize = pool_maxsize,
+        connection_class = PooledRequestsHttpConnection
+    )
+
+
+def create_async_opensearch_client(host: Optional[str] = None, region: Optional[str] = None,
+                                   timeout: float = READ_TIMEOUT, pool_maxsize: int = POOL_MAXSIZE):
+    """AsyncOpenSearch counterpart of create_opensearch_client, bound to the running event loop"""
+    from opensearchpy import AsyncHttpConnection, AsyncOpenSearch, AWSV4SignerAsyncAuth
+
+    host = host or os.environ.get("AOSS_VECTORSEARCH_ENDPOINT")
+    region = region or os.environ.get("AOSS_VECTORSEARCH_REGION")
+    credentials = aws_session(region=region).get_credentials()
+    return AsyncOpenSearch(
+        hosts = [{'host': host, 'port': 443}],
+        http_auth = AWSV4SignerAsyncAuth(credentials, region, SERVICE),
+        timeout = timeout,
+        use_ssl = True,
+        verify_certs = True,
+        http_compress = HTTP_COMPRESS,
+        maxsize = pool_maxsize,
+        connection_class = AsyncHttpConnection
+    )
+
+
+def bedrock_config(region: Optional[str] = None, max_pool_connections: int = BEDROCK_POOL_MAXSIZE) -> Config:
+    """botocore Config for Bedrock runtime clients: pooled, keep-alive, standard retries"""
+    return Config(
+        region_name=region,
+        max_pool_connections=max_pool_connections,
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=BEDROCK_TIMEOUT,
+        tcp_keepalive=KEEPALIVE_IDLE > 0,
+        retries={"max_attempts": 10, "mode": "standard"},
+    )
+
+
+def create_bedrock_runtime(region: Optional[str] = None, max_pool_connections: int = BEDROCK_POOL_MAXSIZE,
+                           session: Optional[boto3.Session] = None):
+    """New bedrock-runtime client with refreshable credentials"""
+    region = region or os.environ.get("AOSS_VECTORSEARCH_REGION")
+    session = session or aws_session(region=region)
+    return session.client("bedrock-runtime", config=bedrock_config(region, max_pool_connections))
+
+
+_opensearch_client = None
+_opensearch_lock = threading.Lock()
+
+
+def get_opensearch_client() -> OpenSearch:
+    """Process-wide OpenSearch client shared by the query modules"""
+    global _opensearch_client
+    if _opensearch_client is None:
+        with _opensearch_lock:
+            if _opensearch_client is None:
+                _opensearch_client = create_opensearch_client()
+    return _opensearch_client
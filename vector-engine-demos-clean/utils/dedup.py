@@ -0,0 +1,113 @@
+"""Run-wide deduplication of texts before they are embedded
+
+Texts are normalized (Unicode NFKC, whitespace collapsed) and hashed. Within a
+batch every distinct text is embedded once; across the run, recently embedded
+vectors are kept in a bounded LRU map, and a text that another batch is currently
+embedding is waited for instead of being sent again. Empty and placeholder texts
+(e.g. "Add a Plot") are not embedded at all.
+"""
+# Python Built-Ins:
+import array
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Placeholder values found in scraped movie data, compared case-insensitively
+PLACEHOLDER_TEXTS = frozenset({"add a plot", "add a plot »", "plot unknown", "plot unknown.", "n/a", "tba"})
+
+
+def normalize_text(text) -> str:
+    """Canonical form used both as the dedup key and as the text sent to the model"""
+    return WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", str(text))).strip()
+
+
+class TextDeduplicator:
+    """Map texts to embeddings, calling the embedding backend once per distinct text
+
+    Parameters
+    ----------
+    max_entries :
+        Vectors remembered across batches (float32, least recently used dropped first).
+    placeholders :
+        Lower-cased texts treated as empty.
+    """
+
+    def __init__(self, max_entries: int = 10000, placeholders=PLACEHOLDER_TEXTS):
+        self.max_entries = max_entries
+        self.placeholders = placeholders
+        self.texts = 0
+        self.skipped = 0
+        self.embedded = 0
+        self._vectors = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.sha1(text.encode("utf-8")).digest()
+
+    def is_empty(self, normalized: str) -> bool:
+        return not normalized or normalized.lower() in self.placeholders
+
+    def embed_many(self, texts: List[str], embed_many: Callable[[List[str]], List[List[float]]]) -> List[Optional[List[float]]]:
+        """Embeddings for texts in order; None for empty or placeholder texts"""
+        normalized = [normalize_text(text) for text in texts]
+        keys = [None if self.is_empty(text) else self._key(text) for text in normalized]
+
+        claimed, waiting, found = {}, {}, {}
+        with self._lock:
+            self.texts += len(texts)
+            self.skipped += sum(1 for key in keys if key is None)
+            for key, text in zip(keys, normalized):
+                if key is None or key in found or key in claimed or key in waiting:
+                    continue
+                vector = self._vectors.get(key)
+                if vector is not None:
+                    self._vectors.move_to_end(key)
+                    found[key] = vector
+                elif key in self._inflight:
+                    waiting[key] = self._inflight[key]
+                else:
+                    claimed[key] = text
+                    self._inflight[key] = Future()
+
+        if claimed:
+            try:
+                vectors = embed_many(list(claimed.values()))
+            except Exception as e:
+                with self._lock:
+                    for key in claimed:
+                        self._inflight.pop(key).set_exception(e)
+                raise
+            with self._lock:
+                self.embedded += len(claimed)
+                for key, vector in zip(claimed, vectors):
+                    stored = array.array("f", vector)
+                    self._vectors[key] = stored
+                    self._inflight.pop(key).set_result(stored)
+                    found[key] = stored
+                while len(self._vectors) > self.max_entries:
+                    self._vectors.popitem(last=False)
+
+        for key, future in waiting.items():
+            found[key] = future.result()
+        return [None if key is None else found[key].tolist() for key in keys]
+
+    def stats(self) -> dict:
+        """Texts seen, embedded and skipped, the dedup ratio and backend calls saved"""
+        with self._lock:
+            candidates = self.texts - self.skipped
+            return {
+                "texts": self.texts,
+                "skipped_empty": self.skipped,
+                "embedded": self.embedded,
+                "duplicates": candidates - self.embedded,
+                "dedup_ratio": (candidates - self.embedded) / candidates if candidates else 0.0,
+                "calls_saved": self.texts - self.embedded,
+            }
@@ -0,0 +1,293 @@
+"""Persistent, content-addressed cache of text embeddings
+
+Vectors are stored as float32 in one memory-mapped file per dimension and looked up
+through a small SQLite index keyed by (model id, SHA-256 of the text). The cache is
+shared by the indexer and the Streamlit workers: reads take a shared file lock and
+writes an exclusive one, so a slot is never read while another process evicts it.
+"""
+# Python Built-Ins:
+import array
+import fcntl
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "AOSS_EMBEDDING_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "aoss-embeddings")
+)
+DEFAULT_MAX_ENTRIES = int(os.environ.get("AOSS_EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+CACHE_ENABLED = os.environ.get("AOSS_EMBEDDING_CACHE", "on").lower() not in ("0", "off", "false", "no")
+
+# Only rewrite an entry's last-used time when it is older than this (seconds),
+# so hot entries don't turn every read into a write
+TOUCH_INTERVAL = 60.0
+
+
+class EmbeddingCache:
+    """On-disk embedding store with a per-dimension entry cap and LRU eviction
+
+    Parameters
+    ----------
+    cache_dir :
+        Directory holding the SQLite index, the vector files and the lock file.
+    max_entries :
+        Maximum number of vectors kept per dimension. The least recently used entry
+        is overwritten once the cap is reached. The capacity of an existing vector
+        file is fixed when it is first created.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._pending = {"hits": 0, "misses": 0}
+        self._lock = threading.RLock()
+        self._pid = None
+        os.makedirs(cache_dir, exist_ok=True)
+        self._open()
+
+    # - Setup
+
+    def _open(self):
+        self._pid = os.getpid()
+        self._lock_file = open(os.path.join(self.cache_dir, "lock"), "a+b")
+        self._db = sqlite3.connect(
+            os.path.join(self.cache_dir, "index.sqlite"),
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._file_lock(fcntl.LOCK_EX):
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key BLOB PRIMARY KEY, dim INTEGER, slot INTEGER, crc INTEGER, last_used REAL
+                ) WITHOUT ROWID;
+                CREATE UNIQUE INDEX IF NOT EXISTS entries_slot ON entries(dim, slot);
+                CREATE INDEX IF NOT EXISTS entries_lru ON entries(dim, last_used);
+                CREATE TABLE IF NOT EXISTS files (dim INTEGER PRIMARY KEY, capacity INTEGER);
+                CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER);
+            """)
+        self._maps = {}
+
+    def _ensure_process(self):
+        # Connections, maps and locks must not be shared with a forked child
+        if self._pid != os.getpid():
+            self._open()
+
+    @contextmanager
+    def _file_lock(self, mode):
+        fcntl.flock(self._lock_file.fileno(), mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _vector_file(self, dim):
+        """Return (mmap, capacity) for the vector file of the given dimension"""
+        if dim in self._maps:
+            return self._maps[dim]
+        row = self._db.execute("SELECT capacity FROM files WHERE dim = ?", (dim,)).fetchone()
+        if row is None:
+            capacity = self.max_entries
+            self._db.execute("INSERT INTO files (dim, capacity) VALUES (?, ?)", (dim, capacity))
+        else:
+            capacity = row[0]
+        path = os.path.join(self.cache_dir, f"vectors-{dim}.f32")
+        size = capacity * dim * 4
+        with open(path, "a+b") as f:
+            if os.fstat(f.fileno()).st_size < size:
+                f.truncate(size)
+            mm = mmap.mmap(f.fileno(), size)
+        self._maps[dim] = (mm, capacity)
+        return self._maps[dim]
+
+    @staticmethod
+    def _key(model_id: str, text: str) -> bytes:
+        return hashlib.sha256(model_id.encode("utf-8") + b"\0" + text.encode("utf-8")).digest()
+
+    # - Public API
+
+    def get(self, model_id: str, text: str) -> Optional[List[float]]:
+        """Return the cached embedding for text under model_id, or None"""
+        key = self._key(model_id, text)
+        with self._lock:
+            self._ensure_process()
+            with self._file_lock(fcntl.LOCK_SH):
+                row = self._db.execute(
+                    "SELECT dim, slot, crc, last_used FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                vector = None
+                if row is not None:
+                    dim, slot, crc, last_used = row
+                    mm, _ = self._vector_file(dim)
+                    data = mm[slot * dim * 4:(slot + 1) * dim * 4]
+                    if zlib.crc32(data) == crc:
+                        vector = array.array("f")
+                        vector.frombytes(data)
+                        now = time.time()
+                        if now - last_used > TOUCH_INTERVAL:
+                            self._db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+            if vector is None:
+                self.misses += 1
+                self._pending["misses"] += 1
+                return None
+            self.hits += 1
+            self._pending["hits"] += 1
+            return vector.tolist()
+
+    def get_many(self, model_id: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return cached embeddings for texts, None where missing"""
+        return [self.get(model_id, text) for text in texts]
+
+    def put(self, model_id: str, text: str, vector: List[float]):
+        """Store an embedding, evicting the least recently used entry if the cap is reached"""
+        self.put_many(model_id, [(text, vector)])
+
+    def put_many(self, model_id: str, items: List[Tuple[str, List[float]]]):
+        """Store several (text, embedding) pairs in one transaction"""
+        if not items:
+            return
+        with self._lock:
+            self._ensure_process()
+            with self._file_lock(fcntl.LOCK_EX):
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    for text, vector in items:
+                        self._store(self._key(model_id, text), vector)
+                    self._flush_counters()
+                    self._db.execute("COMMIT")
+                except Exception:
+                    self._db.execute("ROLLBACK")
+                    raise
+            self.stores += len(items)
+
+    def _store(self, key: bytes, vector: List[float]):
+        data = array.array("f", vector).tobytes()
+        dim = len(vector)
+        mm, capacity = self._vector_file(dim)
+        row = self._db.execute("SELECT slot FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            slot = row[0]
+        else:
+            count = self._db.execute("SELECT COUNT(*) FROM entries WHERE dim = ?", (dim,)).fetchone()[0]
+            if count < capacity:
+                slot = count
+            else:
+                victim, slot = self._db.execute(
+                    "SELECT key, slot FROM entries WHERE dim = ? ORDER BY last_used LIMIT 1", (dim,)
+                ).fetchone()
+                self._db.execute("DELETE FROM entries WHERE key = ?", (victim,))
+                self.evictions += 1
+        mm[slot * dim * 4:(slot + 1) * dim * 4] = data
+        self._db.execute(
+            "INSERT OR REPLACE INTO entries (key, dim, slot, crc, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, dim, slot, zlib.crc32(data), time.time())
+        )
+
+    def get_or_compute(self, model_id: str, text: str, compute: Callable[[str], List[float]]) -> List[float]:
+        """Return the cached embedding, calling compute(text) and storing the result on a miss"""
+        try:
+            vector = self.get(model_id, text)
+        except Exception as e:
+            print(f"Embedding cache read failed: {e}")
+            vector = None
+        if vector is not None:
+            return vector
+        vector = compute(text)
+        try:
+            self.put(model_id, text, vector)
+        except Exception as e:
+            print(f"Embedding cache write failed: {e}")
+        return vector
+
+    def _flush_counters(self):
+        for name, delta in self._pending.items():
+            if delta:
+                self._db.execute(
+                    "INSERT INTO counters (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    (name, delta)
+                )
+        self._pending = {"hits": 0, "misses": 0}
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process plus totals shared by all processes"""
+        with self._lock:
+            self._ensure_process()
+            with self._file_lock(fcntl.LOCK_EX):
+                self._flush_counters()
+                shared = dict(self._db.execute("SELECT name, value FROM counters").fetchall())
+                entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "entries": entries,
+            "shared_hits": shared.get("hits", 0),
+            "shared_misses": shared.get("misses", 0),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide embedding cache, or None when it is disabled or unavailable"""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = EmbeddingCache()
+                except Exception as e:
+                    print(f"Embedding cache disabled: {e}")
+                    _cache = False
+    return _cache or None
+
+
+def cached_embedding(model_id: str, text: str, compute: Callable[[str], List[float]]) -> List[float]:
+    """Read an embedding through the shared cache, falling back to compute(text)"""
+    cache = get_cache()
+    if cache is None:
+        return compute(text)
+    return cache.get_or_compute(model_id, text, compute)
+
+
+def cached_embeddings(model_id: str, texts: List[str],
+                      compute_many: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+    """Batch variant of cached_embedding: compute_many is called once with the distinct missing texts"""
+    cache = get_cache()
+    found = [None] * len(texts)
+    if cache is not None:
+        try:
+            found = cache.get_many(model_id, texts)
+        except Exception as e:
+            print(f"Embedding cache read failed: {e}")
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, found) if vector is None))
+    if missing:
+        computed = dict(zip(missing, compute_many(missing)))
+        if cache is not None:
+            try:
+                cache.put_many(model_id, list(computed.items()))
+            except Exception as e:
+                print(f"Embedding cache write failed: {e}")
+        found = [vector if vector is not None else computed[text] for text, vector in zip(texts, found)]
+    return found
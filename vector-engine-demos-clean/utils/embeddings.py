@@ -0,0 +1,239 @@
+"""Pluggable text embedding providers with a batch embed_many API
+
+BedrockEmbeddingProvider calls a Titan model; Titan takes one text per request, so
+embed_many fans requests out over a thread pool. LocalEmbeddingProvider runs a
+sentence-transformers model on the host: texts are encoded in batches with PyTorch,
+optionally (opt-in) through ONNX Runtime with a dynamically int8-quantized graph, and
+optionally across a pool of worker processes (one per core) for ingestion. Both read and write the
+shared embedding cache in batches, keyed by the provider's cache_id.
+
+The provider is picked from the configured embedding model (utils.vector_config):
+Titan model ids use Bedrock, anything else is loaded locally. Local settings:
+
+    AOSS_LOCAL_EMBED_BACKEND        torch or onnx (default torch); onnx falls back to torch
+                                    when onnxruntime or optimum is not installed
+    AOSS_LOCAL_EMBED_QUANTIZATION   none, arm64, avx2, avx512 or avx512_vnni (default none,
+                                    onnx backend only)
+    AOSS_LOCAL_EMBED_BATCH_SIZE     texts per forward pass (default 64)
+    AOSS_LOCAL_EMBED_PROCESSES      worker processes for embed_many, 0 = in-process (default 0)
+    AOSS_LOCAL_MODEL_DIR            where exported/quantized models are kept
+
+Quantized vectors differ slightly from the float model's, so the index and the
+queries must be embedded with the same backend and quantization settings.
+"""
+# Python Built-Ins:
+import importlib.util
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from utils import embedding_cache
+from utils.vector_config import VectorConfig, get_vector_config
+
+LOCAL_BACKEND = os.environ.get("AOSS_LOCAL_EMBED_BACKEND", "torch").lower()
+LOCAL_QUANTIZATION = os.environ.get("AOSS_LOCAL_EMBED_QUANTIZATION", "none").lower()
+LOCAL_BATCH_SIZE = int(os.environ.get("AOSS_LOCAL_EMBED_BATCH_SIZE", "64"))
+LOCAL_PROCESSES = int(os.environ.get("AOSS_LOCAL_EMBED_PROCESSES", "0"))
+LOCAL_MODEL_DIR = os.environ.get(
+    "AOSS_LOCAL_MODEL_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "aoss-models")
+)
+
+QUANTIZATION_CONFIGS = ("arm64", "avx2", "avx512", "avx512_vnni")
+
+# sentence-transformers' onnx backend needs these extras (sentence-transformers[onnx])
+ONNX_PACKAGES = ("onnxruntime", "optimum")
+
+
+def onnx_available() -> bool:
+    return all(importlib.util.find_spec(package) is not None for package in ONNX_PACKAGES)
+
+
+class EmbeddingProvider:
+    """Base class: subclasses implement _embed_batch for texts missing from the cache
+
+    Parameters
+    ----------
+    model_id :
+        Model name, also used in log output.
+    dimension :
+        Length of the returned vectors.
+    cache_id :
+        Key prefix in the embedding cache; must change whenever the vectors would.
+    batch_size :
+        Number of texts callers should pass to embed_many at once for best throughput.
+    """
+
+    def __init__(self, model_id: str, dimension: int, cache_id: str, batch_size: int):
+        self.model_id = model_id
+        self.dimension = dimension
+        self.cache_id = cache_id
+        self.batch_size = batch_size
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings of texts, in order, reading through the shared embedding cache"""
+        if not texts:
+            return []
+        return embedding_cache.cached_embeddings(self.cache_id, list(texts), self._embed_batch)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def close(self):
+        """Release worker threads or processes"""
+
+
+class BedrockEmbeddingProvider(EmbeddingProvider):
+    """Titan embeddings through Bedrock invoke_model
+
+    Parameters
+    ----------
+    config :
+        Model id and dimension to request.
+    invoke :
+        Optional callable text -> embedding. By default a bedrock-runtime client from
+        utils.clients is created on first use.
+    concurrency :
+        Parallel invoke_model calls made by embed_many.
+    """
+
+    def __init__(self, config: VectorConfig, invoke: Optional[Callable[[str], List[float]]] = None,
+                 concurrency: int = 8):
+        super().__init__(config.model_id, config.dimension, config.cache_id, batch_size=concurrency * 4)
+        self.config = config
+        self.concurrency = concurrency
+        self._invoke = invoke
+        self._runtime = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def invoke(self, text: str) -> List[float]:
+        if self._invoke is not None:
+            return self._invoke(text)
+        if self._runtime is None:
+            from utils import clients
+            with self._lock:
+                if self._runtime is None:
+                    self._runtime = clients.create_bedrock_runtime(max_pool_connections=max(10, self.concurrency))
+        response = self._runtime.invoke_model(
+            modelId=self.config.model_id,
+            contentType='application/json',
+            accept='application/json',
+            body=json.dumps(self.config.embedding_request(text))
+        )
+        return json.loads(response['body'].read())['embedding']
+
+    def _embed_batch(self, texts):
+        if len(texts) == 1:
+            return [self.invoke(texts[0])]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bedrock-embed")
+        return list(self._executor.map(self.invoke, texts))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """sentence-transformers model on the local CPU
+
+    Parameters
+    ----------
+    model_name :
+        Hugging Face model id or local path.
+    backend :
+        "torch", or "onnx" to run through ONNX Runtime. Without onnxruntime and
+        optimum installed, onnx falls back to torch with a warning.
+    quantization :
+        With the onnx backend, an ONNX Runtime dynamic int8 quantization config
+        (arm64, avx2, avx512, avx512_vnni) or "none". The quantized graph is exported
+        once into model_dir and reused. Its vectors drift slightly from the float
+        model's, so only use it when the index was embedded the same way.
+    batch_size :
+        Texts per forward pass.
+    processes :
+        Worker processes used by embed_many; 0 encodes in the calling process. Each
+        worker loads its own copy of the model, so use at most one per core.
+    model_dir :
+        Directory for exported ONNX models.
+    """
+
+    def __init__(self, model_name: str, backend: str = LOCAL_BACKEND, quantization: str = LOCAL_QUANTIZATION,
+                 batch_size: int = LOCAL_BATCH_SIZE, processes: int = LOCAL_PROCESSES,
+                 model_dir: str = LOCAL_MODEL_DIR):
+        if backend not in ("torch", "onnx"):
+            raise ValueError(f"Unsupported local embedding backend {backend!r}, expected torch or onnx")
+        if backend == "onnx" and quantization not in QUANTIZATION_CONFIGS + ("none",):
+            raise ValueError(f"Unsupported quantization {quantization!r}, expected one of {QUANTIZATION_CONFIGS} or none")
+        if backend == "onnx" and not onnx_available():
+            print(f"ONNX Runtime backend requested but {' or '.join(ONNX_PACKAGES)} is not installed "
+                  f"(pip install \"sentence-transformers[onnx]\"); embedding {model_name} with torch instead")
+            backend = "torch"
+        quantized = backend == "onnx" and quantization != "none"
+        variant = f"{backend}-int8-{quantization}" if quantized else backend
+        self.model_name = model_name
+        self.backend = backend
+        self.quantization = quantization if quantized else None
+        self.processes = processes
+        self.model_dir = model_dir
+        self.model = self._load()
+        super().__init__(model_name, self.model.get_sentence_embedding_dimension(),
+                         f"{model_name}/{variant}", batch_size=max(batch_size, batch_size * processes))
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+
+        if self.backend == "torch":
+            return SentenceTransformer(self.model_name, device="cpu")
+        if self.quantization is None:
+            return SentenceTransformer(self.model_name, device="cpu", backend="onnx")
+
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        export_dir = os.path.join(self.model_dir, self.model_name.replace("/", "__"))
+        file_name = f"onnx/model_qint8_{self.quantization}.onnx"
+        if not os.path.exists(os.path.join(export_dir, file_name)):
+            print(f"Exporting {self.model_name} to an int8 ONNX graph in {export_dir}")
+            model = SentenceTransformer(self.model_name, device="cpu", backend="onnx")
+            model.save(export_dir)
+            export_dynamic_quantized_onnx_model(model, self.quantization, export_dir)
+        return SentenceTransformer(export_dir, device="cpu", backend="onnx", model_kwargs={"file_name": file_name})
+
+    def _embed_batch(self, texts):
+        # The model and the worker pool are shared, and the pool's queues must not interleave two calls
+        with self._lock:
+            if self.processes > 0:
+                if self._pool is None:
+                    self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+                vectors = self.model.encode_multi_process(
+                    texts, self._pool, batch_size=max(1, self.batch_size // self.processes),
+                    chunk_size=max(1, len(texts) // self.processes)
+                )
+            else:
+                vectors = self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+        return vectors.tolist()
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self.model.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+
+def create_provider(config: Optional[VectorConfig] = None, invoke: Optional[Callable[[str], List[float]]] = None,
+                    concurrency: int = 8) -> EmbeddingProvider:
+    """Provider for the configured embedding model: Bedrock for Titan ids, local otherwise"""
+    config = config or get_vector_config()
+    if config.provider == "bedrock":
+        return BedrockEmbeddingProvider(config, invoke=invoke, concurrency=concurrency)
+    return LocalEmbeddingProvider(config.model_id)
@@ -0,0 +1,24 @@
+"""Client-side rank fusion for combining lexical and vector result lists"""
+# External Dependencies:
+import numpy as np
+
+
+def reciprocal_rank_fusion(rankings, k=60, weights=None):
+    """Fuse ranked lists of document IDs with weighted reciprocal rank fusion
+
+    Each document scores sum(weight / (k + rank)) over the lists it appears in, with
+    ranks starting at 1. Returns (ids, scores) ordered by descending fused score.
+    """
+    weights = np.ones(len(rankings)) if weights is None else np.asarray(weights, dtype=np.float64)
+    ids = list(dict.fromkeys(doc_id for ranking in rankings for doc_id in ranking))
+    if not ids:
+        return [], np.zeros(0)
+    position = {doc_id: n for n, doc_id in enumerate(ids)}
+    scores = np.zeros(len(ids))
+    for weight, ranking in zip(weights, rankings):
+        if not ranking:
+            continue
+        rows = np.fromiter((position[doc_id] for doc_id in ranking), dtype=np.int64, count=len(ranking))
+        scores[rows] += weight / (k + np.arange(1, len(ranking) + 1))
+    order = np.argsort(-scores, kind="stable")
+    return [ids[n] for n in order], scores[order]
@@ -0,0 +1,153 @@
+"""Index readiness polling and a bulk-load mode that relaxes index settings during ingest
+
+While loading, a self-managed or local OpenSearch index is best left without
+periodic refreshes (every refresh writes a new segment, and every segment builds
+its own HNSW graph) and without replicas (each replica repeats the indexing and
+graph build work). BulkLoadMode applies refresh_interval -1 and zero replicas for
+the load, then restores the serving values, refreshes, optionally force-merges
+the segments and waits for the index to become healthy.
+
+OpenSearch Serverless collections manage refresh, replicas, merges and cluster
+health themselves and reject those APIs, so on serverless only readiness polling
+is done. Settings:
+
+    AOSS_SERVERLESS               true/false to override detection from the endpoint host
+    AOSS_SERVING_REPLICAS         replicas to restore after the load (default: the previous value)
+    AOSS_SERVING_REFRESH_INTERVAL refresh interval to restore (default: the previous value)
+    AOSS_FORCE_MERGE_SEGMENTS     force-merge to this many segments per shard after the load, 0 = off
+"""
+# Python Built-Ins:
+import os
+import time
+from typing import Optional
+
+# External Dependencies:
+from opensearchpy.exceptions import NotFoundError, TransportError
+
+SERVERLESS_HOST_SUFFIX = ".aoss.amazonaws.com"
+
+SERVING_REPLICAS = os.environ.get("AOSS_SERVING_REPLICAS") or None
+SERVING_REFRESH_INTERVAL = os.environ.get("AOSS_SERVING_REFRESH_INTERVAL") or None
+FORCE_MERGE_SEGMENTS = int(os.environ.get("AOSS_FORCE_MERGE_SEGMENTS", "0"))
+
+
+def is_serverless(client) -> bool:
+    """Whether the client talks to an OpenSearch Serverless collection"""
+    override = os.environ.get("AOSS_SERVERLESS", "").lower()
+    if override:
+        return override in ("1", "on", "true", "yes")
+    return any(str(host.get("host", "")).endswith(SERVERLESS_HOST_SUFFIX) for host in client.transport.hosts)
+
+
+def wait_for_index(client, index: str, serverless: bool, timeout: float = 60.0, status: str = "yellow",
+                   interval: float = 0.5):
+    """Poll until the index accepts reads and writes, instead of sleeping a fixed time
+
+    Managed clusters are asked for the index health (primaries allocated at
+    least); serverless collections, which have no health API, are polled until
+    the index answers a count request. Raises TimeoutError after timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    last_error = None
+    while True:
+        try:
+            if serverless:
+                client.count(index=index)
+                return
+            wait = max(1, int(deadline - time.monotonic()))
+            health = client.cluster.health(index=index, params={"wait_for_status": status, "timeout": f"{wait}s"},
+                                           request_timeout=wait + 10)
+            if not health.get("timed_out"):
+                return
+            last_error = f"status {health.get('status')}"
+        except (NotFoundError, TransportError) as e:
+            last_error = e
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Index '{index}' not ready after {timeout:.0f}s: {last_error}")
+        time.sleep(interval)
+        interval = min(interval * 2, 5.0)
+
+
+class BulkLoadMode:
+    """Ingest-friendly index settings for the duration of a load
+
+    Parameters
+    ----------
+    client :
+        opensearchpy client.
+    index :
+        Index being loaded.
+    serverless :
+        Skip the settings, refresh and force-merge calls serverless rejects. Detected
+        from the client's host by default.
+    serving_replicas / serving_refresh_interval :
+        Values restored after the load. By default the index's values from before
+        the load (the cluster defaults for an index created by the load).
+    force_merge_segments :
+        Force-merge to at most this many segments per shard after the load; 0 skips it.
+    """
+
+    # Settings applied while loading
+    LOAD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+
+    def __init__(self, client, index: str, serverless: Optional[bool] = None,
+                 serving_replicas: Optional[str] = SERVING_REPLICAS,
+                 serving_refresh_interval: Optional[str] = SERVING_REFRESH_INTERVAL,
+                 force_merge_segments: int = FORCE_MERGE_SEGMENTS):
+        self.client = client
+        self.index = index
+        self.serverless = is_serverless(client) if serverless is None else serverless
+        self.serving = {"refresh_interval": serving_refresh_interval, "number_of_replicas": serving_replicas}
+        self.force_merge_segments = force_merge_segments
+        self.active = False
+
+    def create_settings(self) -> dict:
+        """Index settings for creating the index already in bulk-load mode"""
+        settings = {"index.knn": True}
+        if not self.serverless:
+            settings.update({f"index.{name}": value for name, value in self.LOAD_SETTINGS.items()})
+        return settings
+
+    def created(self):
+        """Mark an index created with create_settings() as being in bulk-load mode"""
+        self.active = not self.serverless
+
+    def begin(self):
+        """Switch an existing index to bulk-load mode, remembering its serving settings"""
+        if self.serverless or self.active:
+            return
+        current = self._current_settings()
+        for name in self.LOAD_SETTINGS:
+            if self.serving[name] is None:
+                value = current.get(name)
+                # -1 is left over from an interrupted load; fall back to the cluster default
+                self.serving[name] = None if value in (None, "-1") else value
+        self.client.indices.put_settings(index=self.index, body={"index": dict(self.LOAD_SETTINGS)})
+        self.active = True
+
+    def end(self, timeout: float = 300.0, force_merge: bool = True):
+        """Restore serving settings, refresh, optionally force-merge, and wait for the index to be healthy"""
+        if not self.active:
+            wait_for_index(self.client, self.index, self.serverless, timeout=timeout)
+            return
+        print(f"Restoring serving settings on '{self.index}': {self._describe_serving()}")
+        # A null value resets the setting to the cluster default
+        self.client.indices.put_settings(index=self.index, body={"index": dict(self.serving)})
+        self.client.indices.refresh(index=self.index, request_timeout=timeout)
+        if force_merge and self.force_merge_segments > 0:
+            print(f"Force-merging '{self.index}' to {self.force_merge_segments} segment(s) per shard...")
+            start = time.time()
+            self.client.indices.forcemerge(index=self.index, max_num_segments=self.force_merge_segments,
+                                           request_timeout=max(timeout, 3600))
+            print(f"Force merge finished in {time.time() - start:.1f}s")
+        self.active = False
+        wait_for_index(self.client, self.index, self.serverless, timeout=timeout)
+
+    def _current_settings(self) -> dict:
+        response = self.client.indices.get_settings(index=self.index)
+        settings = response.get(self.index, {}).get("settings", {})
+        index_settings = settings.get("index", {})
+        return {name: index_settings.get(name, settings.get(f"index.{name}")) for name in self.LOAD_SETTINGS}
+
+    def _describe_serving(self) -> str:
+        return ", ".join(f"{name}={value if value is not None else 'default'}" for name, value in self.serving.items())
@@ -0,0 +1,411 @@
+"""Supervised multi-process ingestion over byte ranges of the input file
+
+The input file is split into byte ranges that start on line boundaries, and each
+range is loaded by its own worker process. Workers publish committed documents,
+failures and how far into their range they are through one shared counter array.
+The supervisor polls the counters, restarts a worker that dies (it resumes from
+its own checkpoint) up to max_restarts times, and atomically rewrites a JSON
+status file with docs/sec, ETA and failures. `movies_loader.py status` and the
+search page's sidebar read that file, so a background load is never invisible.
+Settings:
+
+    AOSS_LOAD_WORKERS       worker processes (default: the CPU count, at most 4)
+    AOSS_LOAD_STATUS_FILE   status file (default: aoss-movies-load.status.json in the temp directory)
+    AOSS_LOAD_MAX_RESTARTS  restarts of a worker before its range is reported as failed (default 2)
+
+Workers are forked, so they inherit the loader's configuration; each one must
+create its own OpenSearch client rather than use the parent's connections. They
+are not daemonic, so they can start processes of their own (e.g. the local
+embedding provider's pool, AOSS_LOCAL_EMBED_PROCESSES); the supervisor terminates
+and joins them whenever it stops.
+"""
+# Python Built-Ins:
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Callable, List, Optional, Tuple
+
+LOAD_WORKERS = int(os.environ.get("AOSS_LOAD_WORKERS", str(max(1, min(4, os.cpu_count() or 1)))))
+STATUS_PATH = os.environ.get("AOSS_LOAD_STATUS_FILE", os.path.join(tempfile.gettempdir(), "aoss-movies-load.status.json"))
+MAX_RESTARTS = int(os.environ.get("AOSS_LOAD_MAX_RESTARTS", "2"))
+
+# States of a load that is still in progress; anything else is final
+ACTIVE_STATES = ("preparing", "running", "finishing")
+
+
+def split_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    """Split the file into at most parts (start, end) byte ranges, each starting at a line start"""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for n in range(1, max(1, parts)):
+            # Reading from one byte before the cut lands on the next line start,
+            # or on the cut itself when it already is one
+            f.seek(max(size * n // parts - 1, bounds[-1]))
+            f.readline()
+            bounds.append(max(f.tell(), bounds[-1]))
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+class WorkerCounters:
+    """Committed documents, failures and input position of every worker in one shared int64 array
+
+    offset is the highest input offset a worker has committed (or skipped on
+    resume); skipped counts the bytes it did not have to load because its
+    checkpoint already covered them. base is the checkpoint's document count when
+    the worker first started and starts the number of (re)starts.
+    """
+
+    FIELDS = ("docs", "failed", "offset", "skipped", "base", "starts")
+
+    def __init__(self, context, ranges: List[Tuple[int, int]]):
+        self._array = context.Array("q", len(ranges) * len(self.FIELDS))
+        for n, (start, _) in enumerate(ranges):
+            self._array[self._index(n, "offset")] = start
+
+    def _index(self, worker: int, field: str) -> int:
+        return worker * len(self.FIELDS) + self.FIELDS.index(field)
+
+    def begin(self, worker: int, offset: int, documents: int = 0):
+        """Record where a (re)started worker resumes its range
+
+        documents is the document count of the checkpoint it resumes from. A
+        restarted worker sends the documents past its checkpoint again, so its
+        docs count is clamped to what the checkpoint records for this load.
+        """
+        with self._array.get_lock():
+            if self._array[self._index(worker, "starts")] == 0:
+                self._array[self._index(worker, "base")] = documents
+            else:
+                # The checkpoint counts failed documents too
+                checkpointed = documents - self._array[self._index(worker, "base")] - self._array[self._index(worker, "failed")]
+                docs = self._index(worker, "docs")
+                self._array[docs] = max(0, min(self._array[docs], checkpointed))
+            self._array[self._index(worker, "starts")] += 1
+            current = self._array[self._index(worker, "offset")]
+            if offset > current:
+                self._array[self._index(worker, "skipped")] += offset - current
+                self._array[self._index(worker, "offset")] = offset
+
+    def committed(self, worker: int, offsets: List[int]):
+        with self._array.get_lock():
+            self._array[self._index(worker, "docs")] += len(offsets)
+            position = self._index(worker, "offset")
+            self._array[position] = max(self._array[position], max(offsets))
+
+    def failed(self, worker: int, offset: int):
+        with self._array.get_lock():
+            self._array[self._index(worker, "failed")] += 1
+            position = self._index(worker, "offset")
+            self._array[position] = max(self._array[position], offset)
+
+    def snapshot(self) -> List[dict]:
+        with self._array.get_lock():
+            values = list(self._array)
+        width = len(self.FIELDS)
+        return [dict(zip(self.FIELDS, values[n:n + width])) for n in range(0, len(values), width)]
+
+
+def _terminated(*_):
+    # Exit through SystemExit so multiprocessing's exit handlers stop the worker's own children
+    sys.exit(128 + signal.SIGTERM)
+
+
+def _run_worker(target, worker, start, end, counters, errors, resume):
+    # Ctrl+C reaches the whole process group; the supervisor decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _terminated)
+    try:
+        target(worker, start, end, counters, resume)
+    except SystemExit:
+        raise
+    except BaseException as e:
+        traceback.print_exc()
+        errors.put((worker, f"{type(e).__name__}: {e}"))
+        sys.exit(1)
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "unknown"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60}:{rest % 60:02d}"
+
+
+class IngestSupervisor:
+    """Run one worker process per byte range, restart failed workers and publish a status file
+
+    Parameters
+    ----------
+    target :
+        Called in each worker as target(worker, start, end, counters, resume). It
+        loads the lines starting in [start, end), reports through the
+        WorkerCounters, and resumes from its own checkpoint when resume is true.
+    input_path :
+        Input file the ranges refer to.
+    ranges :
+        (start, end) byte ranges from split_ranges, one worker each.
+    status_path :
+        JSON status file, rewritten atomically every poll_interval seconds.
+    index_name :
+        Target index, shown in the status.
+    resume :
+        Passed to the first start of every worker; restarted workers always resume.
+    max_restarts :
+        Restarts per worker after a non-zero exit before its range is given up.
+    poll_interval :
+        Seconds between counter polls and status writes.
+    report_interval :
+        Seconds between progress lines printed by the supervisor.
+    log_path :
+        Log file of a background load, shown in the status.
+    """
+
+    def __init__(
+        self,
+        target: Callable,
+        input_path: str,
+        ranges: List[Tuple[int, int]],
+        status_path: str = STATUS_PATH,
+        index_name: Optional[str] = None,
+        resume: bool = False,
+        max_restarts: int = MAX_RESTARTS,
+        poll_interval: float = 1.0,
+        report_interval: float = 10.0,
+        log_path: Optional[str] = None,
+    ):
+        self.target = target
+        self.input_path = os.path.abspath(input_path)
+        self.input_size = os.path.getsize(input_path)
+        self.ranges = ranges
+        self.status_path = status_path
+        self.index_name = index_name
+        self.resume = resume
+        self.max_restarts = max_restarts
+        self.poll_interval = poll_interval
+        self.report_interval = report_interval
+        self.log_path = log_path
+        self._context = multiprocessing.get_context("fork")
+        self.counters = WorkerCounters(self._context, ranges)
+        self._errors = self._context.SimpleQueue()
+        self._workers = [
+            {"process": None, "state": "pending", "restarts": 0, "exitcode": None, "error": None}
+            for _ in ranges
+        ]
+        self._stopping = threading.Event()
+        self._started = time.time()
+        self._monotonic_start = time.monotonic()
+
+    def _start(self, worker: int, resume: bool):
+        start, end = self.ranges[worker]
+        # Output buffered before the fork would otherwise be written again by the child
+        sys.stdout.flush()
+        sys.stderr.flush()
+        process = self._context.Process(
+            target=_run_worker,
+            args=(self.target, worker, start, end, self.counters, self._errors, resume),
+            name=f"ingest-worker-{worker + 1}",
+            daemon=False
+        )
+        process.start()
+        self._workers[worker].update(process=process, state="running", exitcode=None)
+
+    def _terminate(self):
+        """Terminate the workers still running and wait for every worker to exit"""
+        for worker in self._workers:
+            process = worker["process"]
+            if process is not None and process.is_alive():
+                process.terminate()
+        for worker in self._workers:
+            if worker["process"] is not None:
+                worker["process"].join()
+
+    def _collect(self):
+        """Drain worker errors and restart or retire workers that exited"""
+        exited = [n for n, worker in enumerate(self._workers)
+                  if worker["state"] == "running" and not worker["process"].is_alive()]
+        for n in exited:
+            self._workers[n]["process"].join()
+        # Read after the joins, so an exited worker's error has been received
+        while not self._errors.empty():
+            worker, error = self._errors.get()
+            self._workers[worker]["error"] = error
+        for n in exited:
+            worker = self._workers[n]
+            process = worker["process"]
+            worker["exitcode"] = process.exitcode
+            if process.exitcode == 0:
+                worker["state"] = "done"
+            elif self._stopping.is_set():
+                worker["state"] = "stopped"
+            elif worker["restarts"] < self.max_restarts:
+                worker["restarts"] += 1
+                print(f"Worker {n + 1} exited with code {process.exitcode} ({worker['error']}), "
+                      f"restarting it from its checkpoint ({worker['restarts']}/{self.max_restarts})")
+                self._start(n, resume=True)
+            else:
+                worker["state"] = "failed"
+                print(f"Worker {n + 1} failed {worker['restarts'] + 1} times, giving up on bytes "
+                      f"{self.ranges[n][0]}-{self.ranges[n][1]}: {worker['error']}")
+
+    def status(self, state: str) -> dict:
+        counts = self.counters.snapshot()
+        elapsed = time.monotonic() - self._monotonic_start
+        docs = sum(c["docs"] for c in counts)
+        bytes_done = sum(c["offset"] - start for c, (start, _) in zip(counts, self.ranges))
+        bytes_loaded = bytes_done - sum(c["skipped"] for c in counts)
+        total = sum(end - start for start, end in self.ranges)
+        byte_rate = bytes_loaded / elapsed if elapsed > 0 else 0.0
+        eta = (total - bytes_done) / byte_rate if byte_rate > 0 and state in ACTIVE_STATES else None
+        return {
+            "state": state,
+            "pid": os.getpid(),
+            "index": self.index_name,
+            "input": self.input_path,
+            "input_bytes": self.input_size,
+            "log": self.log_path,
+            "started": self._started,
+            "updated": time.time(),
+            "elapsed_seconds": elapsed,
+            "docs": docs,
+            "failed": sum(c["failed"] for c in counts),
+            "docs_per_sec": docs / elapsed if elapsed > 0 else 0.0,
+            "bytes_done": bytes_done,
+            "progress": bytes_done / total if total else 1.0,
+            "eta_seconds": 0.0 if state == "complete" else eta,
+            "workers": [
+                {
+                    "worker": n + 1,
+                    "pid": worker["process"].pid if worker["process"] else None,
+                    "range": list(self.ranges[n]),
+                    "offset": c["offset"],
+                    "docs": c["docs"],
+                    "failed": c["failed"],
+                    "state": worker["state"],
+                    "restarts": worker["restarts"],
+                    "exitcode": worker["exitcode"],
+                    "error": worker["error"],
+                }
+                for n, (worker, c) in enumerate(zip(self._workers, counts))
+            ],
+        }
+
+    def write_status(self, state: str) -> dict:
+        """Atomically write the current status with the given load state"""
+        status = self.status(state)
+        tmp_path = f"{self.status_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(status, f)
+        os.replace(tmp_path, self.status_path)
+        return status
+
+    def stop(self, *_):
+        """Stop the workers at the next poll; checkpoints let a later --resume pick up from there"""
+        if not self._stopping.is_set():
+            print("\nStopping the ingestion workers...")
+        self._stopping.set()
+
+    def run(self) -> dict:
+        """Load every range and return the last status written
+
+        The state is "finishing" when every worker completed its range (call
+        finish() once the index is ready), "failed" when a range was given up,
+        or "interrupted" after stop(), SIGINT or SIGTERM.
+        """
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                handlers[sig] = signal.signal(sig, self.stop)
+        self._started = time.time()
+        self._monotonic_start = time.monotonic()
+        try:
+            for n in range(len(self.ranges)):
+                self._start(n, self.resume)
+            last_report = time.monotonic()
+            while True:
+                self._stopping.wait(self.poll_interval)
+                if self._stopping.is_set():
+                    self._terminate()
+                self._collect()
+                running = any(worker["state"] == "running" for worker in self._workers)
+                if not running:
+                    break
+                status = self.write_status("running")
+                if time.monotonic() - last_report >= self.report_interval:
+                    last_report = time.monotonic()
+                    print(f"Processed {status['docs']} documents ({status['progress']*100:.1f}% of input) - "
+                          f"{status['docs_per_sec']:.1f} docs/sec, ETA {format_duration(status['eta_seconds'])}, "
+                          f"{status['failed']} failed")
+        except BaseException:
+            # Workers are not daemonic: don't leave them running, or the interpreter waits for them at exit
+            self._terminate()
+            raise
+        finally:
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+        if self._stopping.is_set():
+            return self.write_status("interrupted")
+        if any(worker["state"] == "failed" for worker in self._workers):
+            return self.write_status("failed")
+        return self.write_status("finishing")
+
+    def finish(self) -> dict:
+        return self.write_status("complete")
+
+
+def read_status(path: str = STATUS_PATH) -> Optional[dict]:
+    """Status written by an IngestSupervisor, or None when there is none
+
+    A load still marked active whose supervisor process is gone is reported as
+    "stopped".
+    """
+    try:
+        with open(path) as f:
+            status = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if status.get("state") in ACTIVE_STATES:
+        try:
+            os.kill(status["pid"], 0)
+        except ProcessLookupError:
+            status["state"] = "stopped"
+            status["eta_seconds"] = None
+        except PermissionError:
+            pass
+    return status
+
+
+def format_status(status: dict) -> List[str]:
+    """Human-readable lines of a status file, for the status subcommand"""
+    lines = [
+        f"Load into '{status['index']}': {status['state']} (supervisor PID {status['pid']}, "
+        f"started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(status['started']))})",
+        f"Documents: {status['docs']} indexed, {status['failed']} failed, {status['progress']*100:.1f}% of input "
+        f"({status['bytes_done']}/{status['input_bytes']} bytes)",
+        f"Rate: {status['docs_per_sec']:.1f} docs/sec, elapsed {format_duration(status['elapsed_seconds'])}, "
+        f"ETA {format_duration(status['eta_seconds'])}",
+    ]
+    for worker in status["workers"]:
+        start, end = worker["range"]
+        done = (worker["offset"] - start) / (end - start) if end > start else 1.0
+        line = (f"  worker {worker['worker']} (PID {worker['pid']}): {worker['state']}, {done*100:.1f}% of bytes "
+                f"{start}-{end}, {worker['docs']} docs, {worker['failed']} failed")
+        if worker["restarts"]:
+            line += f", {worker['restarts']} restarts"
+        if worker["error"]:
+            line += f" - last error: {worker['error']}"
+        lines.append(line)
+    if status.get("log"):
+        lines.append(f"Log: {status['log']}")
+    age = time.time() - status["updated"]
+    if status["state"] in ACTIVE_STATES and age > 30:
+        lines.append(f"Warning: the status has not been updated for {format_duration(age)}")
+    return lines
@@ -0,0 +1,54 @@
+"""Thread-safe lazily created module attributes
+
+Clients and models that are expensive to build (Bedrock clients, LLM wrappers,
+SentenceTransformer models) are declared with LazyAttributes instead of being
+created at import. They are built on first access, once per process, and stored
+in the module namespace so later lookups are plain attribute reads. Assigning
+the attribute first (e.g. a benchmark stub) skips the factory altogether.
+
+    _lazy = LazyAttributes(globals(), client=clients.get_opensearch_client)
+    __getattr__ = _lazy.module_getattr
+
+    def get_client():
+        return _lazy.get("client")
+"""
+# Python Built-Ins:
+import threading
+from typing import Any, Callable, Dict
+
+
+class LazyAttributes:
+    """Factories for module attributes, called on first use
+
+    Parameters
+    ----------
+    namespace :
+        The module's globals(); created values are stored there.
+    factories :
+        Attribute name -> zero-argument callable creating the value.
+    """
+
+    def __init__(self, namespace: Dict[str, Any], **factories: Callable[[], Any]):
+        self.namespace = namespace
+        self.factories = factories
+        self._lock = threading.RLock()
+
+    def get(self, name: str) -> Any:
+        """Return the attribute, creating it if nobody has yet"""
+        value = self.namespace.get(name)
+        if value is None:
+            with self._lock:
+                value = self.namespace.get(name)
+                if value is None:
+                    value = self.factories[name]()
+                    self.namespace[name] = value
+        return value
+
+    def loaded(self, name: str) -> bool:
+        return self.namespace.get(name) is not None
+
+    def module_getattr(self, name: str) -> Any:
+        """Module-level __getattr__ (PEP 562) so `module.client` keeps working"""
+        if name in self.factories:
+            return self.get(name)
+        raise AttributeError(f"module {self.namespace.get('__name__')!r} has no attribute {name!r}")
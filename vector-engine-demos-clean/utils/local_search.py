@@ -0,0 +1,321 @@
+"""Local in-memory search backend implementing the query_movies contract
+
+Movie vectors for v_title/v_plot are held in contiguous float32 matrices. Small
+collections are searched exactly with one matrix-vector product; collections above
+exact_threshold use an HNSW graph when hnswlib is installed. Filters, sort modes,
+scoring (OpenSearch l2 space: 1 / (1 + distance^2)) and the returned tuple mirror
+utils.bedrockopensearch.query_movies, so the page can run without a network hop.
+"""
+# Python Built-Ins:
+import json
+import math
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+# External Dependencies:
+import numpy as np
+
+from utils.fusion import reciprocal_rank_fusion
+from utils.query_builder import knn_k, movie_result
+
+VECTOR_FIELDS = ("v_title", "v_plot")
+TEXT_FIELDS = ("title", "plot")
+EXACT_THRESHOLD = int(os.environ.get("AOSS_LOCAL_EXACT_THRESHOLD", "50000"))
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+
+class _TextField:
+    """BM25 statistics of one text field (k1=1.2, b=0.75, as in OpenSearch)"""
+
+    def __init__(self, texts: List[str]):
+        self.size = len(texts)
+        postings = {}
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for n, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[n] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, ([], []))
+                postings[token][0].append(n)
+                postings[token][1].append(tf)
+        self.postings = {t: (np.array(d, dtype=np.int64), np.array(f, dtype=np.float32)) for t, (d, f) in postings.items()}
+        self.norms = 1.2 * (0.25 + 0.75 * lengths / max(float(lengths.mean()) if self.size else 0.0, 1.0))
+
+    def scores(self, terms):
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(terms):
+            if term not in self.postings:
+                continue
+            docs, tf = self.postings[term]
+            idf = math.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tf * 2.2 / (tf + self.norms[docs])
+        return scores
+
+
+class LocalMovieIndex:
+    """Movie documents and their vectors, searchable without OpenSearch
+
+    Parameters
+    ----------
+    exact_threshold :
+        Collections with more documents than this use HNSW (when hnswlib is available)
+        instead of exact search.
+    hnsw_m, hnsw_ef_construction, hnsw_ef_search :
+        HNSW graph parameters.
+    """
+
+    def __init__(self, exact_threshold: int = EXACT_THRESHOLD, hnsw_m: int = 16,
+                 hnsw_ef_construction: int = 200, hnsw_ef_search: int = 100):
+        self.exact_threshold = exact_threshold
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construction = hnsw_ef_construction
+        self.hnsw_ef_search = hnsw_ef_search
+        self.docs = []
+        self.vectors = {}
+        self._has_vector = {}
+        self._norms = {}
+        self._graphs = {}
+        self._text = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    # - Building
+
+    @classmethod
+    def from_documents(cls, documents, **kwargs) -> "LocalMovieIndex":
+        """Build from movie dicts that already carry v_title/v_plot vectors"""
+        index = cls(**kwargs)
+        vectors = {field: [] for field in VECTOR_FIELDS}
+        for doc in documents:
+            for field in VECTOR_FIELDS:
+                vectors[field].append(doc.get(field))
+            index.docs.append({k: v for k, v in doc.items() if k not in VECTOR_FIELDS})
+        for field, values in vectors.items():
+            dimension = next((len(v) for v in values if v is not None), 0)
+            matrix = np.zeros((len(values), dimension), dtype=np.float32)
+            present = np.zeros(len(values), dtype=bool)
+            for n, value in enumerate(values):
+                if value is not None:
+                    matrix[n] = value
+                    present[n] = True
+            index.vectors[field] = matrix
+            index._has_vector[field] = present
+        index._build()
+        return index
+
+    @classmethod
+    def from_file(cls, path: str, embed: Callable[[str], List[float]], **kwargs) -> "LocalMovieIndex":
+        """Build from a movie NDJSON file, embedding titles and plots with embed (e.g. generate_embedding)"""
+        def documents():
+            with open(path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    doc = json.loads(line)
+                    if "index" in doc or "title" not in doc:
+                        continue
+                    doc.setdefault("v_title", embed(doc["title"]))
+                    if doc.get("plot"):
+                        doc.setdefault("v_plot", embed(doc["plot"]))
+                    yield doc
+        return cls.from_documents(documents(), **kwargs)
+
+    @classmethod
+    def from_opensearch(cls, client, index_name: str, batch_size: int = 500,
+                        embed: Optional[Callable[[str], List[float]]] = None, **kwargs) -> "LocalMovieIndex":
+        """Copy an OpenSearch movie index into memory
+
+        Vectors are read from _source. When the index keeps them out of _source
+        (AOSS_SOURCE_EXCLUDE_VECTORS), pass embed to re-embed titles and plots.
+        """
+        def documents():
+            search_after = None
+            while True:
+                body = {"size": batch_size, "sort": [{"_id": "asc"}], "query": {"match_all": {}}}
+                if search_after:
+                    body["search_after"] = search_after
+                hits = client.search(index=index_name, body=body)["hits"]["hits"]
+                if not hits:
+                    return
+                for hit in hits:
+                    doc = hit["_source"]
+                    if embed is not None:
+                        if "v_title" not in doc:
+                            doc["v_title"] = embed(doc["title"])
+                        if "v_plot" not in doc and doc.get("plot"):
+                            doc["v_plot"] = embed(doc["plot"])
+                    yield doc
+                search_after = hits[-1]["sort"]
+        return cls.from_documents(documents(), **kwargs)
+
+    def save(self, path: str):
+        """Write vectors and documents to a .npz snapshot for fast startup"""
+        arrays = {f"vectors_{field}": matrix for field, matrix in self.vectors.items()}
+        arrays.update({f"present_{field}": present for field, present in self._has_vector.items()})
+        np.savez(path, docs=np.array(json.dumps(self.docs)), **arrays)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "LocalMovieIndex":
+        index = cls(**kwargs)
+        with np.load(path) as data:
+            index.docs = json.loads(str(data["docs"]))
+            for field in VECTOR_FIELDS:
+                index.vectors[field] = np.ascontiguousarray(data[f"vectors_{field}"], dtype=np.float32)
+                index._has_vector[field] = data[f"present_{field}"]
+        index._build()
+        return index
+
+    def _build(self):
+        count = len(self.docs)
+        for field, matrix in self.vectors.items():
+            self._norms[field] = np.einsum("ij,ij->i", matrix, matrix)
+            if count > self.exact_threshold:
+                self._graphs[field] = self._build_graph(field, matrix)
+        self._text = {field: _TextField([doc.get(field, "") for doc in self.docs]) for field in TEXT_FIELDS}
+        self.ratings = np.array([doc.get("rating", np.nan) if doc.get("rating") is not None else np.nan
+                                 for doc in self.docs], dtype=np.float64)
+        self.years = np.array([doc.get("year", np.nan) if doc.get("year") is not None else np.nan
+                               for doc in self.docs], dtype=np.float64)
+        self._genres = {}
+        for n, doc in enumerate(self.docs):
+            for genre in doc.get("genres") or []:
+                self._genres.setdefault(genre, np.zeros(count, dtype=bool))[n] = True
+        self.ranks = np.array([doc["rank"] if doc.get("rank") is not None else np.inf
+                               for doc in self.docs], dtype=np.float64)
+
+    def _build_graph(self, field, matrix):
+        try:
+            import hnswlib
+        except ImportError:
+            print(f"hnswlib is not installed, using exact search for {len(matrix)} documents")
+            return None
+        present = np.flatnonzero(self._has_vector[field])
+        graph = hnswlib.Index(space="l2", dim=matrix.shape[1])
+        graph.init_index(max_elements=max(len(present), 1), ef_construction=self.hnsw_ef_construction, M=self.hnsw_m)
+        graph.add_items(matrix[present], present)
+        graph.set_ef(self.hnsw_ef_search)
+        return graph
+
+    # - Searching
+
+    def knn(self, field: str, vector, k: int, mask: Optional[np.ndarray] = None) -> Dict[int, float]:
+        """Top-k neighbours of vector in field as {document position: score}, among the mask's documents when given"""
+        query = np.asarray(vector, dtype=np.float32)
+        present = self._has_vector[field] if mask is None else self._has_vector[field] & mask
+        k = min(k, int(present.sum()))
+        if k <= 0:
+            return {}
+        graph = self._graphs.get(field)
+        if graph is not None:
+            # Filtered during the graph walk, like an efficient filter inside the knn clause
+            allowed = None if mask is None else (lambda label: bool(mask[label]))
+            labels, distances = graph.knn_query(query, k=k, filter=allowed)
+            return {int(n): float(1.0 / (1.0 + d)) for n, d in zip(labels[0], distances[0])}
+        distances = self._norms[field] - 2 * (self.vectors[field] @ query) + float(query @ query)
+        distances = np.where(present, distances, np.inf)
+        top = np.argpartition(distances, k - 1)[:k]
+        return {int(n): float(1.0 / (1.0 + distances[n])) for n in top}
+
+    def filter_mask(self, genres, rating) -> np.ndarray:
+        """Boolean mask of documents matching query_builder.movie_filters: any of the genres, a minimum rating"""
+        mask = np.ones(len(self.docs), dtype=bool)
+        if isinstance(genres, str):
+            genres = [] if genres.strip() in ("", "*") else [genres]
+        if genres:
+            mask[:] = False
+            for genre in genres:
+                if genre in self._genres:
+                    mask |= self._genres[genre]
+        if rating not in (None, "") and float(rating) > 0:
+            with np.errstate(invalid="ignore"):
+                mask &= self.ratings >= float(rating)
+        return mask
+
+    def lexical(self, query: str) -> Dict[int, float]:
+        """multi_match (best_fields) over title and plot"""
+        terms = tokenize(query)
+        scores = np.max([self._text[field].scores(terms) for field in TEXT_FIELDS], axis=0)
+        return {int(n): float(scores[n]) for n in np.flatnonzero(scores > 0)}
+
+    def _rank(self, scores: Dict[int, float], mask, sort_type, size, offset: int = 0):
+        matched = [(n, s) for n, s in scores.items() if mask[n]]
+        # Sort key, then rank ascending as the tiebreaker, like query_builder.sort_clause
+        matched.sort(key=lambda hit: self.ranks[hit[0]])
+        if sort_type == "_score":
+            matched.sort(key=lambda hit: hit[1], reverse=True)
+        else:
+            values = self.years if sort_type == "year" else self.ratings
+            matched.sort(key=lambda hit: -np.inf if np.isnan(values[hit[0]]) else values[hit[0]], reverse=True)
+        results = []
+        for n, _ in matched[offset:offset + size]:
+            doc = self.docs[n]
+            results.append(movie_result(doc, missing=None))
+        return results, len(matched)
+
+    def knn_movies(self, query_embedding, k: int, mask: Optional[np.ndarray] = None) -> Dict[int, float]:
+        """Summed scores of the v_title and v_plot kNN clauses"""
+        knn_scores = {}
+        for field in VECTOR_FIELDS:
+            for n, score in self.knn(field, query_embedding, k, mask).items():
+                knn_scores[n] = knn_scores.get(n, 0.0) + score
+        return knn_scores
+
+    def query_movies(self, query: str, query_embedding, sort_type: str, genres, rating, size: int = 3,
+                     k: Optional[int] = None, offsets=(0, 0)):
+        """Same semantics and return value as bedrockopensearch.query_movies
+
+        offsets are the (kNN, lexical) positions the page starts at; k defaults to
+        query_builder.knn_k for the page size.
+        """
+        mask = self.filter_mask(genres, rating)
+        offset_knn, offset_kw = offsets
+        knn_scores = self.knn_movies(query_embedding, k or knn_k(size), mask)
+        results_knn, doc_count_knn = self._rank(knn_scores, mask, sort_type, size, offset_knn)
+        results_kw, doc_count_kw = self._rank(self.lexical(query), mask, sort_type, size, offset_kw)
+        return results_knn, doc_count_knn, results_kw, doc_count_kw
+
+    def query_movies_hybrid(self, query: str, query_embedding, sort_type: str, genres, rating, size: int = 3,
+                            candidates: int = 50, weights=None):
+        """Reciprocal rank fusion of the lexical and kNN candidates, as (results, doc_count)"""
+        mask = self.filter_mask(genres, rating)
+        rankings = []
+        for scores in (self.lexical(query), self.knn_movies(query_embedding, candidates, mask)):
+            matched = sorted(((n, s) for n, s in scores.items() if mask[n]), key=lambda hit: hit[1], reverse=True)
+            rankings.append([n for n, _ in matched[:candidates]])
+        ids, fused = reciprocal_rank_fusion(rankings, weights=weights)
+        return self._rank(dict(zip(ids, fused.tolist())), mask, sort_type, size)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_local_index(embed: Optional[Callable[[str], List[float]]] = None) -> LocalMovieIndex:
+    """Load the process-wide local index from AOSS_LOCAL_INDEX_PATH
+
+    A .npz path is loaded as a snapshot; any other path is read as a movie NDJSON file
+    and embedded with embed (vectors come from the embedding cache on later starts).
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                path = os.environ.get("AOSS_LOCAL_INDEX_PATH", "indexer/sample-movies-1500.json")
+                if path.endswith(".npz"):
+                    _index = LocalMovieIndex.load(path)
+                else:
+                    if embed is None:
+                        raise ValueError("an embed function is required to build the local index from a movie file")
+                    _index = LocalMovieIndex.from_file(path, embed)
+    return _index
@@ -0,0 +1,283 @@
+"""In-process latency histograms for the query path, with Prometheus and JSON-log export
+
+Code under measurement wraps each stage in `stage(name)` inside a `trace(operation)`:
+
+    with metrics.trace("query_movies", query=query) as t:
+        with metrics.stage("embedding"):
+            ...
+        t.took("knn", response["took"])
+
+Stage durations and the OpenSearch-reported `took` of each search go into
+fixed-bucket histograms (cheap enough to leave on). When a trace finishes its
+breakdown is written as one JSON line to stderr and kept as the thread's last
+trace for the page's debug panel. Settings:
+
+    AOSS_METRICS_LOG     json (default) or off
+    AOSS_METRICS_FILE    path rewritten with the Prometheus text format after every trace,
+                         e.g. for the node_exporter textfile collector
+    AOSS_METRICS_PORT    serve the Prometheus text format on http://0.0.0.0:<port>/metrics
+"""
+# Python Built-Ins:
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+METRICS_LOG = os.environ.get("AOSS_METRICS_LOG", "json").lower()
+METRICS_FILE = os.environ.get("AOSS_METRICS_FILE")
+METRICS_PORT = int(os.environ.get("AOSS_METRICS_PORT", "0"))
+
+# Upper bounds in seconds, from 1 ms to 10 s
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_METRIC = "aoss_query_stage_seconds"
+TOOK_METRIC = "aoss_opensearch_took_seconds"
+HELP = {
+    STAGE_METRIC: "Client-side wall time of each query stage",
+    TOOK_METRIC: "Server-side search time reported by OpenSearch in the took field",
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations in seconds"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+            self.min = seconds if self.min is None else min(self.min, seconds)
+            self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate by linear interpolation within the bucket holding the q-th observation, clamped to the observed range"""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for i, n in enumerate(self.counts):
+                if n and seen + n >= rank:
+                    lower = max(self.buckets[i - 1] if i > 0 else 0.0, self.min)
+                    upper = min(self.buckets[i] if i < len(self.buckets) else self.max, self.max)
+                    return lower + (upper - lower) * (rank - seen) / n
+                seen += n
+            return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.sum / self.count * 1000 if self.count else None,
+            "p50_ms": _ms(self.quantile(0.5)),
+            "p95_ms": _ms(self.quantile(0.95)),
+            "p99_ms": _ms(self.quantile(0.99)),
+            "max_ms": _ms(self.max),
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000
+
+
+class Registry:
+    """Histograms keyed by metric name and label values"""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._histograms.items())
+
+    def snapshot(self) -> dict:
+        """{metric: {"label=value,...": histogram summary}}"""
+        result = {}
+        for (name, labels), histogram in self._items():
+            result.setdefault(name, {})[",".join(f"{k}={v}" for k, v in labels)] = histogram.snapshot()
+        return result
+
+    def render_prometheus(self) -> str:
+        """All histograms in the Prometheus text exposition format"""
+        lines = []
+        current = None
+        for (name, labels), histogram in self._items():
+            if name != current:
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                current = name
+            with histogram._lock:
+                counts, total, count = list(histogram.counts), histogram.sum, histogram.count
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, n in zip(histogram.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label_text}}} {total}")
+            lines.append(f"{name}_count{{{label_text}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        # Write then rename so a scraper never reads a partial file; the temporary name
+        # is per process and thread, so concurrent traces don't write into the same file
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+registry = Registry()
+
+
+class Trace:
+    """Stage timings and OpenSearch took values of one traced operation"""
+
+    def __init__(self, operation: str, **fields):
+        self.operation = operation
+        self.fields = fields
+        self.stages: Dict[str, float] = {}
+        self.took_ms: Dict[str, int] = {}
+        self.total_ms: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def took(self, search: str, took_ms):
+        """Record the took (milliseconds) OpenSearch reported for one search"""
+        if took_ms is None:
+            return
+        self.took_ms[search] = took_ms
+        registry.histogram(TOOK_METRIC, operation=self.operation, search=search).observe(took_ms / 1000)
+
+    def to_dict(self) -> dict:
+        return {
+            "event": "query_trace",
+            "operation": self.operation,
+            **self.fields,
+            "total_ms": self.total_ms,
+            "stages_ms": self.stages,
+            "took_ms": self.took_ms,
+            "error": self.error,
+        }
+
+
+_local = threading.local()
+
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_local, "trace", None)
+
+
+def last_trace() -> Optional[Trace]:
+    """Most recent finished trace of the calling thread"""
+    return getattr(_local, "last", None)
+
+
+@contextmanager
+def trace(operation: str, **fields):
+    """Time an operation; nested stage() calls are attributed to it"""
+    parent = current_trace()
+    t = Trace(operation, **fields)
+    _local.trace = t
+    start = time.perf_counter()
+    try:
+        yield t
+    except Exception as e:
+        t.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _local.trace = parent
+        t.total_ms = elapsed * 1000
+        registry.histogram(STAGE_METRIC, operation=operation, stage="total").observe(elapsed)
+        _local.last = t
+        _export(t)
+
+
+@contextmanager
+def stage(name: str):
+    """Time one stage of the current trace (or of operation "untraced" outside a trace)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def record(name: str, seconds: float):
+    """Record a duration measured by the caller as a stage, e.g. time to the first streamed token"""
+    t = current_trace()
+    operation = t.operation if t is not None else "untraced"
+    registry.histogram(STAGE_METRIC, operation=operation, stage=name).observe(seconds)
+    if t is not None:
+        t.stages[name] = t.stages.get(name, 0.0) + seconds * 1000
+
+
+def _export(t: Trace):
+    if METRICS_LOG == "json":
+        print(json.dumps(t.to_dict(), default=str), file=sys.stderr)
+    if METRICS_FILE:
+        try:
+            registry.write_prometheus(METRICS_FILE)
+        except OSError as e:
+            print(f"Could not write metrics to {METRICS_FILE}: {e}", file=sys.stderr)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_http_server(port: int = METRICS_PORT, host: str = "0.0.0.0"):
+    """Serve /metrics from a daemon thread; only the first call starts a server, port 0 disables it"""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            # Imported here: http.server is slow to import and only needed with a port set
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] not in ("/metrics", "/"):
+                        self.send_error(404)
+                        return
+                    body = registry.render_prometheus().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            _server = ThreadingHTTPServer((host, port), Handler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+            print(f"Serving query metrics on http://{host}:{port}/metrics")
+    return _server
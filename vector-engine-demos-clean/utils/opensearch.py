@@ -1,20 +1,18 @@
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from requests_aws4auth import AWS4Auth
-import boto3
 import os
-from sentence_transformers import SentenceTransformer
 import sys
-from langchain.llms.bedrock import Bedrock
 
 module_path = "./"
 sys.path.append(os.path.abspath(module_path))
 from utils import bedrock
+from utils import clients
+from utils import embeddings
+from utils.lazy import LazyAttributes
+from utils import query_builder
 
 # Static Section
 
-# Load the SentenceTransformer model
+# SentenceTransformer model, loaded on first use
 model_name = 'sentence-transformers/msmarco-distilbert-base-tas-b'
-model = SentenceTransformer(model_name)
 
 # Set the desired vector size
 vector_size = 768
@@ -25,16 +23,42 @@ region = os.environ.get('AOSS_VECTORSEARCH_REGION')
 
 # os.environ["AOSS_BEDROCK_PROFILE"] = "<YOUR_PROFILE>"
 
+# Model, clients and LLMs are created on first use rather than at import
+def create_embedding_provider():
+    # Batched local encoding (torch by default; opt-in ONNX/int8) and worker processes per the AOSS_LOCAL_EMBED_* settings
+    return embeddings.LocalEmbeddingProvider(model_name)
+
+def create_model():
+    return _lazy.get("embedding_provider").model
+
 # Bedrock Clients connection
-boto3_bedrock = bedrock.get_bedrock_client(
-    assumed_role=os.environ.get("AOSS_BEDROCK_ASSUME_ROLE", None),
-    region=os.environ.get("AOSS_VECTORSEARCH_REGION", None),
-    runtime=True
-)
+def create_bedrock_client():
+    return bedrock.get_bedrock_client(
+        assumed_role=os.environ.get("AOSS_BEDROCK_ASSUME_ROLE", None),
+        region=os.environ.get("AOSS_VECTORSEARCH_REGION", None),
+        runtime=True
+    )
 
 # - create the LLM Model
-claude_llm = Bedrock(model_id="anthropic.claude-instant-v1", client=boto3_bedrock, model_kwargs={'max_tokens_to_sample':1000})
-titan_llm = Bedrock(model_id= "amazon.titan-tg1-large", client=boto3_bedrock)
+def create_claude_llm():
+    from langchain.llms.bedrock import Bedrock
+    return Bedrock(model_id="anthropic.claude-instant-v1", client=_lazy.get("boto3_bedrock"), model_kwargs={'max_tokens_to_sample':1000})
+
+def create_titan_llm():
+    from langchain.llms.bedrock import Bedrock
+    return Bedrock(model_id= "amazon.titan-tg1-large", client=_lazy.get("boto3_bedrock"))
+
+# Module attributes model, embedding_provider, boto3_bedrock, client, claude_llm and titan_llm resolve through _lazy
+_lazy = LazyAttributes(
+    globals(),
+    model=create_model,
+    embedding_provider=create_embedding_provider,
+    boto3_bedrock=create_bedrock_client,
+    client=clients.get_opensearch_client,
+    claude_llm=create_claude_llm,
+    titan_llm=create_titan_llm,
+)
+__getattr__ = _lazy.module_getattr
 
 # - Create Prompts
 def get_claude_prompt(context, user_question, knowledgebase_filter):
@@ -71,185 +95,42 @@ def get_titan_prompt(context, user_question, knowledgebase_filter):
 
 
 
-service = 'aoss'
-credentials = boto3.Session().get_credentials()
-awsauth = AWS4Auth(credentials.access_key, credentials.secret_key, region, service,
-session_token=credentials.token)
 
-# Create an OpenSearch client
-client = OpenSearch(
-    hosts = [{'host': host, 'port': 443}],
-    http_auth = awsauth,
-    timeout = 300,
-    use_ssl = True,
-    verify_certs = True,
-    connection_class = RequestsHttpConnection
-)
-
-
-# Define queries for OpenSearch
-def query_qna(query, index):
-    query_embedding = model.encode(query).tolist()
+# Define queries for OpenSearch; k follows the result size (query_builder.knn_k), not the vector size
+def query_qna(query, index, size=3):
+    query_embedding = _lazy.get("embedding_provider").embed(query)
     query_qna = {
-        "size": 3,
+        "size": size,
         "fields": ["content", "title"],
         "_source": False,
-        "query": {
-            "knn": {
-            "v_content": {
-                "vector": query_embedding,
-                "k": vector_size
-            }
-            }
-        }
+        "query": query_builder.knn_clause("v_content", query_embedding, query_builder.knn_k(size, pages=1))
     }
 
-    relevant_documents = client.search(
+    relevant_documents = _lazy.get("client").search(
         body = query_qna,
         index = index
     )
     return relevant_documents
 
 
-def query_movies(query, sort, genres, rating, index):
-
-    if sort == 'year':
-        sort_type = "year"
-    elif sort == 'rating':
-        sort_type = "rating"
-    else:
-        sort_type = "_score"
+def query_movies(query, sort, genres, rating, index, size=3):
+    sort_type = query_builder.sort_type(sort)
+    filters = query_builder.movie_filters(genres, rating)
 
-    if genres == '':
-        genres = '*'
-
-    if rating == '':
-        rating = 0
-
-    query_embedding = model.encode(query).tolist()
-    query_knn = {
-        "size": 3,
-        "sort": [
-            {
-                sort_type: {
-                    "order": "desc"
-                }
-            }
-        ],
-        "_source": {
-            "includes": [
-                "title",
-                "plot",
-                "rating",
-                "year",
-                "poster",
-                "genres"
-            ]
-        },
-        "query": {
-            "bool": {
-                "should": [
-                    {
-                        "knn": {
-                            "v_plot": {
-                                "vector": query_embedding,
-                                "k": vector_size
-                            }
-                        }
-                    },
-                    {
-                        "knn": {
-                            "v_title": {
-                                "vector": query_embedding,
-                                "k": vector_size
-                            }
-                        }
-                    }
-                ],
-                "filter": [
-                    {
-                        "query_string": {
-                            "query": genres,
-                            "fields": [
-                                "genres"
-                            ]
-                        }
-                    },
-                    {
-                      "range": {
-                        "rating": {
-                          "gte": rating
-                        }
-                      }
-                    }
-                ]
-            }
-        }
-    }
-    response_knn = client.search(
+    query_embedding = _lazy.get("embedding_provider").embed(query)
+    query_knn = query_builder.knn_query(query_embedding, size=size, filters=filters, sort_field=sort_type)
+    response_knn = _lazy.get("client").search(
         body = query_knn,
         index = index
     )
 
-    # print (query_knn)
-    # print(response_knn)
-
     # Extract relevant information from the search result
     hits_knn = response_knn['hits']['hits']
     doc_count_knn = response_knn['hits']['total']['value']
-    results_knn = [{'genres':  hit['_source']['genres'],'poster':  hit['_source']['poster'],'title': hit['_source']['title'], 'rating': hit['_source']['rating'], 'year': hit['_source']['year'], 'plot' : hit['_source']['plot']} for hit in hits_knn]
-
+    results_knn = [query_builder.movie_result(hit['_source']) for hit in hits_knn]
 
-
-    query_kw = {
-        "size": 3,
-        "sort": [
-            {
-                sort_type: {
-                    "order": "desc"
-                }
-            }
-        ],
-        "_source": {
-            "includes": [
-                "title",
-                "plot",
-                "rating",
-                "year",
-                "poster",
-                "genres"
-            ]
-        },
-        "query": {
-            "bool": {
-                "must": {
-                    "multi_match": {
-                        "query": query,
-                        "fields": ["plot", "title"]
-                    }
-                },
-                "filter": [
-                    {
-                        "query_string": {
-                            "query": genres,
-                            "fields": [
-                                "genres"
-                            ]
-                        }
-                    },
-                    {
-                      "range": {
-                        "rating": {
-                          "gte": rating
-                        }
-                      }
-                    }
-                ]
-            }
-        }
-    }
-
-    response_kw = client.search(
+    query_kw = query_builder.keyword_query(query, size=size, filters=filters, sort_field=sort_type)
+    response_kw = _lazy.get("client").search(
         body = query_kw,
         index = index
     )
@@ -257,8 +138,6 @@ def query_movies(query, sort, genres, rating, index):
     # Extract relevant information from the search result
     hits_kw = response_kw['hits']['hits']
     doc_count_kw = response_kw['hits']['total']['value']
-    results_kw = [{'genres':  hit['_source']['genres'],'poster':  hit['_source']['poster'],'title': hit['_source']['title'], 'rating': hit['_source']['rating'], 'year': hit['_source']['year'], 'plot' : hit['_source']['plot']} for hit in hits_kw]
+    results_kw = [query_builder.movie_result(hit['_source']) for hit in hits_kw]
 
-    # print (f"Search Results: {search_results}")
     return results_knn, doc_count_knn, results_kw, doc_count_kw
-
@@ -0,0 +1,70 @@
+"""Generator pipeline stages connected by bounded queues
+
+Each stage is an ordinary generator. threaded() runs one on its own thread and hands
+its output downstream through a bounded queue, so a slow consumer blocks the producer
+(backpressure) and memory stays proportional to the queue sizes, not to the input.
+"""
+# Python Built-Ins:
+import queue
+import threading
+from typing import Iterable, Iterator
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error):
+        self.error = error
+
+
+def threaded(items: Iterable, maxsize: int = 64, name: str = "stage") -> Iterator:
+    """Consume items on a background thread, yielding them through a queue of at most maxsize
+
+    Exceptions raised by the upstream generator are re-raised in the consumer.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_StageError(e))
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        # Unblock the producer if the consumer stops early
+        stopped.set()
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """Group items into lists of at most size"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
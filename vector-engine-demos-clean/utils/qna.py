@@ -0,0 +1,239 @@
+"""Retrieval-augmented Q&A: token-budgeted context packing and streamed Bedrock answers
+
+Retrieved passages are ordered by score, duplicates (same normalized text) are
+dropped, and passages are added to the prompt context until the token budget is
+spent, so a long result list cannot blow up prompt size and latency. The answer
+is streamed with invoke_model_with_response_stream and yielded chunk by chunk;
+the time to the first chunk is recorded as the "time_to_first_token" stage of
+the current metrics trace.
+
+answer() puts a SemanticAnswerCache in front of the model: a question similar
+enough to an earlier one, with the same retrieved passages, gets the earlier
+answer without a model call. Settings:
+
+    AOSS_QNA_MODEL           Bedrock text model (default anthropic.claude-instant-v1)
+    AOSS_QNA_CANDIDATES      passages retrieved before packing (default 10)
+    AOSS_QNA_CONTEXT_TOKENS  token budget of the packed context (default 1500)
+    AOSS_QNA_MAX_TOKENS      maximum answer length in tokens (default 1000)
+    AOSS_ASYNC_QUERIES       retrieve through utils.bedrockopensearch_async (default off)
+    AOSS_SEMANTIC_CACHE                  on (default) or off
+    AOSS_SEMANTIC_CACHE_THRESHOLD        minimum cosine similarity of the questions (default 0.92)
+    AOSS_SEMANTIC_CACHE_MIN_DOC_OVERLAP  minimum Jaccard overlap of the passage IDs (default 1.0, same set)
+    AOSS_SEMANTIC_CACHE_MAX_ENTRIES      answers kept (default 1024)
+    AOSS_SEMANTIC_CACHE_TTL              seconds an answer is reused (default 3600)
+
+Token counts are estimated at CHARS_PER_TOKEN characters per token; no tokenizer
+is needed, and the budget is a bound on prompt size rather than an exact count.
+"""
+# Python Built-Ins:
+import json
+import math
+import os
+import time
+from typing import Iterator, List, Optional
+
+from utils import bedrockopensearch
+from utils import bedrockopensearch_async
+from utils import metrics
+from utils.dedup import normalize_text
+from utils.semantic_cache import SemanticAnswerCache
+
+QNA_MODEL = os.environ.get("AOSS_QNA_MODEL", "anthropic.claude-instant-v1")
+QNA_CANDIDATES = int(os.environ.get("AOSS_QNA_CANDIDATES", "10"))
+QNA_CONTEXT_TOKENS = int(os.environ.get("AOSS_QNA_CONTEXT_TOKENS", "1500"))
+QNA_MAX_TOKENS = int(os.environ.get("AOSS_QNA_MAX_TOKENS", "1000"))
+
+CHARS_PER_TOKEN = 4
+
+semantic_cache_enabled = os.environ.get("AOSS_SEMANTIC_CACHE", "on").lower() in ("1", "on", "true", "yes")
+semantic_cache = SemanticAnswerCache(
+    max_entries=int(os.environ.get("AOSS_SEMANTIC_CACHE_MAX_ENTRIES", "1024")),
+    threshold=float(os.environ.get("AOSS_SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    min_doc_overlap=float(os.environ.get("AOSS_SEMANTIC_CACHE_MIN_DOC_OVERLAP", "1.0")),
+    ttl=float(os.environ.get("AOSS_SEMANTIC_CACHE_TTL", "3600"))
+)
+
+# invoke_model_with_response_stream error events
+STREAM_ERRORS = ("internalServerException", "modelStreamErrorException", "modelTimeoutException",
+                 "serviceUnavailableException", "throttlingException", "validationException")
+
+NOT_FOUND_ANSWER = "I don't know, answer not found in the documents."
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def hit_passage(hit: dict) -> dict:
+    """Passage dict (id, title, content, score) of a query_qna hit"""
+    fields = hit.get("fields", {})
+    return {
+        "id": hit.get("_id"),
+        "title": (fields.get("title") or [""])[0],
+        "content": (fields.get("content") or [""])[0],
+        "score": hit.get("_score") or 0.0,
+    }
+
+
+def format_passage(n: int, passage: dict) -> str:
+    title = f" {passage['title']}" if passage["title"] else ""
+    return f"[{n}]{title}\n{passage['content']}"
+
+
+def pack_context(passages: List[dict], budget_tokens: int = QNA_CONTEXT_TOKENS) -> dict:
+    """Best-scoring distinct passages that fit in budget_tokens
+
+    Passages that do not fit are skipped in favour of later, shorter ones; when
+    even the best passage is over budget it is cut to the budget rather than
+    leaving the context empty. Returns the context text with the passages used,
+    its estimated tokens and the number of passages dropped as duplicates or for
+    lack of budget.
+    """
+    used, seen = [], set()
+    duplicates = over_budget = 0
+    tokens = 0
+    for passage in sorted(passages, key=lambda p: p["score"], reverse=True):
+        key = normalize_text(passage["content"]).lower()
+        if not key:
+            continue
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        # Separators between passages are counted with the passage
+        cost = estimate_tokens(format_passage(len(used) + 1, passage)) + 1
+        if tokens + cost > budget_tokens:
+            if used:
+                over_budget += 1
+                continue
+            passage = dict(passage, content=passage["content"][:max(budget_tokens - 16, 0) * CHARS_PER_TOKEN])
+            cost = estimate_tokens(format_passage(1, passage)) + 1
+        used.append(passage)
+        tokens += cost
+    return {
+        "context": "\n\n".join(format_passage(n, passage) for n, passage in enumerate(used, 1)),
+        "passages": used,
+        "tokens": tokens,
+        "duplicates": duplicates,
+        "over_budget": over_budget,
+    }
+
+
+def retrieve_context(question: str, index: str, candidates: int = QNA_CANDIDATES,
+                     budget_tokens: int = QNA_CONTEXT_TOKENS) -> dict:
+    """Retrieve candidates for question with query_qna and pack them into the token budget"""
+    query_qna = bedrockopensearch_async.query_qna_sync if bedrockopensearch_async.async_queries else bedrockopensearch.query_qna
+    response = query_qna(question, index, size=candidates)
+    hits, _ = bedrockopensearch.response_hits(response)
+    with metrics.stage("packing"):
+        return pack_context([hit_passage(hit) for hit in hits], budget_tokens)
+
+
+def build_prompt(question: str, context: Optional[str]) -> str:
+    """Instruction text for the model; without a context the question is answered as is"""
+    if context is None:
+        return f"Answer the question below.\n\n<question>\n{question}\n</question>"
+    return (
+        f'Answer the question based on the information provided. If the answer is not in the context, '
+        f'say "{NOT_FOUND_ANSWER}"\n\n<context>\n{context}\n</context>\n\n<question>\n{question}\n</question>'
+    )
+
+
+def _legacy_claude(model_id: str) -> bool:
+    return "claude-instant" in model_id or "claude-v2" in model_id
+
+
+def model_request(model_id: str, prompt: str, max_tokens: int = QNA_MAX_TOKENS) -> dict:
+    """invoke_model request body of a Claude (text completions or messages API) or Titan text model"""
+    if "anthropic." in model_id and _legacy_claude(model_id):
+        return {"prompt": f"\n\nHuman: {prompt}\n\nAssistant:", "max_tokens_to_sample": max_tokens}
+    if "anthropic." in model_id:
+        return {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+    if "amazon.titan" in model_id:
+        return {"inputText": prompt, "textGenerationConfig": {"maxTokenCount": max_tokens}}
+    raise ValueError(f"No streaming request format for model '{model_id}'")
+
+
+def chunk_text(model_id: str, payload: dict) -> str:
+    """Text of one decoded response stream chunk ('' for chunks without text)"""
+    if "anthropic." in model_id and _legacy_claude(model_id):
+        return payload.get("completion") or ""
+    if "anthropic." in model_id:
+        if payload.get("type") == "content_block_delta":
+            return payload.get("delta", {}).get("text") or ""
+        return ""
+    return payload.get("outputText") or ""
+
+
+def stream_answer(question: str, context: Optional[str], model_id: str = QNA_MODEL,
+                  max_tokens: int = QNA_MAX_TOKENS) -> Iterator[str]:
+    """Yield the model's answer as it is generated, recording time_to_first_token and generation stages
+
+    context is the packed context from retrieve_context, or None to answer without
+    the knowledge base.
+    """
+    body = model_request(model_id, build_prompt(question, context), max_tokens)
+    start = time.perf_counter()
+    response = bedrockopensearch.get_bedrock_runtime().invoke_model_with_response_stream(
+        modelId=model_id,
+        contentType="application/json",
+        accept="application/json",
+        body=json.dumps(body)
+    )
+    first = True
+    try:
+        for event in response["body"]:
+            error = next((name for name in STREAM_ERRORS if name in event), None)
+            if error:
+                raise RuntimeError(f"Bedrock stream failed ({error}): {event[error].get('message', event[error])}")
+            if "chunk" not in event:
+                continue
+            text = chunk_text(model_id, json.loads(event["chunk"]["bytes"]))
+            if not text:
+                continue
+            if first:
+                metrics.record("time_to_first_token", time.perf_counter() - start)
+                first = False
+            yield text
+    finally:
+        metrics.record("generation", time.perf_counter() - start)
+
+
+def answer(question: str, packed: Optional[dict], model_id: str = QNA_MODEL, max_tokens: int = QNA_MAX_TOKENS,
+           use_cache: bool = True) -> Iterator[str]:
+    """stream_answer behind the semantic answer cache
+
+    packed is retrieve_context's result, or None to answer without the knowledge
+    base. A cache hit yields the stored answer at once (recorded as the
+    semantic_cache_hit stage); otherwise the streamed answer is stored once it
+    completes. The query vector comes from the query embedding cache, so the
+    lookup costs no extra embedding call after retrieval.
+    """
+    use_cache = use_cache and semantic_cache_enabled
+    if not use_cache:
+        yield from stream_answer(question, packed["context"] if packed else None, model_id, max_tokens)
+        return
+    start = time.perf_counter()
+    vector = bedrockopensearch.embed_query(question)
+    doc_ids = [passage["id"] for passage in packed["passages"]] if packed else []
+    # Answers with and without the knowledge base, or from different models, are never shared
+    namespace = f"{model_id}|{'kb' if packed else 'none'}|{max_tokens}"
+    cached = semantic_cache.lookup(vector, doc_ids, namespace)
+    if cached is not None:
+        metrics.record("semantic_cache_hit", time.perf_counter() - start)
+        yield cached[0]
+        return
+    chunks = []
+    for text in stream_answer(question, packed["context"] if packed else None, model_id, max_tokens):
+        chunks.append(text)
+        yield text
+    if chunks:
+        semantic_cache.put(vector, doc_ids, "".join(chunks), namespace)
+
+
+def semantic_cache_stats() -> dict:
+    return semantic_cache.stats()
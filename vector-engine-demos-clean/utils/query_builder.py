@@ -0,0 +1,128 @@
+"""Search request bodies for the movie and Q&A indices
+
+Filters are applied inside each knn clause ("efficient filtering"), so the engine
+searches only among matching documents and returns k filtered neighbours, rather
+than finding k neighbours and dropping the ones a post-filter rejects. The genre
+filter is a terms query on the genres.keyword sub-field; "*" or no genre adds no
+clause at all.
+
+k follows the page size rather than the vector dimension: enough neighbours to
+fill AOSS_KNN_PAGES pages, never less than AOSS_KNN_MIN_K and never more than
+AOSS_KNN_MAX_K. k stays the same for every page of a search, so search_after
+pages walk through one fixed neighbour set and the kNN totals do not change from
+page to page.
+
+    AOSS_KNN_PAGES      pages of kNN results reachable by pagination (default 10)
+    AOSS_KNN_MIN_K      lower bound for k (default 10)
+    AOSS_KNN_MAX_K      upper bound for k (default 1000)
+    AOSS_KNN_EF_SEARCH  query-time HNSW ef_search (method_parameters); unset uses the index setting
+"""
+# Python Built-Ins:
+import os
+from typing import Iterable, List, Optional, Sequence, Union
+
+KNN_PAGES = int(os.environ.get("AOSS_KNN_PAGES", "10"))
+KNN_MIN_K = int(os.environ.get("AOSS_KNN_MIN_K", "10"))
+KNN_MAX_K = int(os.environ.get("AOSS_KNN_MAX_K", "1000"))
+KNN_EF_SEARCH = int(os.environ.get("AOSS_KNN_EF_SEARCH", "0")) or None
+
+MOVIE_FIELDS = ["title", "plot", "rating", "year", "poster", "genres"]
+# What searches request from _source: the result fields plus image_url, the poster of movies without one
+MOVIE_SOURCE = MOVIE_FIELDS + ["image_url"]
+MOVIE_VECTOR_FIELDS = ("v_plot", "v_title")
+MOVIE_TEXT_FIELDS = ["plot", "title"]
+
+# Unique per movie, so equal sort values still give search_after a total order.
+# unmapped_type keeps sorted queries working on an index loaded without a rank
+# mapping (every document is then "missing" and ties are left unbroken)
+TIEBREAKER = {"rank": {"order": "asc", "missing": "_last", "unmapped_type": "long"}}
+
+
+def knn_k(size: int, pages: int = KNN_PAGES, min_k: int = KNN_MIN_K, max_k: int = KNN_MAX_K) -> int:
+    """Neighbours to request so that pages of size results can be filled"""
+    return max(min(size * pages, max_k), min(min_k, max_k))
+
+
+def sort_type(sort: Optional[str]) -> str:
+    """Page sort option (score, year, rating) as a sort field"""
+    return sort if sort in ("year", "rating") else "_score"
+
+
+def movie_filters(genres: Union[str, Sequence[str], None] = None, rating=None) -> List[dict]:
+    """Filter clauses for a genre (or list of genres) and a minimum rating; empty when unfiltered"""
+    filters = []
+    if isinstance(genres, str):
+        genres = [] if genres.strip() in ("", "*") else [genres]
+    if genres:
+        filters.append({"terms": {"genres.keyword": list(genres)}})
+    if rating not in (None, "") and float(rating) > 0:
+        filters.append({"range": {"rating": {"gte": float(rating)}}})
+    return filters
+
+
+def sort_clause(sort_field: str = "_score") -> list:
+    return [{sort_field: {"order": "desc"}}, TIEBREAKER]
+
+
+def knn_clause(field: str, vector, k: int, filters: Optional[List[dict]] = None,
+               ef_search: Optional[int] = KNN_EF_SEARCH) -> dict:
+    options = {"vector": vector, "k": k}
+    if filters:
+        options["filter"] = {"bool": {"filter": filters}}
+    if ef_search:
+        options["method_parameters"] = {"ef_search": ef_search}
+    return {"knn": {field: options}}
+
+
+def paginate(body: dict, search_after: Optional[Sequence] = None) -> dict:
+    """Continue after the hit whose sort values are search_after"""
+    if search_after:
+        body["search_after"] = list(search_after)
+    return body
+
+
+def knn_query(vector, size: int = 3, k: Optional[int] = None, filters: Optional[List[dict]] = None,
+              sort_field: str = "_score", fields: Iterable[str] = MOVIE_VECTOR_FIELDS,
+              source: Union[List[str], bool] = MOVIE_SOURCE, search_after: Optional[Sequence] = None,
+              ef_search: Optional[int] = KNN_EF_SEARCH) -> dict:
+    """kNN search over one or more vector fields, filtered inside each knn clause"""
+    k = k or knn_k(size)
+    clauses = [knn_clause(field, vector, k, filters, ef_search) for field in fields]
+    body = {
+        "size": size,
+        "sort": sort_clause(sort_field),
+        "_source": {"includes": source} if isinstance(source, list) else source,
+        "query": clauses[0] if len(clauses) == 1 else {"bool": {"should": clauses}},
+    }
+    return paginate(body, search_after)
+
+
+def keyword_query(text: str, size: int = 3, filters: Optional[List[dict]] = None, sort_field: str = "_score",
+                  fields: List[str] = MOVIE_TEXT_FIELDS, source: Union[List[str], bool] = MOVIE_SOURCE,
+                  search_after: Optional[Sequence] = None) -> dict:
+    """multi_match over the text fields with the filters in bool.filter (no scoring cost)"""
+    query = {"bool": {"must": {"multi_match": {"query": text, "fields": fields}}}}
+    if filters:
+        query["bool"]["filter"] = filters
+    body = {
+        "size": size,
+        "sort": sort_clause(sort_field),
+        "_source": {"includes": source} if isinstance(source, list) else source,
+        "query": query,
+    }
+    return paginate(body, search_after)
+
+
+def movie_result(source: dict, missing='') -> dict:
+    """MOVIE_FIELDS of a movie document, with image_url standing in for a missing poster"""
+    result = {field: source.get(field, missing) for field in MOVIE_FIELDS}
+    result["poster"] = source.get("poster") or source.get("image_url") or missing
+    return result
+
+
+def next_search_after(response: dict, size: int) -> Optional[list]:
+    """Cursor for the page after response: the last hit's sort values, or None on the last page"""
+    hits = response.get("hits", {}).get("hits", [])
+    if len(hits) < size or "sort" not in hits[-1]:
+        return None
+    return hits[-1]["sort"]
@@ -0,0 +1,141 @@
+"""Semantic cache of LLM answers, keyed by query-embedding similarity
+
+Each entry holds a normalized query vector, the IDs of the documents retrieved for
+that query and the generated answer. A new question is served from the cache
+when a stored query is at least `threshold` cosine-similar and its retrieved
+document set still matches the one just retrieved, so "holiday movie" and "movie
+for the holidays" share an answer, but an answer built on a different context is
+never reused. Vectors live in one preallocated float32 matrix, so a lookup is a
+single matrix-vector product; when the matrix is full the least recently used
+entry is overwritten.
+"""
+# Python Built-Ins:
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+# External Dependencies:
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Bounded in-memory answer cache with vectorized similarity lookup and LRU eviction
+
+    Parameters
+    ----------
+    max_entries :
+        Rows of the vector matrix; the least recently used entry is replaced when full.
+    threshold :
+        Minimum cosine similarity between the new and a cached query.
+    min_doc_overlap :
+        Minimum Jaccard overlap of the retrieved document IDs; 1.0 requires the same set.
+    ttl :
+        Seconds an answer stays valid after it was stored. None disables expiry.
+    """
+
+    def __init__(self, max_entries: int = 1024, threshold: float = 0.92, min_doc_overlap: float = 1.0,
+                 ttl: Optional[float] = 3600.0):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.min_doc_overlap = min_doc_overlap
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.doc_mismatches = 0
+        self.evictions = 0
+        self._vectors = None
+        self._last_used = np.zeros(max_entries, dtype=np.int64)  # 0 marks a free slot
+        self._expires = np.full(max_entries, np.inf)
+        self._namespaces = np.full(max_entries, -1, dtype=np.int32)
+        self._namespace_ids: Dict[str, int] = {}
+        self._entries = [None] * max_entries
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _doc_match(self, cached: frozenset, doc_ids: frozenset) -> bool:
+        if cached == doc_ids:
+            return True
+        union = len(cached | doc_ids)
+        return union > 0 and len(cached & doc_ids) / union >= self.min_doc_overlap
+
+    def lookup(self, vector, doc_ids: Iterable[str], namespace: str = "") -> Optional[Tuple[str, float]]:
+        """(answer, similarity) of the most similar live entry whose documents match, or None
+
+        namespace separates answers that must not be shared, e.g. different models.
+        """
+        query = self._normalize(vector)
+        doc_ids = frozenset(doc_ids)
+        with self._lock:
+            namespace_id = self._namespace_ids.get(namespace)
+            if self._vectors is None or namespace_id is None or self._vectors.shape[1] != len(query):
+                self.misses += 1
+                return None
+            similarities = self._vectors @ query
+            live = (self._last_used > 0) & (self._namespaces == namespace_id) & (self._expires > time.monotonic())
+            candidates = np.flatnonzero(live & (similarities >= self.threshold))
+            mismatched = False
+            for slot in candidates[np.argsort(-similarities[candidates])]:
+                cached_docs, answer = self._entries[slot]
+                if self._doc_match(cached_docs, doc_ids):
+                    self._clock += 1
+                    self._last_used[slot] = self._clock
+                    self.hits += 1
+                    return answer, float(similarities[slot])
+                mismatched = True
+            self.doc_mismatches += mismatched
+            self.misses += 1
+            return None
+
+    def _free_slots(self):
+        # Every per-slot array together, so no slot keeps a stale expiry or namespace
+        self._last_used[:] = 0
+        self._expires[:] = np.inf
+        self._namespaces[:] = -1
+        self._entries = [None] * self.max_entries
+
+    def put(self, vector, doc_ids: Iterable[str], answer: str, namespace: str = ""):
+        query = self._normalize(vector)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(query):
+                # First entry, or the embedding model changed: start over at the new dimension
+                self._vectors = np.zeros((self.max_entries, len(query)), dtype=np.float32)
+                self._free_slots()
+            # Free and expired slots first, then the least recently used entry
+            expired = self._expires <= time.monotonic()
+            slot = int(np.argmin(np.where(expired, 0, self._last_used)))
+            if self._last_used[slot] > 0 and not expired[slot]:
+                self.evictions += 1
+            self._clock += 1
+            self._vectors[slot] = query
+            self._last_used[slot] = self._clock
+            self._expires[slot] = time.monotonic() + self.ttl if self.ttl is not None else np.inf
+            self._namespaces[slot] = self._namespace_ids.setdefault(namespace, len(self._namespace_ids))
+            self._entries[slot] = (frozenset(doc_ids), answer)
+
+    def clear(self):
+        with self._lock:
+            self._vectors = None
+            self._free_slots()
+
+    def __len__(self):
+        return int(np.count_nonzero(self._last_used))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": int(np.count_nonzero(self._last_used)),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "doc_mismatches": self.doc_mismatches,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,245 @@
+"""Embedding model, vector dimension and k-NN storage options shared by the loader and the query code
+
+The index mapping and the query embeddings must agree on model and dimension, so
+both sides build them from the same AOSS_* settings:
+
+    AOSS_EMBEDDING_MODEL_ID    amazon.titan-embed-text-v1 (1536 only), amazon.titan-embed-text-v2:0
+                               or a local sentence-transformers model (see utils.embeddings)
+    AOSS_VECTOR_DIMENSION      1536 for v1; 256, 512 or 1024 for v2 (default: the model's largest)
+    AOSS_VECTOR_DATA_TYPE      float, fp16 (faiss scalar quantization), byte (lucene int7
+                               scalar quantization) or binary (faiss 1-bit quantization)
+    AOSS_VECTOR_MODE           in_memory or on_disk (quantized graph in memory, full
+                               precision vectors on disk for rescoring)
+    AOSS_VECTOR_COMPRESSION    compression level for on_disk mode: 8x, 16x or 32x
+    AOSS_HNSW_ENGINE           faiss, lucene or nmslib (default: the cluster's default engine,
+                               or the one the data type's encoder requires)
+    AOSS_HNSW_M                graph degree m (default 16)
+    AOSS_HNSW_EF_CONSTRUCTION  candidate list size while building the graph (default: engine default)
+
+Changing any of these requires re-creating the index and re-running the loader.
+"""
+# Python Built-Ins:
+import os
+import threading
+from typing import List
+
+TITAN_V1 = "amazon.titan-embed-text-v1"
+TITAN_V2 = "amazon.titan-embed-text-v2:0"
+MSMARCO_TAS_B = "sentence-transformers/msmarco-distilbert-base-tas-b"
+ALL_MINILM_L6 = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Output dimensions each embedding model can produce
+MODEL_DIMENSIONS = {
+    TITAN_V1: (1536,),
+    TITAN_V2: (256, 512, 1024),
+    MSMARCO_TAS_B: (768,),
+    ALL_MINILM_L6: (384,),
+}
+
+# Models served by Bedrock; the others run locally through sentence-transformers
+BEDROCK_MODELS = (TITAN_V1, TITAN_V2)
+
+DATA_TYPES = ("float", "fp16", "byte", "binary")
+MODES = ("in_memory", "on_disk")
+COMPRESSION_LEVELS = ("8x", "16x", "32x")
+ENGINES = ("faiss", "lucene", "nmslib")
+
+# Engine required by each data type's encoder
+DATA_TYPE_ENGINES = {"fp16": "faiss", "byte": "lucene", "binary": "faiss"}
+
+# Bytes of one vector component held in the graph for each data type
+BYTES_PER_DIMENSION = {"float": 4.0, "fp16": 2.0, "byte": 1.0, "binary": 1 / 8}
+
+# Default HNSW graph degree, used in the mappings and the memory estimate
+HNSW_M = 16
+
+
+class VectorConfig:
+    """Embedding model and knn_vector storage settings of the movie index
+
+    Parameters
+    ----------
+    model_id :
+        Embedding model, a Bedrock Titan id or a local sentence-transformers model.
+    dimension :
+        Output dimension requested from the model and stored in the index.
+    data_type :
+        Stored vector precision, one of DATA_TYPES. Everything but float uses an
+        engine encoder, so the loader still sends float vectors.
+    mode :
+        in_memory or on_disk.
+    compression :
+        Compression level of on_disk mode.
+    engine :
+        k-NN engine building the HNSW graph; None leaves it to the data type or the cluster.
+    m :
+        HNSW graph degree.
+    ef_construction :
+        HNSW build-time candidate list size; None uses the engine default.
+    """
+
+    def __init__(self, model_id: str = TITAN_V1, dimension: int = None, data_type: str = "float",
+                 mode: str = "in_memory", compression: str = "32x", engine: str = None,
+                 m: int = HNSW_M, ef_construction: int = None):
+        if model_id not in MODEL_DIMENSIONS:
+            raise ValueError(f"Unsupported embedding model {model_id!r}, expected one of {sorted(MODEL_DIMENSIONS)}")
+        dimension = int(dimension) if dimension else max(MODEL_DIMENSIONS[model_id])
+        if dimension not in MODEL_DIMENSIONS[model_id]:
+            raise ValueError(f"{model_id} supports dimensions {MODEL_DIMENSIONS[model_id]}, not {dimension}")
+        if data_type not in DATA_TYPES:
+            raise ValueError(f"Unsupported vector data type {data_type!r}, expected one of {DATA_TYPES}")
+        if mode not in MODES:
+            raise ValueError(f"Unsupported vector mode {mode!r}, expected one of {MODES}")
+        if mode == "on_disk" and data_type != "float":
+            raise ValueError("on_disk mode picks its own quantization from the compression level; use data type float")
+        if compression not in COMPRESSION_LEVELS:
+            raise ValueError(f"Unsupported compression level {compression!r}, expected one of {COMPRESSION_LEVELS}")
+        if engine is not None and engine not in ENGINES:
+            raise ValueError(f"Unsupported k-NN engine {engine!r}, expected one of {ENGINES}")
+        required = "faiss" if mode == "on_disk" else DATA_TYPE_ENGINES.get(data_type)
+        if engine is not None and required is not None and engine != required:
+            raise ValueError(f"{self._storage_label(data_type, mode, compression)} vectors require the {required} engine, not {engine}")
+        self.model_id = model_id
+        self.dimension = dimension
+        self.data_type = data_type
+        self.mode = mode
+        self.compression = compression
+        self.engine = engine or required
+        self.m = int(m)
+        self.ef_construction = int(ef_construction) if ef_construction else None
+
+    @staticmethod
+    def _storage_label(data_type, mode, compression):
+        return f"on_disk-{compression}" if mode == "on_disk" else data_type
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            model_id=os.environ.get("AOSS_EMBEDDING_MODEL_ID", TITAN_V1),
+            dimension=os.environ.get("AOSS_VECTOR_DIMENSION") or None,
+            data_type=os.environ.get("AOSS_VECTOR_DATA_TYPE", "float").lower(),
+            mode=os.environ.get("AOSS_VECTOR_MODE", "in_memory").lower(),
+            compression=os.environ.get("AOSS_VECTOR_COMPRESSION", "32x").lower(),
+            engine=os.environ.get("AOSS_HNSW_ENGINE", "").lower() or None,
+            m=int(os.environ.get("AOSS_HNSW_M", str(HNSW_M))),
+            ef_construction=os.environ.get("AOSS_HNSW_EF_CONSTRUCTION") or None,
+        )
+
+    def __repr__(self):
+        return (f"VectorConfig(model_id={self.model_id!r}, dimension={self.dimension}, "
+                f"data_type={self.data_type!r}, mode={self.mode!r}, compression={self.compression!r})")
+
+    @property
+    def name(self) -> str:
+        """Short label such as '1024/fp16' or '512/on_disk-32x'"""
+        return f"{self.dimension}/{self._storage_label(self.data_type, self.mode, self.compression)}"
+
+    # - Embedding requests
+
+    @property
+    def provider(self) -> str:
+        """bedrock or local"""
+        return "bedrock" if self.model_id in BEDROCK_MODELS else "local"
+
+    @property
+    def cache_id(self) -> str:
+        """Model id used as the embedding cache key; differs per dimension for models with several"""
+        if len(MODEL_DIMENSIONS[self.model_id]) == 1:
+            return self.model_id
+        return f"{self.model_id}/{self.dimension}"
+
+    def embedding_request(self, text: str) -> dict:
+        """invoke_model body asking the model for a vector of the configured dimension"""
+        if self.provider != "bedrock":
+            raise ValueError(f"{self.model_id} is not a Bedrock model")
+        if self.model_id == TITAN_V1:
+            return {"inputText": text}
+        return {"inputText": text, "dimensions": self.dimension, "normalize": True}
+
+    # - Index mapping
+
+    def hnsw_parameters(self) -> dict:
+        """Graph build parameters of the hnsw method"""
+        parameters = {"m": self.m}
+        if self.ef_construction:
+            parameters["ef_construction"] = self.ef_construction
+        return parameters
+
+    def knn_field(self) -> dict:
+        """knn_vector mapping for v_title / v_plot"""
+        field = {"type": "knn_vector", "dimension": self.dimension}
+        # Without an engine or custom build parameters the cluster defaults apply
+        custom = self.engine is not None or self.m != HNSW_M or self.ef_construction is not None
+        method = {"name": "hnsw", "engine": self.engine or "faiss", "space_type": "l2", "parameters": self.hnsw_parameters()}
+        if self.mode == "on_disk":
+            field.update({"space_type": "l2", "mode": "on_disk", "compression_level": self.compression})
+            if self.m != HNSW_M or self.ef_construction is not None:
+                field["method"] = method
+        elif self.data_type == "fp16":
+            method["parameters"]["encoder"] = {"name": "sq", "parameters": {"type": "fp16"}}
+            field["method"] = method
+        elif self.data_type == "byte":
+            method["parameters"]["encoder"] = {"name": "sq"}
+            field["method"] = method
+        elif self.data_type == "binary":
+            method["parameters"]["encoder"] = {"name": "binary", "parameters": {"bits": 1}}
+            field["method"] = method
+        elif custom:
+            field["method"] = method
+        return field
+
+    # - Sizing
+
+    def graph_bytes_per_vector(self) -> float:
+        """Native memory per vector: stored components plus HNSW links, as in the k-NN sizing guide"""
+        if self.mode == "on_disk":
+            component = 4.0 / int(self.compression.rstrip("x"))
+        else:
+            component = BYTES_PER_DIMENSION[self.data_type]
+        return 1.1 * (component * self.dimension + 8 * self.m)
+
+    def disk_bytes_per_vector(self) -> float:
+        """Vector bytes in the index files; on_disk and lucene keep full precision next to the quantized copy"""
+        full = 4.0 * self.dimension
+        if self.mode == "on_disk" or self.data_type == "byte":
+            return full + self.graph_bytes_per_vector()
+        return self.graph_bytes_per_vector()
+
+    def describe(self) -> dict:
+        return {
+            "model_id": self.model_id,
+            "dimension": self.dimension,
+            "data_type": self.data_type,
+            "mode": self.mode,
+            "compression": self.compression if self.mode == "on_disk" else None,
+            "engine": self.engine,
+            "m": self.m,
+            "ef_construction": self.ef_construction,
+            "graph_bytes_per_vector": round(self.graph_bytes_per_vector(), 1),
+            "disk_bytes_per_vector": round(self.disk_bytes_per_vector(), 1),
+        }
+
+
+def options(model_id: str) -> List[VectorConfig]:
+    """Every dimension / storage combination supported for a model, full precision first"""
+    configs = []
+    for dimension in sorted(MODEL_DIMENSIONS[model_id], reverse=True):
+        for data_type in DATA_TYPES:
+            configs.append(VectorConfig(model_id, dimension, data_type))
+        for compression in COMPRESSION_LEVELS:
+            configs.append(VectorConfig(model_id, dimension, "float", "on_disk", compression))
+    return configs
+
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def get_vector_config() -> VectorConfig:
+    """Process-wide configuration read once from the AOSS_* environment variables"""
+    global _config
+    if _config is None:
+        with _config_lock:
+            if _config is None:
+                _config = VectorConfig.from_env()
+    return _config